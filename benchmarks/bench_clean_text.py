@@ -0,0 +1,52 @@
+"""Benchmark text cleaning
+
+Times :func:`jamie.clean_text.clean_text` on each text against
+:func:`jamie.clean_text.clean_texts` on the whole batch, on the job
+descriptions and titles of a training snapshot, checking that both give
+identical output. The output of the original implementation is pinned in
+``tests/test_clean_text.py``.
+
+Usage::
+
+    python benchmarks/bench_clean_text.py [training-snapshot] [--limit N]
+"""
+
+import time
+import argparse
+from jamie.clean_text import clean_text, clean_texts
+from jamie.snapshots import TrainingSnapshot, TrainingSnapshotCollection
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("snapshot", nargs="?", help="Training snapshot to use")
+    parser.add_argument("--limit", type=int, help="Number of jobs to use")
+    args = parser.parse_args()
+    snapshot = (
+        TrainingSnapshot(args.snapshot)
+        if args.snapshot
+        else TrainingSnapshotCollection().latest()
+    )
+    data = snapshot.data.dropna(subset=["description", "job_title"])
+    if args.limit:
+        data = data.iloc[: args.limit]
+    clean_texts(["Warm up. Loads stopwords and tokenizers"])
+    print("Snapshot {}, {} jobs".format(snapshot.name, len(data)))
+    for column in ["description", "job_title"]:
+        texts = data[column].tolist()
+        start = time.perf_counter()
+        expected = [clean_text(t) for t in texts]
+        single = time.perf_counter() - start
+        start = time.perf_counter()
+        cleaned = clean_texts(texts)
+        batch = time.perf_counter() - start
+        assert cleaned == expected, "clean_texts() differs from clean_text()"
+        print(
+            "{:12s} clean_text {:8.2f}s  clean_texts {:8.2f}s  speedup {:5.1f}x".format(
+                column, single, batch, single / batch
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark and validate date extraction
+
+Compares :func:`jamie.scrape.dates.earliest_date` with the original
+implementation of ``JobFile._earliest_date_in_text``, which used datefinder,
+on the text of job pages. Reports the time per page, and the pages where the
+earliest dates differ. Requires datefinder, installed with the dev extras.
+
+Usage::
+
+    python benchmarks/bench_dates.py [input-folder] [--archive] [--limit N]
+"""
+
+import time
+import argparse
+import calendar
+from contextlib import suppress
+import datefinder
+from jamie.scrape.archive import open_store
+from jamie.scrape.dates import earliest_date
+from jamie.scrape.process import JobFile
+
+
+def original_earliest_date(text):
+    "Original implementation, using datefinder"
+    with suppress(calendar.IllegalMonthError, TypeError):
+        return min(
+            [
+                d
+                for d in datefinder.find_dates(text.replace(":", ""))
+                if d.year >= JobFile.EPOCH_YEAR
+            ],
+            default=None,
+        )
+
+
+def bench(func, texts):
+    "Returns dates and mean time per page in milliseconds"
+    start = time.perf_counter()
+    dates = [func(text) for text in texts]
+    return dates, 1000 * (time.perf_counter() - start) / len(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "folder", nargs="?", default="test-input", help="Input folder or archive"
+    )
+    parser.add_argument("--archive", action="store_true", help="Folder is an archive")
+    parser.add_argument("--limit", type=int, default=500, help="Number of pages")
+    parser.add_argument(
+        "--show", type=int, default=10, help="Number of differences to show"
+    )
+    args = parser.parse_args()
+    store = open_store(args.folder, args.archive)
+    texts = []
+    for key in store.keys():
+        jobid = store.jobid(key)
+        if not args.archive and key.suffix:  # skip expected output of test-input
+            continue
+        texts.append((jobid, JobFile(store.get(jobid), jobid=jobid)._soup.get_text()))
+        if len(texts) == args.limit:
+            break
+    if not texts:
+        raise SystemExit("No job pages found")
+    jobids, texts = zip(*texts)
+    print("Extracting dates from %d job pages" % len(texts))
+
+    expected, t_original = bench(original_earliest_date, texts)
+    dates, t = bench(lambda text: earliest_date(text, JobFile.EPOCH_YEAR), texts)
+    print("%-25s %8.2f ms/page" % ("datefinder", t_original))
+    print("%-25s %8.2f ms/page  %5.1fx" % ("earliest_date", t, t_original / t))
+
+    differences = [
+        (jobid, a, b)
+        for jobid, a, b in zip(jobids, expected, dates)
+        if (a and a.date()) != (b and b.date())
+    ]
+    print(
+        "Same earliest date for %d of %d pages"
+        % (len(texts) - len(differences), len(texts))
+    )
+    for jobid, a, b in differences[: args.show]:
+        print(
+            "  %-12s datefinder %-12s earliest_date %s"
+            % (jobid, a and a.date(), b and b.date())
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Benchmark job page parsing
+
+Compares :class:`jamie.scrape.process.JobFile`, which indexes the document
+tree once and scans pages with JSON-LD data without building a tree, with
+the original implementation that builds the tree of every page and searches
+the whole tree for each field, on scraped job pages. Each available parser backend is timed,
+checking that the parsed job data is identical to the original.
+
+Usage::
+
+    python benchmarks/bench_parser.py [input-folder] [--archive] [--limit N]
+"""
+
+import json
+import time
+import argparse
+import bs4
+from jamie.config import Config
+from jamie.scrape.archive import open_store
+from jamie.scrape.process import JobFile
+
+BACKENDS = ["html.parser", "lxml"]
+
+
+class OriginalJobFile(JobFile):
+    "Original implementation, searching the document tree for each field"
+
+    def _index_tags(self):
+        return {}
+
+    def _find_all(self, tag, attrs=None):
+        return self._soup.find_all(tag, attrs or {})
+
+    def _find(self, tag, attrs=None):
+        return self._soup.find(tag, attrs or {})
+
+    def _find_text(self, tag, text):
+        return self._soup.find(lambda el: el.name == tag and text in el.text)
+
+    def _extract_json_ads(self):
+        content_json = self._find("script", {"type": "application/ld+json"})
+        if content_json is not None:
+            return json.loads(content_json.contents[0])
+
+    @property
+    def new_subject_area(self):
+        subject = self._find_text("b", "Subject Area(s):")
+        if subject is not None:
+            list_subject = []
+            while True:
+                subject = subject.find_next("input", attrs={"name": "categoryId[]"})
+                try:
+                    list_subject.append(subject.find_next("input")["value"])
+                except AttributeError:
+                    break
+            return list_subject
+
+    @property
+    def new_extra_location(self):
+        tag = self._find("input", {"class": "j-form-input__location"})
+        if tag:
+            return tag["value"]
+
+
+def available_backends():
+    "Returns parser backends that are installed"
+    backends = []
+    for backend in BACKENDS:
+        try:
+            bs4.BeautifulSoup("", backend)
+            backends.append(backend)
+        except bs4.FeatureNotFound:
+            pass
+    return backends
+
+
+def bench(cls, pages, parser):
+    "Returns parsed job data and mean time per page in milliseconds"
+    start = time.perf_counter()
+    data = [cls(page, jobid=jobid, parser=parser).parse().json for jobid, page in pages]
+    return data, 1000 * (time.perf_counter() - start) / len(pages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("folder", nargs="?", help="Input folder or archive")
+    parser.add_argument("--archive", action="store_true", help="Folder is an archive")
+    parser.add_argument("--limit", type=int, default=500, help="Number of pages")
+    args = parser.parse_args()
+    config = Config()
+    store = open_store(
+        args.folder or config["scrape.folder"],
+        args.archive or (not args.folder and config["scrape.archive"]),
+    )
+    pages = []
+    for key in store.keys():
+        jobid = store.jobid(key)
+        pages.append((jobid, store.get(jobid)))
+        if len(pages) == args.limit:
+            break
+    if not pages:
+        raise SystemExit("No job pages found")
+    print("Parsing %d job pages" % len(pages))
+
+    expected, baseline = bench(OriginalJobFile, pages, "html.parser")
+    print("%-30s %8.2f ms/page" % ("original (html.parser)", baseline))
+    for backend in available_backends():
+        data, t = bench(JobFile, pages, backend)
+        mismatches = sum(a != b for a, b in zip(data, expected))
+        print(
+            "%-30s %8.2f ms/page  %5.2fx  %d mismatches"
+            % ("indexed (%s)" % backend, t, baseline / t, mismatches)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ import pymongo
 
 import jamie.config
 import jamie.scrape
+import jamie.scrape.archive
 import jamie.snapshots
 import jamie.models
 import jamie.features
@@ -96,9 +97,16 @@ class Jamie:
         "Reads and sets jamie configuration"
         return jamie.config.configurator(field, value)
 
-    def scrape(self):
+    def scrape(self, refresh=False):
         "Scrapes jobs from jobs.ac.uk"
-        return jamie.scrape.main(self.cf)
+        return jamie.scrape.main(self.cf, refresh=refresh)
+
+    def archive(self, destination):
+        "Adds scraped jobs to a compressed archive"
+        folder = self.cf["scrape.folder"]
+        print(o("Archiving jobs from {} to {}".format(folder, destination)))
+        n = jamie.scrape.archive.archive_folder(folder, Path(destination))
+        print(success("Archived {} jobs".format(n)))
 
     def snapshots(self, kind, instance=None):
         "Show saved snapshots (models/training)"
@@ -110,7 +118,9 @@ class Jamie:
         if not fn.exists():
             return "[jamie readjob] File does not exist: " + str(fn)
         data = json.dumps(
-            jamie.scrape.JobFile(fn).parse().json, indent=2, sort_keys=True
+            jamie.scrape.JobFile(fn, parser=self.cf["scrape.parser"]).parse().json,
+            indent=2,
+            sort_keys=True,
         )
         if save:
             (fn.parent / (fn.stem + ".json")).write_text(data)
@@ -130,6 +140,7 @@ class Jamie:
         oversampling=False,
         scoring="precision",
         random_state=100,
+        shared_features=False,
     ):
         "Train using specified snapshot (default: last)"
         ts = jamie.snapshots.TrainingSnapshotCollection(self.cf["common.snapshots"])
@@ -161,17 +172,36 @@ class Jamie:
             oversampling,
             scoring,
             random_state,
+            shared_features,
         )
         print(success("Training complete"))
         print("   Run prediction: jamie predict")
 
-    def predict(self, snapshot=None):
+    def predict(self, snapshot=None, batch_size=5000, bootstrap_method="bootstrap"):
         "Predict using specified snapshot"
         model_snapshots = jamie.snapshots.ModelSnapshotCollection(
             self.cf["common.snapshots"]
         )
         snapshot = model_snapshots[snapshot] if snapshot else model_snapshots.latest()
-        print(jamie.predict.Predict(snapshot).predict().dataframe)
+        print(
+            jamie.predict.Predict(
+                snapshot, bootstrap_method=bootstrap_method, batch_size=batch_size
+            )
+            .predict()
+            .dataframe
+        )
+
+    def pack(self, snapshot=None):
+        "Pack model ensemble of specified snapshot into a single file"
+        model_snapshots = jamie.snapshots.ModelSnapshotCollection(
+            self.cf["common.snapshots"]
+        )
+        snapshot = model_snapshots[snapshot] if snapshot else model_snapshots.latest()
+        if snapshot.ensemble is not None:
+            print(success("Model ensemble already packed: {}".format(snapshot.name)))
+            return
+        snapshot.pack()
+        print(success("Packed model ensemble: {}".format(snapshot.name)))
 
     def random_sample_prediction(
         self, snapshot=None, n_each_class=100, random_state=100
@@ -215,7 +245,7 @@ class Jamie:
             self.cf["common.snapshots"]
         )
         snapshot = predictions[snapshot] if snapshot else predictions.latest()
-        report = jamie.reports.Report(snapshot).create()
+        report = jamie.reports.Report(snapshot, self.cf["report.n-jobs"]).create()
         print(success("Report successfully created"))
         print("   View it: jamie view-report {}".format(report.snapshot.name))
 
@@ -230,6 +260,9 @@ class Jamie:
         training_snapshot=None,
         text_column="description",
         output_column="aggregate_tags",
+        block_size=None,
+        n_jobs=1,
+        top_k=None,
     ):
         "Calculates information gain for text ngrams in training snapshot"
         training_snapshot = (
@@ -237,7 +270,9 @@ class Jamie:
             if training_snapshot
             else jamie.snapshots.TrainingSnapshotCollection().latest()
         )
-        return _information_gain(training_snapshot, text_column, output_column)
+        return _information_gain(
+            training_snapshot, text_column, output_column, block_size, n_jobs, top_k
+        )
 
     def list_jobids(self):
         "List job ids from jobs database"
@@ -17,7 +17,7 @@ operations are performed:
 import re
 import unicodedata
 import sys
-from contextlib import suppress
+from functools import lru_cache
 import nltk
 
 REGEX_EMAIL = re.compile(
@@ -29,44 +29,38 @@ REGEX_EMAIL = re.compile(
 )
 REGEX_SPLIT = re.compile(r",|/|-|\s|'")
 
-# To remove trailing space with translate in Python 3, need to apply the
-# following workaround in order to build the TABLE to use in the translate
-# func()
-
-# Workaround can be found on the following http://stackoverflow.com/questions/11066400
-# Discussion about removing punctuation http://stackoverflow.com/questions/265960
-
-TABLE = dict.fromkeys(
-    i for i in range(sys.maxunicode) if unicodedata.category(chr(i)).startswith("P")
-)
+# Version of the text cleaning, increment when the output of clean_text()
+# changes, so that cached cleaned text (see jamie.text_cache) is not reused
+VERSION = 1
 
 # Exceptions that have been encountered and are not dealt with all the
 # automated options
 EXCEPTIONS = set("``")
 
+# After tokenise the `'ll` `'s` `'nt` are considered as single word
+# - `'s`: Removed as it is kept like that later and not being
+#         distinguished between the verb and the possessive
+# - `'ll`: transform into `will`
+# - `'nt`: Is transformed into `n't` by the token_sentence().
+#          Convert this `n't` into `not`
+APOSTROPHES = {"'s": None, "'ll": "will", "n't": "not"}
 
-def _remove_email(sentence):
-    return re.sub(REGEX_EMAIL, "", sentence)
-
-
-def _break_word(sent):
-    return nltk.word_tokenize(re.sub(REGEX_SPLIT, " ", sent))
-
-
-def _remove_number(word):
-    return word if not _is_numeric(word) else None
 
+@lru_cache(maxsize=None)
+def punctuation_table():
+    """Translation table removing all punctuation characters, built on first use.
 
-def _remove_exceptions(word):
-    return word if word not in EXCEPTIONS else None
-
-
-def _remove_trailing_punctuation(word):
-    return word.translate(TABLE)
+    Discussion about removing punctuation http://stackoverflow.com/questions/265960
+    """
+    return dict.fromkeys(
+        i for i in range(sys.maxunicode) if unicodedata.category(chr(i)).startswith("P")
+    )
 
 
-def _lower_case(word):
-    return word.lower() if isinstance(word, str) else None
+@lru_cache(maxsize=None)
+def stopwords():
+    "Set of English stopwords, loaded on first use"
+    return frozenset(nltk.corpus.stopwords.words("english"))
 
 
 def _is_numeric(s):
@@ -77,62 +71,88 @@ def _is_numeric(s):
         return False
 
 
-def _transform_apostrophe(word):
-    """
-    After tokenise the `'ll` `'s` `'nt` are considered as single word
-    - `'s`: Removed as it is kept like that later and not being
-            distinguished between the verb and the possessive
-            #  TODO Check if the pos_tag_sentence() makes accurate distinction
-    - `'ll`: transform into `will`
-    - `'nt`: Is transformed into `n't` by the token_sentence().
-                Convert this `n't` into `not`
-    """
-    return {"'s": None, "'ll": "will", "n't": "not"}.get(word, word)
-
+def _clean_word(word):
+    """Clean a single token, returns None if the token should be removed.
 
-def _remove_currency(word):
+    The token is transformed if it is an apostrophe contraction, and has
+    punctuation removed. It is then removed if it is a number, starts or ends
+    with a currency symbol (after lowercasing), or is a URL.
+    """
+    word = APOSTROPHES.get(word, word)
+    if word is None:
+        return None
+    if not word.isalnum():  # alphanumeric words do not contain punctuation
+        word = word.translate(punctuation_table())
+    if not word or _is_numeric(word):
+        return None
+    word = word.lower()
     # http://stackoverflow.com/questions/25978771/what-is-regex-for-currency-symbol
-    with suppress(IndexError, TypeError):
-        for ch in [word[0], word[-1]]:
-            if unicodedata.category(ch) == "Sc":
-                return None
-        return word
-
-
-def _remove_stop_sent(sent):
-    "Remove stopwords from sentence"
-    return [word for word in sent if word not in nltk.corpus.stopwords.words("english")]
-
-
-def _remove_url(word):
-    with suppress(AttributeError):
-        if not word.startswith(("www", "http")):
-            return word
-
-
-def _clean_word(word):
-    for transform in [
-        _transform_apostrophe,
-        _remove_trailing_punctuation,
-        _remove_number,
-        _lower_case,
-        _remove_currency,
-        _remove_exceptions,
-        _remove_url,
-    ]:
-        word = transform(word)
+    if unicodedata.category(word[0]) == "Sc" or unicodedata.category(word[-1]) == "Sc":
+        return None
+    if word in EXCEPTIONS or word.startswith(("www", "http")):
+        return None
     return word
 
 
-def _clean_sentence(input_list):
-    return filter(  # Remove None from list
-        None, map(_clean_word, _break_word(_remove_email(input_list)))
-    )
+def _clean_sentence(sentence, stop):
+    words = nltk.word_tokenize(REGEX_SPLIT.sub(" ", REGEX_EMAIL.sub("", sentence)))
+    return [
+        word
+        for word in map(_clean_word, words)
+        if word is not None and word not in stop
+    ]
 
 
 def clean_text(text, remove_stop=True, flat_list=True):
-    "Main text cleaning method"
-    sentences = map(_clean_sentence, nltk.sent_tokenize(text))
-    if remove_stop:
-        sentences = map(_remove_stop_sent, sentences)
-    return sum(sentences, []) if flat_list else list(sentences)
+    """Main text cleaning method
+
+    Parameters
+    ----------
+    text : str
+        Text to clean
+    remove_stop : bool, default=True
+        Whether to remove stopwords
+    flat_list : bool, default=True
+        Whether to return a single list of words, or a list of words
+        for each sentence
+
+    Returns
+    -------
+    List[str] or List[List[str]]
+        Cleaned words
+    """
+    stop = stopwords() if remove_stop else frozenset()
+    sentences = [_clean_sentence(s, stop) for s in nltk.sent_tokenize(text)]
+    return [w for s in sentences for w in s] if flat_list else sentences
+
+
+def clean_texts(texts, remove_stop=True, flat_list=True):
+    """Clean a batch of texts. This gives the same result as calling
+    :func:`clean_text` on each text, but texts that occur more than once
+    in the batch, such as common job titles, are only cleaned once.
+
+    Parameters
+    ----------
+    texts : Iterable[str]
+        Texts to clean
+    remove_stop : bool, default=True
+        Whether to remove stopwords
+    flat_list : bool, default=True
+        Whether to return a single list of words, or a list of words
+        for each sentence, for each text
+
+    Returns
+    -------
+    List[List[str]] or List[List[List[str]]]
+        Cleaned words for each text
+    """
+    cleaned = {}
+    out = []
+    for text in texts:
+        if text not in cleaned:
+            cleaned[text] = clean_text(text, remove_stop, flat_list)
+        # copy so that modifying one result does not affect the others
+        out.append(
+            list(cleaned[text]) if flat_list else [list(s) for s in cleaned[text]]
+        )
+    return out
@@ -7,11 +7,21 @@ DEFAULTS = {
     "common.snapshots": "snapshots",
     "scrape.folder": "input",
     "scrape.njobs": 10000,
+    "scrape.page-size": 100,
+    "scrape.concurrency": 4,
+    "scrape.rate": 2.0,
+    "scrape.timeout": 30,
+    "scrape.retries": 3,
+    "scrape.archive": False,
+    "scrape.parser": "html.parser",
     "db.name": "jobsDB",
     "db.tags": "tags",
     "db.jobs": "jobs",
     "db.prediction": "prediction",
     "model.k-fold": 5,
+    "model.n-jobs": -1,
+    "load.n-jobs": -1,
+    "report.n-jobs": 1,
 }
 
 
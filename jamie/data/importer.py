@@ -4,38 +4,306 @@
 """
 Python module to import scraped job data in HTML format
 downloaded from www.jobs.ac.uk to mongodb, after cleaning.
+
+Job pages are read from the scrape folder, or from a compressed
+:class:`jamie.scrape.archive.Archive` if the ``scrape.archive`` configuration
+is set, in which case they are streamed in the order in which they are stored.
+Job pages are parsed in parallel by a pool of worker processes, each parsing
+chunks of :data:`CHUNK_SIZE` job pages. Parsed chunks are returned as soon as
+they are ready, irrespective of order, and inserted into MongoDB using a
+single unordered bulk insert for each chunk.
+
+Imported jobs are recorded in an :class:`ImportManifest`, so that subsequent
+imports only parse files that are new or have changed since they were
+imported.
 """
 
+import json
+import joblib
 import pymongo
 from collections import defaultdict
 from ..logger import logger
 from ..lib import connect_mongo
-from ..scrape.process import JobFile
+from ..scrape.archive import open_store
+from ..scrape.process import PARSER
 
 logger = logger(name="importer", stream_level="DEBUG")
 REPORT_INTERVAL = 10000  # report progress of database import every N jobs
+CHUNK_SIZE = 100  # number of job pages parsed by a worker process at a time
+DUPLICATE_KEY_ERROR = 11000  # MongoDB error code
+
+
+def _parse_jobs(store, keys, parser=PARSER):
+    "Parse a chunk of job pages from store, returning the job data of each"
+    jobs = (j.parse() for j in store.jobs(keys, parser))
+    return [job.data for job in jobs if job.data]
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _import_chunks(
+    input_folder, skip, n_jobs=1, chunk_size=CHUNK_SIZE, archive=False, parser=PARSER
+):
+    """Iterate over chunks of JobFile data, parsed in parallel
+
+    Parameters
+    ----------
+    input_folder : Path
+        Input folder containing job data in HTML format, or archive folder
+    skip : Container[str]
+        File stems (without suffix) to skip. Usually this is the
+        :class:`ImportManifest` of already recorded jobids
+    n_jobs : int, default=1
+        Number of worker processes, -1 uses all processors
+    chunk_size : int, default=:data:`CHUNK_SIZE`
+        Number of job pages parsed by a worker process at a time
+    archive : bool, default=False
+        Whether input_folder is a :class:`jamie.scrape.archive.Archive`
+    parser : str, default=:data:`jamie.scrape.process.PARSER`
+        Parser backend used by BeautifulSoup
+
+    Yields
+    ------
+    List[dict]
+        Job data of a chunk of files. Chunks are yielded in the order in
+        which they finish parsing, and at most two chunks per worker
+        process are in progress at any time.
+    """
+    store = open_store(input_folder, archive)
+    keys = (k for k in store.keys() if store.jobid(k) not in skip)
+    if n_jobs == 1:
+        for chunk in _chunks(keys, chunk_size):
+            yield _parse_jobs(store, chunk, parser)
+        return
+    yield from joblib.Parallel(
+        n_jobs=n_jobs, return_as="generator_unordered", pre_dispatch="2*n_jobs"
+    )(
+        joblib.delayed(_parse_jobs)(store, chunk, parser)
+        for chunk in _chunks(keys, chunk_size)
+    )
 
 
-def _import_iterator(input_folder, skip):
+def _import_iterator(input_folder, skip, n_jobs=1, archive=False, parser=PARSER):
     """Iterate over JobFile data
 
     Parameters
     ----------
     input_folder : Path
-        Input folder containing job data in HTML format
-    skip : List[str]
-        List of file stems (without suffix) to skip. Usually this is
-        the set of already recorded jobids
+        Input folder containing job data in HTML format, or archive folder
+    skip : Container[str]
+        File stems (without suffix) to skip. Usually this is the
+        :class:`ImportManifest` of already recorded jobids
+    n_jobs : int, default=1
+        Number of worker processes, -1 uses all processors
+    archive : bool, default=False
+        Whether input_folder is a :class:`jamie.scrape.archive.Archive`
+    parser : str, default=:data:`jamie.scrape.process.PARSER`
+        Parser backend used by BeautifulSoup
 
     Yields
     ------
     dict
         Job data in a dictionary
     """
-    for filename in (f for f in input_folder.glob("*") if f.stem not in skip):
-        job = JobFile(filename).parse()
-        if job.data:
-            yield job.data
+    for chunk in _import_chunks(
+        input_folder, skip, n_jobs, archive=archive, parser=parser
+    ):
+        yield from chunk
+
+
+class ImportManifest:
+    """Index of jobs already imported into the database, persisted to disk.
+
+    The manifest is a JSON lines file. The first line records the identity
+    of the jobs collection, see :func:`collection_id`, and each following
+    line an imported job, with its jobid and the stat of its job page, see
+    :meth:`jamie.scrape.archive.Folder.stat` and
+    :meth:`jamie.scrape.archive.Archive.stat`. New jobs are appended to the
+    file after each chunk is inserted, so the manifest is kept up to date
+    even if an import is interrupted. A job is in the manifest if it has
+    been imported and its job page has not changed since, which is a
+    dictionary lookup and a stat of the job page.
+
+    Parameters
+    ----------
+    filename : Path
+        Manifest file
+    store : jamie.scrape.archive.Folder or jamie.scrape.archive.Archive, optional
+        Store of job pages. If not specified, job pages are not checked for
+        changes, and jobs are only identified by their jobid
+    """
+
+    def __init__(self, filename, store=None):
+        self.filename = filename
+        self.store = store
+        self.collection = None
+        self.jobs = {}  # jobid: stat of job page when imported
+        if filename.exists():
+            with filename.open() as fp:
+                for line in fp:
+                    line = json.loads(line)
+                    if "jobid" in line:
+                        self.jobs[line["jobid"]] = line.get("stat")
+                    else:
+                        self.collection = line["collection"]
+
+    def __contains__(self, jobid):
+        if jobid not in self.jobs:
+            return False
+        return self.store is None or self.jobs[jobid] == self.store.stat(jobid)
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def _stat(self, jobid):
+        return None if self.store is None else self.store.stat(jobid)
+
+    def _append(self, lines):
+        with self.filename.open("a") as fp:
+            for line in lines:
+                fp.write(json.dumps(line, sort_keys=True) + "\n")
+
+    def add(self, jobs):
+        """Record imported jobs, with the current stat of their job pages
+
+        Parameters
+        ----------
+        jobs : List[dict]
+            Imported job data, containing the jobid
+        """
+        lines = [
+            {"jobid": job["jobid"], "stat": self._stat(job["jobid"])} for job in jobs
+        ]
+        self.jobs.update((line["jobid"], line["stat"]) for line in lines)
+        self._append(lines)
+
+    def rebuild(self, db_jobs, collection=None, batch_size=10000):
+        """Rebuild manifest from the jobs in the database, streamed using
+        a cursor. Jobs are recorded with the current stat of their job pages.
+
+        Parameters
+        ----------
+        db_jobs : pymongo.collection.Collection
+            Jobs collection
+        collection : str, optional
+            Identity of the jobs collection, see :func:`collection_id`
+        batch_size : int, default=10000
+            Number of jobids fetched from the database at a time
+        """
+        self.jobs = {}
+        self.collection = collection
+        self.filename.unlink(missing_ok=True)
+        lines = [{"collection": collection}]
+        for job in db_jobs.find({}, {"jobid": True, "_id": False}).batch_size(
+            batch_size
+        ):
+            stat = self.jobs[job["jobid"]] = self._stat(job["jobid"])
+            lines.append({"jobid": job["jobid"], "stat": stat})
+            if len(lines) == batch_size:
+                self._append(lines)
+                lines = []
+        self._append(lines)
+        return self
+
+
+def collection_id(db, name):
+    """Returns identity of a collection, which changes when the collection
+    or the database is dropped and created again, or None if it is not
+    known.
+
+    Parameters
+    ----------
+    db : pymongo.database.Database
+        Database
+    name : str
+        Collection name
+    """
+    for collection in db.list_collections(filter={"name": name}):
+        uuid = collection.get("info", {}).get("uuid")
+        if uuid is not None:
+            # uuid.UUID, or bson.binary.Binary depending on the UUID representation
+            uuid = getattr(uuid, "bytes", uuid).hex()
+            return "{}.{}:{}".format(db.name, name, uuid)
+    return None
+
+
+def insert_jobs(db_jobs, jobs, njobs):
+    """Insert jobs using an unordered bulk insert, so that all jobs are
+    inserted even if some are duplicates
+
+    Parameters
+    ----------
+    db_jobs : pymongo.collection.Collection
+        Jobs collection
+    jobs : List[dict]
+        Jobs to insert
+    njobs : defaultdict(int)
+        Counts of inserted jobs, duplicates and errors, which are updated
+
+    Returns
+    -------
+    List[dict]
+        Jobs that are now in the database, either inserted or duplicates
+    """
+    if not jobs:
+        return []
+    try:
+        njobs["inserted"] += len(db_jobs.insert_many(jobs, ordered=False).inserted_ids)
+        return jobs
+    except pymongo.errors.BulkWriteError as e:
+        njobs["inserted"] += e.details["nInserted"]
+        failed = set()
+        for error in e.details["writeErrors"]:
+            if error["code"] == DUPLICATE_KEY_ERROR:
+                njobs["duplicate"] += 1
+            else:
+                njobs["mongo_error"] += 1
+                failed.add(error["index"])
+        return [job for i, job in enumerate(jobs) if i not in failed]
+    except pymongo.errors.PyMongoError:
+        njobs["mongo_error"] += len(jobs)
+        return []
+
+
+def replace_jobs(db_jobs, jobs, njobs):
+    """Replace jobs whose job pages have changed since they were imported,
+    using a single unordered bulk write
+
+    Parameters
+    ----------
+    db_jobs : pymongo.collection.Collection
+        Jobs collection
+    jobs : List[dict]
+        Jobs to replace, inserted if they are not in the database
+    njobs : defaultdict(int)
+        Counts of inserted jobs, duplicates and errors, which are updated
+
+    Returns
+    -------
+    List[dict]
+        Jobs that are now in the database
+    """
+    if not jobs:
+        return []
+    try:
+        db_jobs.bulk_write(
+            [pymongo.ReplaceOne({"jobid": j["jobid"]}, j, upsert=True) for j in jobs],
+            ordered=False,
+        )
+        njobs["updated"] += len(jobs)
+        return jobs
+    except pymongo.errors.PyMongoError:
+        njobs["mongo_error"] += len(jobs)
+        return []
 
 
 def log_missing_attributes(data, attributes):
@@ -45,7 +313,13 @@ def log_missing_attributes(data, attributes):
 
 
 def main(config, dry_run=False):
-    """Import data from HTML to MongoDB
+    """Import data from HTML to MongoDB. Files are parsed in parallel using
+    the number of worker processes in the ``load.n-jobs`` configuration.
+    Files corresponding to jobs in the :class:`ImportManifest` are skipped,
+    and jobs whose files have changed since they were imported are replaced.
+    The manifest is rebuilt from the database if it was not written for the
+    same jobs collection, see :func:`collection_id`, such as when the
+    database has been dropped.
 
     Parameters
     ----------
@@ -65,25 +339,43 @@ def main(config, dry_run=False):
         db_jobs = db_conn[config["db.jobs"]]
         db_jobs.create_index("jobid", unique=True)  # faster searches for "jobid"
 
-        recorded_jobs = db_jobs.distinct("jobid")
-        logger.info("Already recorded jobs: {}".format(len(recorded_jobs)))
+        manifest = ImportManifest(
+            config.cache
+            / "import_{}_{}.jsonl".format(config["db.name"], config["db.jobs"]),
+            open_store(config["scrape.folder"], config["scrape.archive"]),
+        )
+        collection = collection_id(db_conn, config["db.jobs"])
+        if collection is None or manifest.collection != collection:
+            logger.info("Rebuilding import manifest from database")
+            manifest.rebuild(db_jobs, collection)
+        logger.info("Already recorded jobs: {}".format(len(manifest)))
         njobs = defaultdict(int)
-        for data in _import_iterator(config["scrape.folder"], skip=recorded_jobs):
-            if njobs["inserted"] % REPORT_INTERVAL == 0:
+        reported = 0
+        for jobs in _import_chunks(
+            config["scrape.folder"],
+            skip=manifest,
+            n_jobs=config["load.n-jobs"],
+            archive=config["scrape.archive"],
+            parser=config["scrape.parser"],
+        ):
+            changed = [job for job in jobs if job["jobid"] in manifest.jobs]
+            new = [job for job in jobs if job["jobid"] not in manifest.jobs]
+            manifest.add(insert_jobs(db_jobs, new, njobs))
+            manifest.add(replace_jobs(db_jobs, changed, njobs))
+            if sum(njobs.values()) - reported >= REPORT_INTERVAL:
+                reported = sum(njobs.values())
                 logger.debug(
                     "Progress %s",
                     ", ".join("{} {}".format(v, k) for k, v in njobs.items()),
                 )
-
-            try:
-                db_jobs.insert(data)
-                njobs["inserted"] += 1
-            except pymongo.errors.DuplicateKeyError:
-                njobs["duplicate"] += 1
-            except pymongo.errors:
-                njobs["mongo_error"] += 1
         logger.info("Final import state %s", njobs)
         return njobs
     else:
-        for data in _import_iterator(config["scrape.folder"], skip=[]):
+        for data in _import_iterator(
+            config["scrape.folder"],
+            skip=[],
+            n_jobs=config["load.n-jobs"],
+            archive=config["scrape.archive"],
+            parser=config["scrape.parser"],
+        ):
             log_missing_attributes(data, ["description", "job_title", "date"])
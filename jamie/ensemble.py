@@ -0,0 +1,366 @@
+"""Model ensembles
+
+Packed ensembles
+----------------
+
+A model snapshot contains an ensemble of models with their feature pipelines.
+Instead of saving each of these as a separate pickle, the ensemble can be
+packed into a single file, which has the following layout:
+
+* 8 byte magic string ``JAMIEENS``, followed by the offset and length of
+  the header as 8 byte little-endian integers
+* Data blocks, each aligned to :data:`ALIGNMENT` bytes
+* JSON header, describing the blocks in the file
+
+Models and feature pipelines are pickled using protocol 5 with numpy arrays
+(such as coefficients and IDF weights) stored out-of-band in their own data
+blocks. When loading, the file is memory-mapped and these arrays are read
+directly from the mapped pages, without copying. Several processes loading
+the same ensemble share these pages.
+
+The vocabularies of the text vectorizers are mostly the same across members
+of the ensemble. All terms are stored once, with each vocabulary stored as
+an array of term indices and an array of feature columns. Feature pipelines
+shared by several members are stored once.
+
+Linear ensembles
+----------------
+
+When the members of the ensemble are linear models that share the same
+feature pipeline, :class:`LinearEnsemble` computes the probabilities for all
+members with a single matrix product.
+"""
+
+import io
+import os
+import json
+import mmap
+import pickle
+import numpy as np
+import scipy.sparse
+from scipy.special import expit
+from sklearn.base import BaseEstimator
+from sklearn.svm import SVC
+from sklearn.linear_model import LogisticRegression
+
+MAGIC = b"JAMIEENS"
+ALIGNMENT = 64  # bytes
+VERSION = 1
+
+
+def _vectorizers(obj, seen=None):
+    "Yields text vectorizers (objects with a vocabulary_) found in obj"
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return
+    seen.add(id(obj))
+    if isinstance(obj, BaseEstimator):
+        if isinstance(getattr(obj, "vocabulary_", None), dict):
+            yield obj
+        obj = list(obj.__dict__.values())
+    if isinstance(obj, dict):
+        obj = list(obj.values())
+    if isinstance(obj, (list, tuple)):
+        for o in obj:
+            yield from _vectorizers(o, seen)
+
+
+class _Writer:
+    "Writes aligned data blocks to a file object"
+
+    def __init__(self, fp):
+        self.fp = fp
+
+    def write(self, data):
+        "Write data and return its position as [offset, length]"
+        data = memoryview(data).cast("B")
+        offset = self.fp.tell()
+        self.fp.write(data)
+        self.fp.write(b"\0" * (-self.fp.tell() % ALIGNMENT))
+        return [offset, len(data)]
+
+    def array(self, array):
+        "Write numpy array and return its description"
+        array = np.ascontiguousarray(array)
+        return {
+            "block": self.write(array),
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+        }
+
+
+class _Pickler(pickle.Pickler):
+    """Pickler that replaces vocabularies by references to the shared
+    vocabularies, and drops the stop_words_ of vectorizers, which only
+    contains terms that were removed from the vocabulary and is not needed
+    for transformation. The pickled objects are not modified."""
+
+    def __init__(self, file, vocabularies, vectorizers, **kwargs):
+        super().__init__(file, protocol=5, **kwargs)
+        self.vocabularies = vocabularies
+        self.vectorizers = vectorizers
+
+    def persistent_id(self, obj):
+        if type(obj) is dict and id(obj) in self.vocabularies:
+            return ("vocabulary", self.vocabularies[id(obj)])
+        return None
+
+    def reducer_override(self, obj):
+        if id(obj) not in self.vectorizers:
+            return NotImplemented
+        reduced = obj.__reduce_ex__(5)
+        state = {**reduced[2], "stop_words_": None}
+        return (*reduced[:2], state, *reduced[3:])
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, file, ensemble, **kwargs):
+        super().__init__(file, **kwargs)
+        self.ensemble = ensemble
+
+    def persistent_load(self, pid):
+        kind, k = pid
+        if kind != "vocabulary":
+            raise pickle.UnpicklingError("Unknown persistent id: %r" % (pid,))
+        return self.ensemble.vocabulary(k)
+
+
+def pack(members, filename):
+    """Pack an ensemble into a single file.
+
+    Parameters
+    ----------
+    members : Iterable[Tuple[str, model, sklearn.pipeline.FeatureUnion]]
+        Index, model and feature pipeline of each member of the ensemble.
+        The order of the members is preserved.
+    filename : Path
+        File to write packed ensemble to. The file is written atomically,
+        so an interrupted write does not leave a partial ensemble.
+    """
+    members = list(members)
+    vectorizers = [v for _, _, f in members for v in _vectorizers(f)]
+    with_stop_words = {id(v) for v in vectorizers if hasattr(v, "stop_words_")}
+    terms = sorted(set().union(*(v.vocabulary_ for v in vectorizers)))
+    if any("\0" in t for t in terms):
+        raise ValueError("Vocabulary terms can not contain null characters")
+    term_index = {t: i for i, t in enumerate(terms)}
+    vocabularies = {id(v.vocabulary_): k for k, v in enumerate(vectorizers)}
+
+    tmp = filename.with_suffix(".tmp")
+    with tmp.open("wb") as fp:
+        # Reserve space for the header, which is written at the end
+        # when the positions of the blocks are known
+        fp.write(b"\0" * ALIGNMENT)
+        writer = _Writer(fp)
+        header = {
+            "version": VERSION,
+            "terms": writer.write("\0".join(terms).encode("utf-8")),
+            "vocabularies": [],
+            "members": [],
+        }
+        for v in vectorizers:
+            words = list(v.vocabulary_)
+            header["vocabularies"].append(
+                {
+                    "terms": writer.array(
+                        np.array([term_index[t] for t in words], dtype=np.int64)
+                    ),
+                    "columns": writer.array(
+                        np.array([v.vocabulary_[t] for t in words], dtype=np.int64)
+                    ),
+                }
+            )
+
+        written = {}
+
+        def write_object(obj):
+            if id(obj) in written:
+                return written[id(obj)]
+            buffers = []
+            data = io.BytesIO()
+            _Pickler(
+                data, vocabularies, with_stop_words, buffer_callback=buffers.append
+            ).dump(obj)
+            written[id(obj)] = {
+                "pickle": writer.write(data.getbuffer()),
+                "buffers": [writer.write(b.raw()) for b in buffers],
+            }
+            return written[id(obj)]
+
+        for index, model, features in members:
+            header["members"].append(
+                {
+                    "index": str(index),
+                    "model": write_object(model),
+                    "features": write_object(features),
+                }
+            )
+        header = json.dumps(header, sort_keys=True).encode("utf-8")
+        header_offset = writer.write(header)
+        fp.seek(0)
+        fp.write(MAGIC + np.array(header_offset, dtype="<i8").tobytes())
+    os.replace(tmp, filename)
+
+
+class PackedEnsemble:
+    """Ensemble of models packed into a single file by :func:`pack`.
+
+    The file is memory-mapped, and members of the ensemble are only
+    unpickled when requested.
+
+    Parameters
+    ----------
+    filename : Path
+        Packed ensemble file
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        with filename.open("rb") as fp:
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError("Not a packed ensemble: %s" % filename)
+        offset, length = np.frombuffer(
+            self._mmap, dtype="<i8", count=2, offset=len(MAGIC)
+        )
+        self._header = json.loads(self._block([offset, length]).tobytes())
+        self._members = {m["index"]: m for m in self._header["members"]}
+        self._terms = None
+        self._vocabularies = {}
+        # Objects shared by several members are only unpickled once
+        pickles = [
+            tuple(m[kind]["pickle"])
+            for m in self._header["members"]
+            for kind in ["model", "features"]
+        ]
+        self._shared = {p: None for p in pickles if pickles.count(p) > 1}
+
+    def _block(self, block):
+        offset, length = block
+        return memoryview(self._mmap)[offset : offset + length]
+
+    def _array(self, description):
+        return np.frombuffer(
+            self._block(description["block"]), dtype=description["dtype"]
+        ).reshape(description["shape"])
+
+    def _object(self, description):
+        key = tuple(description["pickle"])
+        if self._shared.get(key) is not None:
+            return self._shared[key]
+        obj = _Unpickler(
+            io.BytesIO(self._block(description["pickle"])),
+            self,
+            buffers=[self._block(b) for b in description["buffers"]],
+        ).load()
+        if key in self._shared:
+            self._shared[key] = obj
+        return obj
+
+    @property
+    def indices(self):
+        "Indices of the members of the ensemble"
+        return [m["index"] for m in self._header["members"]]
+
+    def vocabulary(self, k):
+        "Returns vocabulary k as a dictionary mapping terms to feature columns"
+        if k not in self._vocabularies:
+            if self._terms is None:
+                self._terms = (
+                    self._block(self._header["terms"])
+                    .tobytes()
+                    .decode("utf-8")
+                    .split("\0")
+                )
+            description = self._header["vocabularies"][k]
+            self._vocabularies[k] = {
+                self._terms[t]: c
+                for t, c in zip(
+                    self._array(description["terms"]).tolist(),
+                    self._array(description["columns"]).tolist(),
+                )
+            }
+        return self._vocabularies[k]
+
+    def model(self, index):
+        "Returns model at index"
+        return self._object(self._members[str(index)]["model"])
+
+    def features(self, index):
+        "Returns feature pipeline at index"
+        return self._object(self._members[str(index)]["features"])
+
+
+class LinearEnsemble:
+    """Ensemble of linear models sharing the same features.
+
+    The coefficients of the members are stacked into a single matrix, so
+    that the decision functions of all the members are obtained from one
+    sparse-times-dense matrix product. Probabilities are then computed in
+    the same manner as predict_proba() of each model.
+
+    Parameters
+    ----------
+    models : List[model]
+        Fitted binary classifiers, either LogisticRegression or SVC with a
+        linear kernel and probability estimates, optionally as the last step
+        of a Pipeline.
+
+    Raises
+    ------
+    ValueError
+        If any of the models are not supported
+    """
+
+    def __init__(self, models):
+        classifiers = [m.steps[-1][1] if hasattr(m, "steps") else m for m in models]
+        if all(isinstance(c, LogisticRegression) for c in classifiers):
+            self.kind = "logistic"
+        elif all(
+            isinstance(c, SVC) and c.kernel == "linear" and c.probability
+            for c in classifiers
+        ):
+            self.kind = "svc"
+            self.prob_a = np.array([c.probA_[0] for c in classifiers])
+            self.prob_b = np.array([c.probB_[0] for c in classifiers])
+        else:
+            raise ValueError(
+                "LinearEnsemble requires LogisticRegression or linear SVC models"
+            )
+        if any(len(c.classes_) != 2 for c in classifiers):
+            raise ValueError("LinearEnsemble requires binary classifiers")
+        self.coef = np.vstack(
+            [
+                c.coef_.toarray() if scipy.sparse.issparse(c.coef_) else c.coef_
+                for c in classifiers
+            ]
+        )
+        self.intercept = np.array([c.intercept_[0] for c in classifiers])
+
+    def decision_function(self, X):
+        "Decision function of each member, as a matrix of shape (n_docs, n_models)"
+        return X @ self.coef.T + self.intercept
+
+    def predict_proba(self, X):
+        """Probabilities of the positive class from each member of the ensemble.
+
+        Parameters
+        ----------
+        X : scipy.sparse.csr_matrix
+            Feature matrix from the shared feature pipeline
+
+        Returns
+        -------
+        numpy.ndarray
+            Matrix of shape (n_docs, n_models)
+        """
+        decision = self.decision_function(X)
+        if self.kind == "logistic":
+            return expit(decision)
+        # Platt scaling as done by libsvm, which gives the probability of the
+        # first class in terms of the libsvm decision function (the negative
+        # of the decision function in scikit-learn for binary classifiers).
+        # libsvm then solves the pairwise coupling problem iteratively, which
+        # for two classes stops within 0.005 of this exact solution
+        negative = expit(self.prob_a * decision - self.prob_b)
+        return 1 - np.clip(negative, 1e-7, 1 - 1e-7)
@@ -30,3 +30,17 @@ def valid_doc(features, doc):
     return doc is not None and all(
         doc[x][0] is not None for x in featuresets[features].require_columns
     )
+
+
+def valid_record(features, record):
+    """Check whether a record, such as a document from MongoDB, is valid
+    according to featureset required columns. This is the same check as
+    :func:`valid_doc`, but operates on a dictionary instead of a single
+    row pd.DataFrame.
+
+    Returns
+    -------
+    bool
+        Whether record is valid
+    """
+    return all(record.get(x) is not None for x in featuresets[features].require_columns)
@@ -83,6 +83,9 @@ class FeatureBase:
         List of required columns in DataFrame.
     clean_columns : list of str, optional
         List of columns to apply text cleaning to
+    cache : :class:`jamie.text_cache.CleanTextCache`, optional
+        Cache of cleaned text, if specified cleaned text is read from and
+        saved to the cache
 
     Raises
     ------
@@ -90,14 +93,21 @@ class FeatureBase:
         If any of the required columns are missing
     """
 
-    def __init__(self, data, require_columns, clean_columns=None):
+    def __init__(self, data, require_columns, clean_columns=None, cache=None):
         self.features = None
         self.data = data
         if any(f not in self.data for f in require_columns):
             raise ValueError("Missing one of required columns %r" % require_columns)
         if clean_columns:
             for tc in clean_columns:
-                self.data[tc] = self.data[tc].apply(lambda x: " ".join(clean_text(x)))
+                if cache is None:
+                    self.data[tc] = self.data[tc].apply(
+                        lambda x: " ".join(clean_text(x))
+                    )
+                else:
+                    self.data[tc] = cache.clean(self.data[tc])
+            if cache is not None:
+                cache.save()
 
     def set_features(self, features):
         "Set features using a FeatureUnion"
@@ -194,3 +204,26 @@ class FeatureBase:
             random_state=random_state,
             stratify=self.labels,
         )
+
+    def train_test_indices(self, random_state, test_size=0.2):
+        """Return row indices of the train test split given by
+        :meth:`train_test_split` for the same random_state.
+
+        Parameters
+        ----------
+        random_state : int or RandomState
+            Random state to use
+        test_size : float, default=0.2
+            Proportion of data to use for test
+
+        Returns
+        -------
+        numpy.ndarray tuple
+            Returns indices of the train and test rows
+        """
+        return model_selection.train_test_split(
+            np.arange(len(self.labels)),
+            test_size=test_size,
+            random_state=random_state,
+            stratify=self.labels,
+        )
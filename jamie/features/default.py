@@ -43,11 +43,12 @@ class RSEFeatures(FeatureBase):
     require_columns = ["description", "job_title"]
     description = "Features corresponding to RSE jobs"
 
-    def __init__(self, data):
+    def __init__(self, data, cache=None):
         super().__init__(
             data,
             require_columns=self.require_columns,
             clean_columns=self.require_columns,
+            cache=cache,
         )
         self.set_features(
             [_text_feature("description", 24000), _text_feature("job_title")]
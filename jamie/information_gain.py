@@ -1,10 +1,17 @@
-import operator
+import csv
+import heapq
+import joblib
 import numpy as np
+import scipy.sparse
 from scipy.stats import rankdata
+from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.feature_extraction.text import CountVectorizer
 from collections import defaultdict
 import pandas as pd
-from .clean_text import clean_text
+
+BLOCK_SIZE = 10000  # number of columns processed at a time in chunked mode
+DOCUMENT_BATCH = 1000  # number of documents analysed by a worker process at a time
+WRITE_SIZE = 10000  # number of rows written at a time to the output CSV
 
 
 def L(col, y):  # as in (2.5) on p29 of Fundamentals of Predictive Text Mining
@@ -33,33 +40,325 @@ def V(col, y):  # as in (2.5) on p29 of Fundamentals of Predictive Text Mining
     return F[0], F[1], _JF[0, 0], _JF[0, 1], _JF[1, 0], _JF[1, 1]
 
 
-class InformationGainTransformer:
-    def __init__(self, rank_method="dense"):
+def information_gain(X, y):
+    """Information gain of every column of X, computed as in :func:`L`
+    from joint frequencies obtained using sparse matrix products
+
+    Parameters
+    ----------
+    X : scipy.sparse matrix or np.ndarray
+        Document-term matrix of shape (n_documents, n_terms), non-zero
+        entries are counted as the term occurring in the document
+    y : array-like
+        Binary labels of shape (n_documents,)
+
+    Returns
+    -------
+    np.ndarray
+        Information gain of each term, of shape (n_terms,)
+    """
+    X = scipy.sparse.csr_matrix(X)
+    y = np.asarray(y)
+    X_bin = X != 0  # boolean, counts are computed in int64
+    y1 = (y == 1).astype(np.int64)
+    y0 = (y == 0).astype(np.int64)
+    F1 = np.asarray(X_bin.sum(axis=0, dtype=np.int64)).ravel()  # documents with term
+    return _information_gain_counts(
+        X.shape[0], F1, X_bin.T @ y0, X_bin.T @ y1, y0.sum(), y1.sum()
+    )
+
+
+def _information_gain_counts(N, F1, JF10, JF11, N0, N1):
+    """Information gain of terms from the number of documents N, and for each
+    term the number of documents F1 containing it, of which JF10 have label 0
+    and JF11 have label 1. N0 and N1 are the number of documents with label 0
+    and 1."""
+    F = np.stack([N - F1, F1], axis=1)
+    JF = np.stack(  # joint frequencies, shape (n_terms, 2, 2)
+        [
+            np.stack([N0 - JF10, N1 - JF11], axis=1),
+            np.stack([JF10, JF11], axis=1),
+        ],
+        axis=1,
+    )
+    P = (F + 1) / (N + 2)
+    JP = (JF + 1) / (F + 2)[:, :, np.newaxis]
+    E = JP * np.log2(1 / JP)
+    return (P * E.sum(axis=2)).sum(axis=1)
+
+
+def _column_blocks(X, block_size):
+    "Yields (start, block) of column blocks of the CSC matrix X"
+    for start in range(0, X.shape[1], block_size):
+        yield start, X[:, start : start + block_size]
+
+
+def _block_information_gain(start, block, y):
+    return start, information_gain(block, y)
+
+
+def information_gain_blocks(X, y, block_size=BLOCK_SIZE, n_jobs=1):
+    """Information gain of columns of X, computed in column blocks so that
+    only one block per worker process is binarised at a time. X is converted
+    to CSC once, so that slicing a block only reads the columns in the block.
+
+    Parameters
+    ----------
+    X : scipy.sparse matrix
+        Document-term matrix of shape (n_documents, n_terms)
+    y : array-like
+        Binary labels of shape (n_documents,)
+    block_size : int, default=:data:`BLOCK_SIZE`
+        Number of columns in each block
+    n_jobs : int, default=1
+        Number of worker processes, -1 uses all processors
+
+    Yields
+    ------
+    start : int
+        Index of the first column of the block
+    values : np.ndarray
+        Information gain of the columns in the block, in the order in which
+        the blocks are computed
+    """
+    X = scipy.sparse.csc_matrix(X)
+    y = np.asarray(y)
+    if n_jobs == 1:
+        for start, block in _column_blocks(X, block_size):
+            yield _block_information_gain(start, block, y)
+        return
+    yield from joblib.Parallel(
+        n_jobs=n_jobs, return_as="generator_unordered", pre_dispatch="2*n_jobs"
+    )(
+        joblib.delayed(_block_information_gain)(start, block, y)
+        for start, block in _column_blocks(X, block_size)
+    )
+
+
+def _count_terms(analyzer, texts, labels):
+    """Returns number of documents containing each term, and how many of them
+    have label 0 and label 1, as a dictionary of term: [documents, 0, 1]"""
+    counts = {}
+    for text, label in zip(texts, labels):
+        for term in set(analyzer(text)):
+            count = counts.get(term)
+            if count is None:
+                count = counts[term] = [0, 0, 0]
+            count[0] += 1
+            if label == 0:
+                count[1] += 1
+            elif label == 1:
+                count[2] += 1
+    return counts
+
+
+def document_frequencies(texts, y, analyzer, n_jobs=1, batch_size=DOCUMENT_BATCH):
+    """Number of documents containing each term, and how many of them have
+    label 0 and label 1. Documents are analysed in batches, and only the
+    counts are kept, so no document-term matrix is built.
+
+    Parameters
+    ----------
+    texts : Sequence[str]
+        Documents
+    y : Sequence
+        Binary labels of the documents
+    analyzer : Callable[[str], List[str]]
+        Function returning the terms of a document, such as
+        :meth:`sklearn.feature_extraction.text.CountVectorizer.build_analyzer`
+    n_jobs : int, default=1
+        Number of worker processes analysing batches, -1 uses all processors
+    batch_size : int, default=:data:`DOCUMENT_BATCH`
+        Number of documents in each batch
+
+    Returns
+    -------
+    terms : List[str]
+        Terms in sorted order, the same order as the columns of a
+        document-term matrix from :class:`CountVectorizer`
+    counts : np.ndarray
+        Number of documents containing each term, and with label 0 and
+        label 1, of shape (n_terms, 3)
+    """
+    batches = (
+        (texts[start : start + batch_size], y[start : start + batch_size])
+        for start in range(0, len(texts), batch_size)
+    )
+    if n_jobs == 1:
+        results = (_count_terms(analyzer, t, labels) for t, labels in batches)
+    else:
+        results = joblib.Parallel(
+            n_jobs=n_jobs, return_as="generator_unordered", pre_dispatch="2*n_jobs"
+        )(joblib.delayed(_count_terms)(analyzer, t, labels) for t, labels in batches)
+    counts = {}
+    for batch in results:
+        for term, count in batch.items():
+            total = counts.get(term)
+            if total is None:
+                counts[term] = count
+            else:
+                total[0] += count[0]
+                total[1] += count[1]
+                total[2] += count[2]
+    terms = sorted(counts)
+    return terms, np.array([counts[t] for t in terms], dtype=np.int64).reshape(-1, 3)
+
+
+def _count_blocks(counts, y, block_size=BLOCK_SIZE):
+    """Yields (start, values) of information gain of blocks of terms, from
+    counts returned by :func:`document_frequencies`"""
+    y = np.asarray(y)
+    N0, N1 = (y == 0).sum(), (y == 1).sum()
+    for start in range(0, len(counts), block_size):
+        F1, JF10, JF11 = counts[start : start + block_size].T
+        yield start, _information_gain_counts(len(y), F1, JF10, JF11, N0, N1)
+
+
+def top_k_information_gain(blocks, k):
+    """Returns the k columns with the highest information gain, keeping
+    at most k columns in a heap
+
+    Parameters
+    ----------
+    blocks : Iterable[Tuple[int, np.ndarray]]
+        Column blocks of information gain, as yielded by
+        :func:`information_gain_blocks`
+    k : int
+        Number of columns to keep
+
+    Returns
+    -------
+    indices, values : np.ndarray
+        Column indices and information gain of the top k columns, in
+        ascending order of information gain
+    """
+    heap = []
+    for start, values in blocks:
+        # only the top k columns of a block can enter the heap
+        top = (
+            np.argpartition(-values, k - 1)[:k]
+            if len(values) > k
+            else range(len(values))
+        )
+        for i in top:
+            item = (values[i], -(start + i))
+            if len(heap) < k:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+    heap.sort()
+    return (
+        np.array([-i for _, i in heap], dtype=int),
+        np.array([v for v, _ in heap]),
+    )
+
+
+def write_ranked(fn, values, names, indices=None):
+    """Write n-grams in ascending order of information gain to a CSV file,
+    with the same columns as :meth:`InformationGainTransformer.sorted_dataframe`.
+    Rows are written :data:`WRITE_SIZE` at a time.
+
+    Parameters
+    ----------
+    fn : Path
+        Output CSV file
+    values : np.ndarray
+        Information gain
+    names : Sequence[str]
+        Names of all n-grams
+    indices : np.ndarray, optional
+        Indices of the n-grams in names corresponding to values, if not
+        specified values are the information gain of all n-grams
+    """
+    order = np.argsort(values, kind="stable")
+    if indices is None:
+        indices = np.arange(len(values))
+    with open(fn, "w", newline="") as fp:
+        writer = csv.writer(fp)
+        writer.writerow(["information", "ngram"])
+        for start in range(0, len(order), WRITE_SIZE):
+            rows = order[start : start + WRITE_SIZE]
+            writer.writerows(
+                zip(values[rows].tolist(), (names[i] for i in indices[rows]))
+            )
+
+
+class InformationGainTransformer(BaseEstimator, TransformerMixin):
+    """Rank n-grams by information gain, and select the top ranked n-grams.
+
+    A permutation of the n-grams sorted by information gain is computed by
+    :meth:`fit`, so that queries of n-grams by rank are slices of it.
+
+    Parameters
+    ----------
+    rank_method : str, default="dense"
+        Method used to assign ranks to ties, see :func:`scipy.stats.rankdata`
+    k : int, optional
+        Number of n-grams with the highest information gain selected by
+        :meth:`transform`. If not specified, :meth:`fit_transform` returns
+        the information gain instead.
+    """
+
+    def __init__(self, rank_method="dense", k=None):
         self.rank_method = rank_method
+        self.k = k
         self._information_gain = None
         self._ranked = None
 
-    def fit(self, X, y, names):
+    def fit(self, X, y, names=None):
         self.names = names
-        T = X.copy()  # make a copy
-        T[T != 0] = 1  # binarize it
-        if T.shape[1] != len(names):
+        if names is not None and X.shape[1] != len(names):
             raise ValueError(
                 "Incompatible shapes: X %s names %d" % (repr(X.shape), len(names))
             )
-        if T.shape[0] != len(y):
+        if X.shape[0] != len(y):
             raise ValueError(
                 "Incompatible shapes: X %s y %r" % (repr(X.shape), y.shape)
             )
-        self._information_gain = np.array(
-            [L(T[:, k].toarray().squeeze(), y) for k in range(T.shape[1])]
-        )
+        self._information_gain = information_gain(X, y)
         self._ranked = rankdata(self._information_gain, method=self.rank_method)
+        # Ranks increase with information gain, so the same permutation
+        # sorts both, with ties in order of column index
+        self._order = np.argsort(self._information_gain, kind="stable")
+        self._sorted_ranks = self._ranked[self._order]
+        return self
 
-    def fit_transform(self, X, y, names):
+    def fit_transform(self, X, y, names=None):
+        """Fit, and return the information gain of each column, or the
+        selected columns of X if :attr:`k` is specified"""
         self.fit(X, y, names)
+        if self.k is not None:
+            return self.transform(X)
         return self._information_gain
 
+    def transform(self, X):
+        """Select the :attr:`k` columns of X with the highest information gain
+
+        Parameters
+        ----------
+        X : scipy.sparse matrix or np.ndarray
+            Document-term matrix with the same columns as the fitted matrix
+
+        Returns
+        -------
+        scipy.sparse matrix or np.ndarray
+            Selected columns of X, in the order of the columns in X. Sparse
+            matrices are not densified.
+        """
+        if self._ranked is None:
+            raise ValueError(
+                "InformationGainTransformer().fit needs to be "
+                "called before transform()"
+            )
+        if self.k is None:
+            raise ValueError("InformationGainTransformer(k=...) is required")
+        return X[:, self.support_]
+
+    @property
+    def support_(self):
+        "Column indices of the :attr:`k` n-grams with the highest information gain"
+        return np.sort(self._order[len(self._order) - self.k :])
+
     def sorted_dataframe(self):
         if self._information_gain is None:
             raise ValueError(
@@ -67,13 +366,17 @@ class InformationGainTransformer:
                 "called before sorted_dataframe()"
             )
         return pd.DataFrame(
-            data=sorted(
-                list(zip(self._information_gain, self.names)),
-                key=operator.itemgetter(0),
-            ),
+            {
+                "information": self._information_gain[self._order],
+                "ngram": np.asarray(self.names, dtype=object)[self._order],
+            },
             columns=["information", "ngram"],
         )
 
+    def _indices(self, start, end):
+        "Column indices of the ranks in the slice start:end of sorted ranks"
+        return np.sort(self._order[start:end])
+
     def indices_till_rank(self, rank):
         if self._ranked is None:
             raise ValueError(
@@ -83,17 +386,14 @@ class InformationGainTransformer:
         if rank == 0:
             raise ValueError("Rank should be positive or negative but not zero.")
         if rank > 0:
-            return np.array(
-                [idx for idx, r in list(enumerate(self._ranked)) if r <= rank]
+            return self._indices(
+                0, np.searchsorted(self._sorted_ranks, rank, side="right")
             )
         else:
-            max_rank = max(self._ranked)
-            return np.array(
-                [
-                    idx
-                    for idx, r in list(enumerate(self._ranked))
-                    if r >= (max_rank + rank + 1)
-                ]
+            max_rank = self._sorted_ranks[-1]
+            return self._indices(
+                np.searchsorted(self._sorted_ranks, max_rank + rank + 1, side="left"),
+                len(self._order),
             )
 
     def indices_at_rank(self, rank):
@@ -102,18 +402,75 @@ class InformationGainTransformer:
                 "InformationGainTransformer().fit needs to be "
                 "called before indices_at_rank()"
             )
-        return np.array([idx for idx, r in list(enumerate(self._ranked)) if r == rank])
+        return self._indices(
+            np.searchsorted(self._sorted_ranks, rank, side="left"),
+            np.searchsorted(self._sorted_ranks, rank, side="right"),
+        )
+
 
+def _information_gain(
+    training_snapshot,
+    text_column,
+    output_column="aggregate_tags",
+    block_size=None,
+    n_jobs=1,
+    top_k=None,
+):
+    """Calculates information gain for text n-grams in a training snapshot,
+    and writes the n-grams sorted by information gain to a CSV file in
+    the snapshot folder
 
-def _information_gain(training_snapshot, text_column, output_column="aggregate_tags"):
+    Parameters
+    ----------
+    training_snapshot : :class:`jamie.snapshots.TrainingSnapshot`
+        Training snapshot
+    text_column : str
+        Column with the text
+    output_column : str, default="aggregate_tags"
+        Column with the binary labels
+    block_size : int, optional
+        If specified, or if top_k is specified, information gain is computed
+        in blocks of this many n-grams (default :data:`BLOCK_SIZE`) from
+        document frequencies, see :func:`document_frequencies`, without
+        building a document-term matrix, which uses less memory
+    n_jobs : int, default=1
+        Number of worker processes analysing documents when computing in
+        blocks, -1 uses all processors
+    top_k : int, optional
+        If specified, only the top_k n-grams with the highest information
+        gain are kept and written
+
+    Returns
+    -------
+    Path
+        Output CSV file
+    """
     data = training_snapshot.data
-    data[text_column] = data[text_column].apply(lambda x: " ".join(clean_text(x)))
+    cache = training_snapshot.clean_text_cache
+    data[text_column] = cache.clean(data[text_column])
+    cache.save()
+    fn = training_snapshot.path / "informationgain_{}__{}.csv".format(
+        text_column, output_column
+    )
+    if block_size is not None or top_k is not None:
+        vec = CountVectorizer(ngram_range=(1, 2), stop_words="english")
+        labels = np.asarray(data[output_column])
+        names, counts = document_frequencies(
+            list(data[text_column]), labels, vec.build_analyzer(), n_jobs
+        )
+        blocks = _count_blocks(counts, labels, block_size or BLOCK_SIZE)
+        if top_k is not None:
+            indices, values = top_k_information_gain(blocks, top_k)
+            write_ranked(fn, values, names, indices)
+        else:
+            values = np.empty(len(names))
+            for start, block_values in blocks:
+                values[start : start + len(block_values)] = block_values
+            write_ranked(fn, values, names)
+        return fn
     vec = CountVectorizer(ngram_range=(1, 2), stop_words="english")
     X = vec.fit_transform(data[text_column])
     ig = InformationGainTransformer()
     ig.fit(X, data[output_column], vec.get_feature_names())
-    fn = training_snapshot.path / "informationgain_{}__{}.csv".format(
-        text_column, output_column
-    )
     ig.sorted_dataframe().to_csv(fn, index=False)
     return fn
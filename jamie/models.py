@@ -4,11 +4,13 @@ import copy
 import json
 import pickle
 import itertools
+import joblib
 import pandas as pd
 import numpy as np
 import sklearn
 import scipy.sparse
 from tqdm import tqdm
+from sklearn.utils import _safe_indexing
 from imblearn.pipeline import Pipeline
 from imblearn.over_sampling import RandomOverSampler
 from sklearn.svm import SVC
@@ -22,6 +24,7 @@ from sklearn.model_selection import (
 )
 from .features import select_features
 from .lib import isotime_snapshot
+from .snapshots import ModelSnapshot, ENSEMBLE_FILE, SHARED_FEATURES_FILE
 from .logger import logger
 from . import __version__
 
@@ -350,6 +353,90 @@ def nested_cross_validation(
     return best_params, final_model, score_for_outer_cv
 
 
+def _fit_ensemble_member(
+    pipeline, estimator, ensemble_state, folder, X, labels, train_indices, fit_pipeline
+):
+    """Fit a single member of the ensemble on the train rows of X, and save
+    the model as model_<ensemble_state>.pkl in folder. Copies are made of the
+    estimator and feature pipeline so that each member is fitted from the same
+    initial state, irrespective of which process it runs in or the order in
+    which members are fitted.
+
+    If fit_pipeline is True, X contains the raw data, and the feature pipeline
+    is fitted on the train rows and saved as features_<ensemble_state>.pkl.
+    Otherwise X is the feature matrix, and the feature pipeline is not saved."""
+    estimator = copy.deepcopy(estimator)
+    X_train = _safe_indexing(X, train_indices)
+    y_train = labels[train_indices]
+    if fit_pipeline:
+        pipeline = copy.deepcopy(pipeline)
+        estimator.fit(pipeline.fit_transform(X_train), y_train)
+        # Save feature pipeline instead of the entire features object
+        with (folder / ("features_%d.pkl" % ensemble_state)).open("wb") as fp:
+            pickle.dump(pipeline, fp)
+    else:
+        estimator.fit(X_train, y_train)
+    with (folder / ("model_%d.pkl" % ensemble_state)).open("wb") as fp:
+        pickle.dump(estimator, fp)
+    return ensemble_state
+
+
+def fit_ensemble(features, estimator, folder, n_jobs=-1, size=100, X=None):
+    """Fit ensemble of models on different train test splits and save them
+    in a model snapshot folder. Members of the ensemble are fitted in parallel
+    using joblib, with the train test split of each member seeded by its
+    index in the ensemble. The saved models and feature pipelines give the
+    same predictions as those obtained by fitting the members one after
+    another.
+    Only the data, labels, feature pipeline and train indices are sent to
+    the worker processes, and progress is reported as members finish.
+
+    Parameters
+    ----------
+    features : :class:`jamie.features.FeatureBase`
+        Features object, after calling make_arrays()
+    estimator : model
+        Estimator to fit, usually the best estimator from :func:`nested_cross_validation`
+    folder : Path
+        Model snapshot folder to save ensemble in
+    n_jobs : int, default=-1
+        Number of worker processes, -1 uses all processors
+    size : int, default=100
+        Number of members of the ensemble
+    X : scipy.sparse.csr_matrix, optional
+        If specified, all members share this feature matrix, obtained from
+        the feature pipeline fitted on the entire training set, instead of
+        fitting the feature pipeline on each train split
+    """
+    fit_pipeline = X is None
+    if fit_pipeline:
+        X = features.X
+    members = joblib.Parallel(n_jobs=n_jobs, return_as="generator_unordered")(
+        joblib.delayed(_fit_ensemble_member)(
+            features._features,
+            estimator,
+            k,
+            folder,
+            X,
+            features.labels,
+            features.train_test_indices(k)[0],
+            fit_pipeline,
+        )
+        for k in range(size)
+    )
+    for _ in tqdm(members, total=size, desc="Model ensemble"):
+        pass
+
+
+def is_linear(params):
+    """Returns whether the best model is linear, given its parameters from
+    :func:`nested_cross_validation`. Linear models can share features
+    across the ensemble, see :class:`jamie.ensemble.LinearEnsemble`."""
+    return params["name"] == "LogReg" or (
+        params["name"] == "SVC" and params.get("clf__kernel") == "linear"
+    )
+
+
 def train(
     config,
     snapshot,
@@ -359,6 +446,7 @@ def train(
     oversampling,
     scoring,
     random_state=100,
+    shared_features=False,
 ):
     """Train models, called when using ``jamie train`` and save model snapshots.
 
@@ -380,12 +468,19 @@ def train(
         Scoring method to use for grid search, passed to :func:`nested_cross_validation`.
     random_state : int
         Seed to initialise the random state (default: 100)
+    shared_features : bool
+        Whether members of the ensemble share the feature pipeline fitted on
+        the entire training set, instead of fitting it on each train split
+        (default: False). This is only used if the best model is linear,
+        and allows prediction for the entire ensemble in one step, see
+        :class:`jamie.ensemble.LinearEnsemble`.
     """
     filename = {
         "models": "model.pkl",
         "scores": "scores.csv",
         "features_original": "features.csv",
         "features_transformed": "features.npz",
+        "features_shared": SHARED_FEATURES_FILE,
     }
     Features = select_features(featureset)
     timestamp = "_".join((featureset, isotime_snapshot(), __version__))
@@ -408,10 +503,16 @@ def train(
             "scikit-learn": sklearn.__version__,  # different sklearn versions may not have compatible pickles
         },
         "config": config.as_dict(),
-        "data": {"models": filename["models"], "scores": filename["scores"]},
+        "data": {
+            "models": filename["models"],
+            "scores": filename["scores"],
+            "ensemble": ENSEMBLE_FILE,
+        },
     }
     logger.info("Snapshot %s", timestamp)
-    features = Features(snapshot.data).make_arrays(prediction_field)
+    features = Features(snapshot.data, cache=snapshot.clean_text_cache).make_arrays(
+        prediction_field
+    )
     X_train = features.fit_transform(features.X)
     logger.info("Saving features")
     if not model_snapshot_folder.exists():
@@ -433,6 +534,13 @@ def train(
         random_state=random_state,
     )
     logger.info("Saving scores and models")
+    if shared_features and not is_linear(best_model_params):
+        logger.warning(
+            "Best model %s is not linear, not sharing features across ensemble",
+            best_model_params["name"],
+        )
+        shared_features = False
+    metadata["training"]["shared_features"] = shared_features
     metadata["best_parameters"] = best_model_params
     metadata["models"] = model_description
     with (model_snapshot_folder / "metadata.json").open("w") as fp:
@@ -444,17 +552,15 @@ def train(
     # Run ensemble by fitting best_estimator from final_model to
     # 100 different train test splits
     logger.info("Saving model and feature pipeline ensemble")
-    estimator = copy.deepcopy(final_model.best_estimator_)
-    for ensemble_state in tqdm(range(100), desc="Model ensemble"):
-        X_train, _, y_train, _ = features.train_test_split(ensemble_state)
-        X_train = features.fit_transform(X_train)
-        estimator.fit(X_train, y_train)
-        with (model_snapshot_folder / ("model_%d.pkl" % ensemble_state)).open(
-            "wb"
-        ) as fp:
-            pickle.dump(estimator, fp)
-        # Save feature pipeline instead of the entire features object
-        with (model_snapshot_folder / ("features_%d.pkl" % ensemble_state)).open(
-            "wb"
-        ) as fp:
+    if shared_features:
+        with (model_snapshot_folder / filename["features_shared"]).open("wb") as fp:
             pickle.dump(features._features, fp)
+    fit_ensemble(
+        features,
+        final_model.best_estimator_,
+        model_snapshot_folder,
+        n_jobs=config["model.n-jobs"],
+        X=X_train if shared_features else None,
+    )
+    logger.info("Packing model ensemble")
+    ModelSnapshot(timestamp, root=config["common.snapshots"]).pack()
@@ -5,35 +5,110 @@ import datetime
 import pandas as pd
 import numpy as np
 import json
+import pymongo
 from tqdm import tqdm
 from bson.json_util import dumps
 from .logger import logger
 from .lib import isotime_snapshot, connect_mongo
-from .features import valid_doc
+from .features import select_features, valid_record
+from .ensemble import LinearEnsemble
+from .prediction_table import write_table
 
 Date = datetime.date
 
 logger = logger(name="predict", stream_level="DEBUG")
 
+# Attributes added to a job by prediction
+PREDICTION_FIELDS = ["probability", "lower_ci", "upper_ci"]
+
 
 class Bootstrap:
     """Get bootstrap means and confidence intervals from a sample.
 
+    The bootstrap resamples are drawn once from a local random generator
+    seeded with *random_state*, and are represented as a matrix of counts
+    of shape (n, sample size). Bootstrap means for many samples are then
+    computed together using a single matrix product. As every sample of the
+    same size uses the same resamples, results are reproducible across jobs
+    and batches.
+
     Parameters
     ----------
     random_state : int
         Set initial random state
     n : int, default=1000
         Number of bootstrap samples
+    method : {"bootstrap", "normal"}, default="bootstrap"
+        Method used to compute confidence intervals. *bootstrap* uses
+        percentiles of the bootstrap means, while *normal* uses the
+        normal approximation to the sampling distribution of the mean,
+        which does not require resampling and is faster for very
+        large runs.
     """
 
-    def __init__(self, random_state, n=1000):
+    methods = ["bootstrap", "normal"]
+
+    def __init__(self, random_state, n=1000, method="bootstrap"):
+        if method not in self.methods:
+            raise ValueError(
+                "Unknown bootstrap method {}, should be one of {}".format(
+                    method, ", ".join(self.methods)
+                )
+            )
         self.random_state = random_state
         self.n = n
+        self.method = method
+        self._counts = {}
+
+    def counts(self, size):
+        """Returns number of times each element is drawn in each resample.
+
+        Parameters
+        ----------
+        size : int
+            Size of the sample to resample from
+
+        Returns
+        -------
+        numpy.ndarray
+            Matrix of shape (n, size), each row sums to size
+        """
+        if size not in self._counts:
+            rng = np.random.default_rng(self.random_state)
+            self._counts[size] = rng.multinomial(size, np.full(size, 1 / size), self.n)
+        return self._counts[size]
+
+    def sample_batch(self, probabilities):
+        """Get bootstrap means and confidence intervals for several samples.
+
+        Parameters
+        ----------
+        probabilities : array-like
+            Matrix of shape (n_jobs, n_models), each row is a sample
 
-    def _single_sample_mean(self, array, random_state):
-        np.random.seed(self.random_state + random_state)
-        return np.random.choice(array, len(array)).mean()
+        Returns
+        -------
+        dict
+            Dictionary containing arrays of length n_jobs for
+            probability, lower_ci, upper_ci (95% confidence intervals).
+        """
+        probabilities = np.asarray(probabilities, dtype=float)
+        size = probabilities.shape[1]
+        if self.method == "normal":
+            mean = probabilities.mean(axis=1)
+            error = 1.96 * probabilities.std(axis=1, ddof=1) / np.sqrt(size)
+            return {
+                "probability": mean,
+                "lower_ci": np.clip(mean - error, 0, 1),
+                "upper_ci": np.clip(mean + error, 0, 1),
+            }
+        bootstrap_means = probabilities @ self.counts(size).T / size
+        lower, upper = np.percentile(bootstrap_means, [2.5, 97.5], axis=1)
+        return {
+            "probability": bootstrap_means.mean(axis=1),
+            "lower_ci": lower,
+            "upper_ci": upper,
+        }
 
     def sample(self, array):
         """Get bootstrap samples from array.
@@ -49,16 +124,45 @@ class Bootstrap:
             Dictionary containing probability, lower_ci, upper_ci
             (95% confidence intervals).
         """
-        bootstrap_means = np.array(
-            [self._single_sample_mean(array, k) for k in range(self.n)]
-        )
         return {
-            "probability": bootstrap_means.mean(),
-            "lower_ci": np.percentile(bootstrap_means, 2.5),
-            "upper_ci": np.percentile(bootstrap_means, 97.5),
+            k: float(v[0])
+            for k, v in self.sample_batch(np.array(array, ndmin=2)).items()
         }
 
 
+def ensemble_probabilities(models, features, docs):
+    """Probabilities of the positive class from each member of the ensemble.
+
+    Each feature pipeline transforms the whole batch at once into a sparse
+    matrix, which is passed to the corresponding model in a single call.
+    As both the transformation and the prediction operate row by row, this
+    gives the same result as predicting each document separately.
+
+    Parameters
+    ----------
+    models : List[model]
+        Ensemble of fitted models
+    features : List[sklearn.pipeline.FeatureUnion]
+        Fitted feature pipelines, one for each model
+    docs : pd.DataFrame
+        Batch of documents to predict
+
+    Returns
+    -------
+    numpy.ndarray
+        Matrix of shape (n_docs, n_models)
+    """
+    return np.column_stack(
+        [
+            # predict_proba() returns probabilities for class (0, 1)
+            # we need the probability that class is 1, so we select
+            # the second column
+            m.predict_proba(f.transform(docs))[:, 1]
+            for m, f in zip(models, features)
+        ]
+    )
+
+
 class Predict:
     """Predict job classification using saved model snapshots.
 
@@ -70,11 +174,24 @@ class Predict:
         Random state, passed to :class:`Bootstrap` instance
     bootstrap_size : int, default=1000
         Number of bootstrap draws, passed to :class:`Bootstrap` instance
+    bootstrap_method : {"bootstrap", "normal"}, default="bootstrap"
+        Method for confidence intervals, passed to :class:`Bootstrap` instance
+    batch_size : int, default=5000
+        Number of documents transformed and predicted together
     """
 
-    def __init__(self, model_snapshot, random_state=0, bootstrap_size=1000):
+    def __init__(
+        self,
+        model_snapshot,
+        random_state=0,
+        bootstrap_size=1000,
+        bootstrap_method="bootstrap",
+        batch_size=5000,
+    ):
         self.model_snapshot = model_snapshot
-        self.bootstrap = Bootstrap(random_state, bootstrap_size)
+        self.bootstrap = Bootstrap(random_state, bootstrap_size, bootstrap_method)
+        self.batch_size = batch_size
+        self.featureset = self.model_snapshot.metadata["training"]["featureset"]
         self.config = self.model_snapshot.metadata["config"]
         self.db = self._connect_db()
         self._predictions = []
@@ -82,74 +199,107 @@ class Predict:
     def _connect_db(self):
         return connect_mongo(self.config)
 
+    def _prediction_id(self, jobid):
+        return jobid + "_" + self.model_snapshot.name
+
+    def _existing_predictions(self):
+        """Returns existing predictions for this model snapshot, fetched
+        using a single query.
+
+        Returns
+        -------
+        dict
+            Dictionary of predictions indexed by job id
+        """
+        return {
+            p["jobid"]: p
+            for p in self.db.predictions.find(
+                {"snapshot": self.model_snapshot.name},
+                {
+                    "jobid": True,
+                    "snapshot": True,
+                    **{c: True for c in PREDICTION_FIELDS},
+                },
+            )
+        }
+
     def _get_documents(self):
-        """Query the collection and return the documents for prediction as
-        dataframe with the job_title and description field.
+        """Query the collection and return the documents for prediction in
+        batches of :attr:`batch_size`. Documents with missing columns
+        required by the featureset are skipped.
 
         Yields
         ------
-        _id : ObjectID
-            Unique id from the document, provided by MongoDB
-        doc : pd.Dataframe
-            Dataframe containing the description and job_title field. None if KeyError
+        List[dict]
+            Job documents in the batch, with all attributes except
+            the description in the JSON representation
         """
+        jobs = []
         for doc in (
             self.db["jobs"]
-            .find({}, {"job_title": True, "description": True, "jobid": True})
-            .batch_size(5)
+            .find({}, {"json.description": False})
+            .batch_size(self.batch_size)
         ):
-            _id = doc["jobid"]
-            try:
-                doc = pd.DataFrame(
-                    {
-                        "description": [doc["description"]],
-                        "job_title": [doc["job_title"]],
-                    }
+            if not valid_record(self.featureset, doc):
+                logger.warning(
+                    "Skipping job because of empty description or job title: %s",
+                    doc["jobid"],
                 )
-            except KeyError:
-                doc = None
-            yield _id, doc
+                continue
+            jobs.append(doc)
+            if len(jobs) == self.batch_size:
+                yield jobs
+                jobs = []
+        if jobs:
+            yield jobs
 
-    def _record_prediction(self, _id, record, store_database=False):
+    def _record_prediction(self, job, record, store_database=False):
         """Record the prediction in the original document, optionally in MongoDB
 
         Parameters
         ----------
-        _id : str
-            Job ID to record
+        job : dict
+            Job document from MongoDB to record
         record : dict
             Dictionary containing prediction information
         store_database : bool, optional
             Whether to store in database, default = False
+
+        Returns
+        -------
+        pymongo.UpdateOne, optional
+            If store_database is True, the upsert operation to store the
+            prediction, which is written in bulk by :meth:`_write_predictions`
         """
-        if store_database:
-            record.update(
-                {
-                    "snapshot": self.model_snapshot.name,
-                    "jobid": _id,
-                    "_id": _id + "_" + self.model_snapshot.name,
-                }
-            )
-            self.db.predictions.update_one(
-                {"_id": record["_id"]}, {"$set": record}, upsert=True
-            )
-        job = self.db.jobs.find_one({"jobid": _id})
-        if job:
-            record.update(job)
-            record["_id"] = (
-                _id + "_" + self.model_snapshot.name
-            )  # fix _id as it's overwritten
-            if "json" in record:
-                del record["json"]["description"]  # remove verbose attributes
-            del record["description"]  # remove verbose attributes
-            self._predictions.append(record)
-        else:
-            logger.warning(
-                "Job not found in database, but prediction exists: {}".format(_id)
-            )
+        _id = self._prediction_id(job["jobid"])
+        record.update({"snapshot": self.model_snapshot.name, "jobid": job["jobid"]})
+        operation = (
+            pymongo.UpdateOne({"_id": _id}, {"$set": record}, upsert=True)
+            if store_database
+            else None
+        )
+        record = {**record, **job, "_id": _id}
+        if "json" in record:
+            record["json"] = {
+                k: v for k, v in record["json"].items() if k != "description"
+            }  # remove verbose attributes
+        record.pop("description", None)  # remove verbose attributes
+        self._predictions.append(record)
+        return operation
+
+    def _write_predictions(self, operations):
+        "Writes predictions to MongoDB using an unordered bulk write"
+        if operations:
+            self.db.predictions.bulk_write(operations, ordered=False)
 
     def predict(self, save=True, skip_existing=True):
-        """Record predictions in MongoDB
+        """Record predictions in MongoDB. Documents are predicted in batches
+        of :attr:`batch_size`, with each ensemble member transforming and
+        predicting the entire batch in one call. If the ensemble members share
+        the same feature pipeline, the batch is transformed once and predicted
+        using :class:`jamie.ensemble.LinearEnsemble`. Existing predictions are
+        fetched once at the start, and new predictions are written to
+        MongoDB in bulk after each batch.
 
         Parameters
         ----------
@@ -172,35 +322,59 @@ class Predict:
         features = [
             self.model_snapshot.features(i) for i in self.model_snapshot.data["indices"]
         ]
-        for _id, doc in tqdm(self._get_documents(), desc="Predicting"):
-            if valid_doc(self.model_snapshot.metadata["training"]["featureset"], doc):
-                # Check if it has already been predicted
-                existing_prediction = self.db.predictions.find_one(
-                    {"_id": _id + "_" + self.model_snapshot.name}
-                )
-                if skip_existing and existing_prediction:
-                    self._record_prediction(_id, existing_prediction)
-                    continue
-                probabilities = [
-                    # predict_proba() returns a tuple for class (0, 1)
-                    # we need the probability that class is 1, so we select
-                    # the second element
-                    m.predict_proba(f.transform(doc))[0][1]
-                    for m, f in zip(models, features)
-                ]
-                self._record_prediction(
-                    _id, self.bootstrap.sample(probabilities), store_database=True
-                )
-            else:
-                logger.warning(
-                    "Skipping job because of empty description or job title: %s", _id
-                )
+        if self.model_snapshot.shared_features:
+            # All members share the same feature pipeline, so each batch
+            # is transformed once and predicted with a single matrix product
+            linear_ensemble = LinearEnsemble(models)
+
+            def probabilities(docs):
+                return linear_ensemble.predict_proba(features[0].transform(docs))
+
+        else:
+
+            def probabilities(docs):
+                return ensemble_probabilities(models, features, docs)
+
+        columns = select_features(self.featureset).require_columns
+        existing_predictions = self._existing_predictions() if skip_existing else {}
+        with tqdm(desc="Predicting", unit="jobs") as progress:
+            for jobs in self._get_documents():
+                to_predict = []
+                for job in jobs:
+                    if job["jobid"] in existing_predictions:
+                        self._record_prediction(
+                            job, existing_predictions.pop(job["jobid"])
+                        )
+                    else:
+                        to_predict.append(job)
+                if to_predict:
+                    docs = pd.DataFrame(
+                        [{c: job[c] for c in columns} for job in to_predict],
+                        columns=columns,
+                    )
+                    samples = self.bootstrap.sample_batch(probabilities(docs))
+                    self._write_predictions(
+                        [
+                            self._record_prediction(
+                                job,
+                                {c: float(v[k]) for c, v in samples.items()},
+                                store_database=True,
+                            )
+                            for k, job in enumerate(to_predict)
+                        ]
+                    )
+                progress.update(len(jobs))
+        for jobid in existing_predictions:
+            logger.warning(
+                "Job not found in database, but prediction exists: {}".format(jobid)
+            )
         if save:
             self.save()
         return self
 
     def save(self, output=None):
-        "Save predictions in prediction snapshot folder"
+        """Save predictions in prediction snapshot folder, as a JSONL file
+        and a columnar table (see :mod:`jamie.prediction_table`)"""
         snapshot_root = (
             self.model_snapshot.path.parent.parent / "predictions" / isotime_snapshot()
         )
@@ -209,6 +383,7 @@ class Predict:
         with (snapshot_root / "predictions.jsonl").open("w") as fp:
             for r in self._predictions:
                 fp.write(dumps(r, sort_keys=True) + "\n")
+        write_table(self._predictions, snapshot_root / "predictions.npz")
         with (snapshot_root / "metadata.json").open("w") as fp:
             metadata = self.model_snapshot.metadata
             metadata["best_model_average_score"] = self.model_snapshot.data[
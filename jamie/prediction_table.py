@@ -0,0 +1,189 @@
+"""Columnar prediction table
+
+Prediction snapshots store one JSON document per job in ``predictions.jsonl``,
+which has to be parsed line by line into :class:`jamie.types.JobPrediction`
+instances before it can be used as a dataframe. :func:`write_table` also
+saves the predictions in a typed, columnar format, which :func:`read_table`
+loads into a dataframe with a few vectorised operations.
+
+The table is stored as a numpy ``.npz`` file, with the following columns:
+
+* *strings*: each string column is dictionary encoded, stored as the unique
+  values ``<column>.values`` and integer codes ``<column>.codes``, with -1
+  for missing values. *hours* are joined by commas.
+* *contract*: integer codes of :data:`CONTRACTS`, with -1 for missing
+  values, read as a categorical of :class:`jamie.types.Contract`.
+* *dates*: *date* and *posted* are stored as ``datetime64[D]``, with NaT for
+  missing dates. As in :class:`jamie.types.JobPrediction`, *date* defaults
+  to the posted date, and then the closing date.
+* *numbers*: probabilities and salaries are stored as ``float64``, with NaN
+  for missing salaries.
+"""
+
+import os
+import json
+import datetime
+import numpy as np
+import pandas as pd
+from bson.json_util import loads
+from .types import Contract
+
+STRING_COLUMNS = [
+    "jobid",
+    "snapshot",
+    "employer",
+    "hours",
+    "job_title",
+    "department",
+    "location",
+    "extra_location",
+]
+DATE_COLUMNS = ["date", "posted"]
+FLOAT_COLUMNS = {  # column: key in prediction record
+    "probability": "probability",
+    "probability_lower": "lower_ci",
+    "probability_upper": "upper_ci",
+    "salary_max": "salary_max",
+    "salary_min": "salary_min",
+    "salary_median": "salary_median",
+}
+# Column order of the dataframe, the same as :class:`jamie.types.JobPrediction`
+COLUMNS = [
+    "jobid",
+    "snapshot",
+    "contract",
+    "employer",
+    "hours",
+    "job_title",
+    "date",
+    "posted",
+    "extra_location",
+    "probability",
+    "probability_lower",
+    "probability_upper",
+    "department",
+    "location",
+    "salary_max",
+    "salary_min",
+    "salary_median",
+]
+CONTRACTS = [Contract.FixedTerm, Contract.Permanent]
+NAT = np.datetime64("NaT", "D")
+
+
+def _date(value):
+    """Returns date of a MongoDB date, or of its extended JSON representation,
+    as numpy.datetime64, or NaT if it is not a date"""
+    if isinstance(value, dict) and "$date" in value:
+        value = loads(json.dumps(value))
+    if isinstance(value, datetime.datetime):
+        return np.datetime64(value.date(), "D")
+    return NAT
+
+
+def _string(record, column):
+    "Returns string value of column in a prediction record"
+    value = record.get(column)
+    if column == "hours" and value is not None:
+        return ",".join(value)
+    return value
+
+
+def _encode(values):
+    "Returns dictionary encoding (codes, unique values) of strings"
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    return codes.astype(np.int32), np.asarray(uniques, dtype=str)
+
+
+def _decode(codes, values):
+    "Returns object array of values, with None for missing values"
+    decoded = np.empty(len(values) + 1, dtype=object)
+    decoded[: len(values)] = values
+    return decoded[codes]
+
+
+def write_table(records, filename):
+    """Save predictions as a columnar table. The file is written atomically,
+    so an interrupted write does not leave a partial table.
+
+    Parameters
+    ----------
+    records : Iterable[dict]
+        Prediction records, as saved by :class:`jamie.predict.Predict`. Dates
+        can be datetimes or in MongoDB extended JSON format.
+    filename : Path
+        Table file, usually ``predictions.npz`` in a prediction snapshot
+    """
+    records = list(records)
+    columns = {}
+    for column in STRING_COLUMNS:
+        codes, values = _encode([_string(r, column) for r in records])
+        columns[column + ".codes"], columns[column + ".values"] = codes, values
+    columns["contract"] = np.array(
+        [
+            (1 if r["contract"] == "Permanent" else 0) if "contract" in r else -1
+            for r in records
+        ],
+        dtype=np.int8,
+    )
+    posted = np.array([_date(r.get("placed_on")) for r in records], dtype="M8[D]")
+    date = np.array([_date(r.get("date")) for r in records], dtype="M8[D]")
+    closes = np.array([_date(r.get("closes")) for r in records], dtype="M8[D]")
+    columns["posted"] = posted
+    columns["date"] = np.where(
+        np.isnat(date), np.where(np.isnat(posted), closes, posted), date
+    )
+    for column, key in FLOAT_COLUMNS.items():
+        columns[column] = np.array(
+            [np.nan if r.get(key) is None else r[key] for r in records],
+            dtype=np.float64,
+        )
+    tmp = filename.with_name(filename.name + ".tmp")
+    with tmp.open("wb") as fp:
+        np.savez(fp, **columns)
+    os.replace(tmp, filename)
+
+
+def read_table(filename):
+    """Load predictions from a columnar table
+
+    Parameters
+    ----------
+    filename : Path
+        Table file written by :func:`write_table`
+
+    Returns
+    -------
+    pd.DataFrame
+        Predictions, with the columns of :class:`jamie.types.JobPrediction`
+
+    Raises
+    ------
+    ValueError
+        If a probability is not between 0 and 1
+    """
+    data = {}
+    with np.load(filename) as table:
+        for column in ["probability", "probability_lower", "probability_upper"]:
+            p = table[column]
+            invalid = ~((0 <= p) & (p <= 1))
+            if invalid.any():
+                raise ValueError(
+                    "Tried reading invalid {}={}.".format(column, p[invalid][0])
+                )
+        for column in STRING_COLUMNS:
+            codes, values = table[column + ".codes"], table[column + ".values"]
+            if column == "hours":
+                hours = np.empty(len(values), dtype=object)
+                for i, v in enumerate(values.tolist()):
+                    hours[i] = v.split(",") if v else []
+                values = hours
+            data[column] = _decode(codes, values)
+        data["contract"] = pd.Categorical.from_codes(
+            table["contract"], categories=CONTRACTS
+        )
+        for column in DATE_COLUMNS:
+            data[column] = table[column].astype("M8[ns]")
+        for column in FLOAT_COLUMNS:
+            data[column] = table[column]
+    return pd.DataFrame(data, columns=COLUMNS)
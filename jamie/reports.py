@@ -1,12 +1,16 @@
 """Generate reports from :class:`PredictionSnapshot`"""
+
+import os
 import json
+import joblib
 import chevron
+import hashlib
 import calendar
 import datetime
 import pandas as pd
 import numpy as np
 from pathlib import Path
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from shutil import copyfile
 from .lib import fail
 from .logger import logger
@@ -14,6 +18,8 @@ from .snapshots import ReportSnapshot, ModelSnapshot, TrainingSnapshot
 from .types import Alert, JobType, PrecisionRecall, Contract
 
 logger = logger(name="report", stream_level="DEBUG")
+FIGURE_VERSION = 1  # increment when changing how figures are drawn
+FIGURES_INDEX = "figures.json"  # hashes of the data of each figure
 
 
 def readable_date(d):
@@ -38,10 +44,245 @@ def fix_day(date, day="01"):
         return None
 
 
+def month_start(dates):
+    """Returns the first day of the month of each date in the same format as
+    :func:`fix_day`, as a categorical with sorted categories. Only the
+    distinct months are formatted as strings.
+
+    Parameters
+    ----------
+    dates : pd.Series
+        Dates, with datetime64 dtype or as ISO 8601 strings
+
+    Returns
+    -------
+    pd.Categorical
+        Month of each date, such as "2020-04-01", missing for missing dates
+    """
+    dates = pd.to_datetime(dates, format="ISO8601")
+    codes, months = pd.factorize(dates.values.astype("datetime64[M]"), sort=True)
+    return pd.Categorical.from_codes(
+        codes, categories=[m + "-01" for m in months.astype(str)]
+    )
+
+
 def slugify_location(x):
     return "nloc_" + x.replace("&", "").replace(",", "").lower().replace(" ", "_")
 
 
+LOCATIONS = [
+    "Africa",
+    "All Locations",
+    "Asia & Middle East",
+    "Europe",
+    "London",
+    "Midlands of England",
+    "North, South & Central America",
+    "Northern England",
+    "Northern Ireland",
+    "Republic of Ireland",
+    "Scotland",
+    "South East England",
+    "South West England",
+    "Wales",
+]
+
+
+def grouped_metrics(df, by):
+    """Returns :meth:`Report.metrics` of each group of prediction snapshot
+    data, computed for all groups with a single groupby aggregation
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Prediction snapshot data, with the job_title_match column
+    by : pd.Series
+        Group of each job
+
+    Returns
+    -------
+    List[dict]
+        Metrics of each group, in sorted order of groups, with the
+        group in the *group* key
+    """
+    # groups are factorised once, and shared by both aggregations
+    by = pd.Series(pd.Categorical(by), index=df.index)
+    pos = df.probability > 0.5
+    columns = pd.DataFrame(
+        {
+            "pos": pos,
+            "njob_match": df.job_title_match.astype(bool),
+            "npos_lower": df.probability_upper > 0.5,
+            "npos_upper": df.probability_lower > 0.5,
+            "ncontract_permanent": (df.contract == Contract.Permanent) & pos,
+            "ncontract_fixed_term": (df.contract == Contract.FixedTerm) & pos,
+            "salary_median": df.salary_median.astype(float),
+            "salary_pos": df.salary_median.astype(float).where(pos),
+        },
+        index=df.index,
+    )
+    agg = columns.groupby(by, observed=True).agg(
+        total=("pos", "size"),
+        npos=("pos", "sum"),
+        njob_match=("njob_match", "sum"),
+        npos_lower=("npos_lower", "sum"),
+        npos_upper=("npos_upper", "sum"),
+        ncontract_permanent=("ncontract_permanent", "sum"),
+        ncontract_fixed_term=("ncontract_fixed_term", "sum"),
+        salary_mean=("salary_median", "mean"),
+        salary_mean_pos=("salary_pos", "mean"),
+    )
+    locations = (
+        pd.DataFrame({"group": by[pos], "location": df.extra_location[pos]})
+        .groupby(["group", "location"], observed=True)
+        .size()
+        .unstack(fill_value=0)
+        .reindex(index=agg.index, columns=LOCATIONS, fill_value=0)
+    )
+    locations.columns = [slugify_location(loc) for loc in LOCATIONS]
+    rows = []
+    for group, row in zip(agg.index, agg.join(locations).to_dict("records")):
+        npos = row["npos"]
+        rows.append(
+            {
+                "group": group,
+                **row,
+                "proportion_pos": npos / row["total"],
+                "propcontract_permanent": (
+                    row["ncontract_permanent"] / npos if npos > 0 else 0
+                ),
+                "propcontract_fixed_term": (
+                    row["ncontract_fixed_term"] / npos if npos > 0 else 0
+                ),
+                "salary_mean_pos": (
+                    None if pd.isna(row["salary_mean_pos"]) else row["salary_mean_pos"]
+                ),
+            }
+        )
+    return rows
+
+
+def grouped_training_metrics(
+    df, by, label="aggregate_tags", positive_label=1, negative_label=0
+):
+    """Returns :meth:`Report.training_metrics` of each group of training
+    snapshot data, computed for all groups with a single groupby aggregation
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Training snapshot data
+    by : pd.Series
+        Group of each job
+    label : str, default="aggregate_tags"
+        Label column
+    positive_label : default=1
+        Label of the positive class
+    negative_label : default=0
+        Label of the negative class
+
+    Returns
+    -------
+    List[dict]
+        Metrics of each group, in sorted order of groups, with the
+        group in the *group* key
+    """
+    phd = df.job_title.str.contains("PhD")
+    columns = pd.DataFrame(
+        {
+            "npos": df[label] == positive_label,
+            "nneg": df[label] == negative_label,
+            "nphd": phd,
+            "nnotphd": ~phd,
+        },
+        index=df.index,
+    )
+    agg = columns.groupby(by, sort=True).agg(
+        total=("npos", "size"),
+        npos=("npos", "sum"),
+        nneg=("nneg", "sum"),
+        nphd=("nphd", "sum"),
+        nnotphd=("nnotphd", "sum"),
+    )
+    agg["proportion_pos"] = agg.npos / agg.total
+    return [
+        {"group": group, **row} for group, row in zip(agg.index, agg.to_dict("records"))
+    ]
+
+
+def draw_figure(fn, x, y, lower=None, upper=None, ylim=None):
+    """Draw a line graph and save it to a file. Figures are drawn using the
+    object oriented matplotlib API and the Agg canvas, without the global
+    state of pyplot, so they can be drawn in parallel worker processes.
+
+    Parameters
+    ----------
+    fn : Path
+        Output image file
+    x : list
+        Horizontal axis values
+    y : list
+        Vertical axis values
+    lower, upper : list, optional
+        If specified, the area between lower and upper is shaded
+    ylim : tuple, optional
+        Limits of the vertical axis
+    """
+    fig = Figure()
+    ax = fig.subplots()
+    if ylim is not None:
+        ax.set_ylim(*ylim)
+    ax.plot(x, y)
+    if lower is not None:
+        ax.fill_between(x, lower, upper, color="b", alpha=0.1)
+    fig.savefig(fn)
+
+
+def figure_key(figure):
+    "Returns hash of the data and the version of drawing of a figure"
+    return hashlib.sha1(
+        json.dumps([FIGURE_VERSION, figure], sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def draw_figures(folder, figures, n_jobs=1):
+    """Draw figures into folder, skipping figures whose data has not changed
+    since they were last drawn. The hashes of the figure data are recorded
+    in :data:`FIGURES_INDEX` in the folder.
+
+    Parameters
+    ----------
+    folder : Path
+        Output folder, usually a report snapshot
+    figures : Dict[str, dict]
+        Keyword arguments of :func:`draw_figure` for each image filename
+    n_jobs : int, default=1
+        Number of worker processes, -1 uses all processors. No more
+        processes than figures to draw are started.
+
+    Returns
+    -------
+    List[str]
+        Filenames of figures that were drawn
+    """
+    index_file = folder / FIGURES_INDEX
+    index = json.loads(index_file.read_text()) if index_file.exists() else {}
+    keys = {fn: figure_key(figure) for fn, figure in figures.items()}
+    drawn = [
+        fn for fn in figures if index.get(fn) != keys[fn] or not (folder / fn).exists()
+    ]
+    if drawn:
+        n_jobs = min(joblib.effective_n_jobs(n_jobs), len(drawn))
+        joblib.Parallel(n_jobs=n_jobs)(
+            joblib.delayed(draw_figure)(folder / fn, **figures[fn]) for fn in drawn
+        )
+    index.update(keys)
+    tmp = index_file.with_name(index_file.name + ".tmp")
+    tmp.write_text(json.dumps(index, indent=2, sort_keys=True))
+    os.replace(tmp, index_file)
+    return drawn
+
+
 class Report:
     """Report generator
 
@@ -49,18 +290,21 @@ class Report:
     ----------
     prediction_snapshot : :class:`PredictionSnapshot`
         Prediction snapshot to use for report generation
+    n_jobs : int, default=1
+        Number of worker processes drawing figures, -1 uses all processors
     """
 
     _monthly = None
     _yearly = None
     _training_monthly = None
 
-    def __init__(self, prediction_snapshot):
+    def __init__(self, prediction_snapshot, n_jobs=1):
         self.prediction_snapshot = prediction_snapshot
+        self.n_jobs = n_jobs
         self.training_data = TrainingSnapshot(
             self.prediction_snapshot.metadata["training"]["training_snapshot"]
         ).data
-        self.training_data["year_month"] = self.training_data.placed_on.apply(fix_day)
+        self.training_data["year_month"] = month_start(self.training_data.placed_on)
         self.snapshot = ReportSnapshot(self.prediction_snapshot.name).create()
         model_snapshot = ModelSnapshot(self.prediction_snapshot.metadata["snapshot"])
         if not model_snapshot.exists():
@@ -85,10 +329,13 @@ class Report:
         # Drop jobs without date
         self.data = self.data[~pd.isna(self.data.date)]
         logger.info("After dropping jobs without date: %d", len(self.data))
-        self.data["year_month"] = self.data.date.apply(fix_day)
 
         # Convert to datetime format to allow pandas operations
         self.data["date"] = pd.DatetimeIndex(self.data.date)
+        self.data["year_month"] = month_start(self.data.date)
+        # Categorical columns make grouped metrics faster
+        self.data["contract"] = self.data.contract.astype("category")
+        self.data["extra_location"] = self.data.extra_location.astype("category")
         # Drop PhD jobs, this should ideally be done earlier
         self.data = self.data[~self.data.job_title.str.contains("PhD")]
         logger.info("  After dropping jobs at PhD level: %d", len(self.data))
@@ -167,10 +414,9 @@ class Report:
     def training_by_month(self, as_dataframe=False):
         "Returns list of dicts or dataframe having training data grouped by month"
         if self._training_monthly is None:
-            self._training_monthly = [
-                {"group": i, **self.training_metrics(data)}
-                for i, data in self.training_data.groupby(self.training_data.year_month)
-            ]
+            self._training_monthly = grouped_training_metrics(
+                self.training_data, self.training_data.year_month
+            )
         return (
             pd.DataFrame(self._training_monthly)
             if as_dataframe
@@ -180,74 +426,52 @@ class Report:
     def by_month(self, as_dataframe=False):
         "Returns list of dicts or dataframe having data grouped by month"
         if self._monthly is None:
-            self._monthly = [
-                {"group": i, **self.metrics(data)}
-                for i, data in self.data.groupby(self.data.year_month)
-            ]
+            self._monthly = grouped_metrics(self.data, self.data.year_month)
         return pd.DataFrame(self._monthly) if as_dataframe else self._monthly
 
     def by_year(self, as_dataframe=False):
         "Returns list of dicts or dataframe having data grouped by year"
         if self._yearly is None:
             self._yearly = [
-                {"group": str(i), **self.metrics(data)}
-                for i, data in self.data.groupby(self.data.date.dt.year)
+                {**row, "group": str(row["group"])}
+                for row in grouped_metrics(self.data, self.data.date.dt.year)
             ]
         return pd.DataFrame(self._yearly) if as_dataframe else self._yearly
 
-    def _graph_njobs(self, df, fn, monthly):
-        plt.clf()
-        fig, ax = plt.subplots()
-        xax = "label_month" if monthly else "group"
-        if monthly:  # months
-            df["label_month"] = df.group.map(label)
-        ax.plot(df[xax], df.npos)
-        ax.fill_between(df[xax], df.npos_lower, df.npos_upper, color="b", alpha=0.1)
-        plt.savefig(self.snapshot.path / fn)
-
-    def _graph_propjobs(self, df, fn, monthly):
-        plt.clf()
-        plt.ylim(0, 1)
-
-        if monthly:
-            df["label_month"] = df.group.map(label)
-            plt.plot(df["label_month"], df.proportion_pos)
-        else:
-            plt.plot(df.group, df.proportion_pos)
-        plt.savefig(self.snapshot.path / fn)
-
-    def _graph_salary_mean(self):
-        plt.clf()
-        df = self.by_year(as_dataframe=True)
-        plt.plot(df.group, df.salary_mean_pos)
-        plt.savefig(self.snapshot.path / "mean_salary.png")
-
-    def _graph_njobs_yearly(self):
-        self._graph_njobs(
-            self.by_year(as_dataframe=True), "njobs_yearly.png", monthly=False
-        )
-
-    def _graph_njobs_monthly(self):
-        self._graph_njobs(
-            self.by_month(as_dataframe=True), "njobs_monthly.png", monthly=True
-        )
-
-    def _graph_propjobs_yearly(self):
-        self._graph_propjobs(
-            self.by_year(as_dataframe=True), "propjobs_yearly.png", monthly=False
-        )
+    @staticmethod
+    def _njobs_figure(df, monthly):
+        x = df.group.map(label) if monthly else df.group
+        return {
+            "x": x.tolist(),
+            "y": df.npos.tolist(),
+            "lower": df.npos_lower.tolist(),
+            "upper": df.npos_upper.tolist(),
+        }
 
-    def _graph_propjobs_monthly(self):
-        self._graph_propjobs(
-            self.by_month(as_dataframe=True), "propjobs_monthly.png", monthly=True
-        )
+    @staticmethod
+    def _propjobs_figure(df, monthly):
+        x = df.group.map(label) if monthly else df.group
+        return {"x": x.tolist(), "y": df.proportion_pos.tolist(), "ylim": (0, 1)}
+
+    def figures(self):
+        "Returns keyword arguments of :func:`draw_figure` for each figure"
+        yearly = self.by_year(as_dataframe=True)
+        monthly = self.by_month(as_dataframe=True)
+        return {
+            "njobs_yearly.png": self._njobs_figure(yearly, monthly=False),
+            "njobs_monthly.png": self._njobs_figure(monthly, monthly=True),
+            "propjobs_yearly.png": self._propjobs_figure(yearly, monthly=False),
+            "propjobs_monthly.png": self._propjobs_figure(monthly, monthly=True),
+            "mean_salary.png": {
+                "x": yearly.group.tolist(),
+                "y": yearly.salary_mean_pos.tolist(),
+            },
+        }
 
     def make_graphs(self):
-        self._graph_njobs_yearly()
-        self._graph_njobs_monthly()
-        self._graph_propjobs_yearly()
-        self._graph_propjobs_monthly()
-        self._graph_salary_mean()
+        "Draw figures in parallel, skipping figures whose data has not changed"
+        drawn = draw_figures(self.snapshot.path, self.figures(), self.n_jobs)
+        logger.info("Drew %d figures: %s", len(drawn), ", ".join(drawn))
 
     def create(self):
         "Create a report and store in a report snapshot"
@@ -0,0 +1,252 @@
+"""
+Storage of scraped job pages.
+
+Scraped job pages are stored either as one file per job in a folder
+(:class:`Folder`), or in a compressed archive (:class:`Archive`). Both have
+the same interface, and return :class:`jamie.scrape.process.JobFile` objects
+for parsing.
+
+The archive is a folder containing segment files and an index. Each job
+page is compressed as a separate gzip member and appended to the current
+segment file, starting a new segment when it reaches :data:`SEGMENT_SIZE`.
+As segment files are concatenations of gzip members, they can also be read
+using standard tools such as ``zcat``. The index is a JSON lines file with
+the job id, segment, offset and length of each record. Job pages are read
+by job id using the index, or streamed sequentially in the order in which
+they are stored.
+
+A job page that is identical to a stored page is not stored again, but
+linked to it: a hard link in a folder, or an index record pointing to the
+same segment, offset and length in an archive.
+"""
+
+import os
+import gzip
+import json
+import collections
+from pathlib import Path
+from .process import PARSER, JobFile
+
+SEGMENT_SIZE = 64 * 2**20  # bytes
+INDEX = "index.jsonl"
+
+Record = collections.namedtuple("Record", ["jobid", "segment", "offset", "length"])
+
+
+def open_store(folder, archive=False):
+    "Returns :class:`Archive` if archive is True, otherwise :class:`Folder`"
+    return Archive(folder) if archive else Folder(folder)
+
+
+class Folder:
+    """Job pages stored as one file per job in a folder, with the job id
+    as the filename
+
+    Parameters
+    ----------
+    folder : Path
+        Folder containing job pages
+    """
+
+    def __init__(self, folder):
+        self.folder = Path(folder)
+
+    def __contains__(self, jobid):
+        "Whether a non-empty job page is stored for jobid"
+        try:
+            return (self.folder / jobid).stat().st_size > 0
+        except FileNotFoundError:
+            return False
+
+    def keys(self):
+        "Returns keys for reading job pages, which are the filenames"
+        return self.folder.glob("*")
+
+    @staticmethod
+    def jobid(key):
+        "Returns job id of key"
+        return key.stem
+
+    def jobs(self, keys, parser=PARSER):
+        "Yields :class:`JobFile` for each key, parsed using parser"
+        for key in keys:
+            yield JobFile(key, parser=parser)
+
+    def get(self, jobid):
+        "Returns job page for jobid"
+        return (self.folder / jobid).read_text()
+
+    def stat(self, jobid):
+        """Returns modification time in nanoseconds and size of the job page
+        for jobid, which change when it is stored again, or None if it is not
+        stored"""
+        try:
+            st = (self.folder / jobid).stat()
+        except FileNotFoundError:
+            return None
+        return [st.st_mtime_ns, st.st_size]
+
+    def add(self, jobid, data):
+        """Stores job page for jobid. An existing file is removed rather
+        than overwritten, so that job pages linked to it are not changed."""
+        fn = self.folder / jobid
+        fn.unlink(missing_ok=True)
+        fn.write_text(data)
+
+    def link(self, jobid, other):
+        "Stores job page for jobid as a hard link to the job page of other"
+        fn = self.folder / jobid
+        fn.unlink(missing_ok=True)
+        os.link(self.folder / other, fn)
+
+
+class Archive:
+    """Job pages stored in compressed segment files
+
+    Parameters
+    ----------
+    folder : Path
+        Archive folder, created if it does not exist
+    segment_size : int, default=:data:`SEGMENT_SIZE`
+        Size in bytes after which a new segment is started
+    """
+
+    def __init__(self, folder, segment_size=SEGMENT_SIZE):
+        self.folder = Path(folder)
+        self.segment_size = segment_size
+        self._index = None
+        self._end = None  # (segment, offset) where the next page is written
+
+    def __getstate__(self):
+        # The index is not needed to read records, and is not sent
+        # to worker processes
+        return {**self.__dict__, "_index": None, "_end": None}
+
+    @property
+    def index(self):
+        "Dictionary of :class:`Record` for each job id"
+        if self._index is None:
+            self._index = {}
+            fn = self.folder / INDEX
+            if fn.exists():
+                with fn.open() as fp:
+                    for line in fp:
+                        record = Record(*json.loads(line))
+                        self._index[record.jobid] = record
+            segment = max((r.segment for r in self._index.values()), default=0)
+            fn = self._segment(segment)
+            self._end = (segment, fn.stat().st_size if fn.exists() else 0)
+        return self._index
+
+    def __contains__(self, jobid):
+        return jobid in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def _segment(self, segment):
+        return self.folder / ("segment-%05d.gz" % segment)
+
+    def keys(self):
+        "Returns records of all job pages, in the order in which they are stored"
+        return sorted(self.index.values(), key=lambda r: (r.segment, r.offset))
+
+    @staticmethod
+    def jobid(key):
+        "Returns job id of record"
+        return key.jobid
+
+    def read(self, records):
+        """Yields job id and job page for each record. Records in the same
+        segment are read using the same file object.
+
+        Parameters
+        ----------
+        records : Iterable[Record]
+            Records to read, reading is sequential if they are in the
+            order returned by :meth:`keys`
+        """
+        fp, segment = None, None
+        try:
+            for record in records:
+                if record.segment != segment:
+                    if fp is not None:
+                        fp.close()
+                    segment = record.segment
+                    fp = self._segment(segment).open("rb")
+                fp.seek(record.offset)
+                data = gzip.decompress(fp.read(record.length))
+                yield record.jobid, data.decode("utf-8")
+        finally:
+            if fp is not None:
+                fp.close()
+
+    def jobs(self, keys, parser=PARSER):
+        "Yields :class:`JobFile` for each record, parsed using parser"
+        for jobid, data in self.read(keys):
+            yield JobFile(data, jobid=jobid, parser=parser)
+
+    def get(self, jobid):
+        "Returns job page for jobid"
+        return next(self.read([self.index[jobid]]))[1]
+
+    def stat(self, jobid):
+        """Returns segment, offset and length of the record for jobid, which
+        change when it is stored again, or None if it is not stored"""
+        record = self.index.get(jobid)
+        return None if record is None else list(record[1:])
+
+    def items(self):
+        "Yields job id and job page for all job pages, reading sequentially"
+        return self.read(self.keys())
+
+    def add(self, jobid, data):
+        """Stores job page for jobid. If jobid is already stored, the
+        new job page replaces it in the index."""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        compressed = gzip.compress(data.encode("utf-8"), mtime=0)
+        index = self.index
+        segment, offset = self._end
+        if offset > 0 and offset + len(compressed) > self.segment_size:
+            segment, offset = segment + 1, 0
+        with self._segment(segment).open("ab") as fp:
+            fp.write(compressed)
+        record = Record(jobid, segment, offset, len(compressed))
+        with (self.folder / INDEX).open("a") as fp:
+            fp.write(json.dumps(list(record)) + "\n")
+        index[jobid] = record
+        self._end = (segment, offset + len(compressed))
+
+    def link(self, jobid, other):
+        """Stores job page for jobid as an index record pointing to the
+        job page of other, without storing the job page again"""
+        record = self.index[other]._replace(jobid=jobid)
+        with (self.folder / INDEX).open("a") as fp:
+            fp.write(json.dumps(list(record)) + "\n")
+        self.index[jobid] = record
+
+
+def archive_folder(input_folder, archive_folder):
+    """Adds job pages from a folder to an archive, skipping job pages that
+    are already in the archive
+
+    Parameters
+    ----------
+    input_folder : Path
+        Folder containing job pages, one file per job
+    archive_folder : Path
+        Archive folder, created if it does not exist
+
+    Returns
+    -------
+    int
+        Number of job pages added
+    """
+    folder, archive = Folder(input_folder), Archive(archive_folder)
+    n = 0
+    for key in sorted(folder.keys()):
+        jobid = folder.jobid(key)
+        if jobid not in archive:
+            archive.add(jobid, key.read_text())
+            n += 1
+    return n
@@ -3,12 +3,12 @@ This Python 3 script cleans an input jobs dictionary and outputs a cleaned jobs
 """
 
 import re
-import difflib
-from operator import itemgetter
 from contextlib import suppress
 import dateutil.parser
-from ..data import EMPLOYERS, POSTCODES
-from ..clean_text import clean_text
+from .employers import uk_universities, uk_postcodes
+
+# Words in an employer name that are associated to a university
+UNIVERSITY_WORDS = {"university", "school", "college"}
 
 
 class OutputRow:
@@ -76,12 +76,12 @@ class OutputRow:
             )
 
     def read_uni_list_file(self):
-        "Read list of universities from a text file"
-        return set(" ".join(set([x for x in clean_text(empl)])) for empl in EMPLOYERS)
+        "Returns normalised names of UK universities, read once per process"
+        return uk_universities().key_set
 
     def read_postcode(self):
-        "Read postcodes for UK universities"
-        return {row.PROVIDER_NAME: row.POSTCODE for row in POSTCODES.itertuples()}
+        "Returns postcodes for UK universities, read once per process"
+        return uk_postcodes()
 
     def matching_key(self, key):
         """
@@ -219,45 +219,21 @@ class OutputRow:
         Wrapper around check_validity, with value set to self.key"""
         return self.check_validity(getattr(self, key), key)
 
-    def check_match(self, element_to_compare, list_to_use, limit_ratio=0.70):
-        """
-        Check if the element to compare is close enough to an element
-        in the list provided
-        """
-        ratio_list = []
-        for s in list_to_use:
-            # Get the ratio for each entry and the self.employer value
-            ratio = difflib.SequenceMatcher(None, element_to_compare, s).ratio()
-            ratio_list.append((s, ratio))
-            # If ratio is == 1 it means it is a perfect match
-            if ratio == 1:
-                break
-
-        # get the maximum ratio[1] in the list and return the associated tuple
-        best_match = max(ratio_list, key=itemgetter(1))
-        if best_match[1] >= limit_ratio:
-            return best_match[0]
-        else:
-            return None
-
     def add_uk_university(self):
         """
         Check the string from employer if it matches an UK university
-        provided by the file self.uk_uni_list using difflib
+        using the index returned by :func:`jamie.scrape.employers.uk_universities`,
+        setting uk_university to the normalised name of the university
         """
-        if hasattr(self, "employer"):
+        if hasattr(self, "employer") and self.employer:
 
-            # clean the employer string to get only key word
-            employer = clean_text(self.employer.split("-")[0])
-            # List of keyword that are associated to university
-            list_uni = ["university", "school", "college"]
-            if set(employer) & set(list_uni):
+            employer = self.employer.split("-")[0]
+            if set(re.findall(r"\w+", employer.lower())) & UNIVERSITY_WORDS:
                 self.uk_university = self.employer
                 return
 
             # if did not match an university. Try to match with the list provided
-            employer = " ".join(set(employer))
-            best_match = self.check_match(employer, self.uk_uni_list)
+            best_match = uk_universities().match_key(employer)
             if best_match:
                 self.uk_university = best_match
 
@@ -332,6 +308,7 @@ class OutputRow:
             self.invalid_code.add("salary")
 
         self.add_median_salary()
+        self.add_uk_university()
         if self.invalid_code == set():
             del self.invalid_code
         else:
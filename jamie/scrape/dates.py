@@ -0,0 +1,140 @@
+"""
+Extraction of dates from the text of job pages.
+
+Used for legacy pages where the placed on and closing dates are not
+available as job attributes. Dates are found using precompiled patterns for
+the formats used on jobs.ac.uk, such as "12th April 2020", "April 12, 2020",
+"12/04/2020" and "2020-04-12". Only the text following labels such as
+"Placed on" or "Closes" is searched, and if no date is found there, the text
+around each year in the first :data:`MAX_TEXT_LENGTH` characters.
+
+Numeric dates such as "05/06/2021" are read day first, as in the UK and in
+:meth:`jamie.scrape.clean.OutputRow.parse_date`, unless the day first reading
+is not a valid date, as in "04/13/2020". This differs from datefinder, which
+was used before and reads ambiguous numeric dates month first, so such dates
+are now 5 June 2021 instead of 6 May 2021.
+"""
+
+import re
+import datetime
+
+MAX_TEXT_LENGTH = 20000  # characters of page text searched for dates
+REGION_LENGTH = 100  # characters after a label searched for dates
+WINDOW = 30  # characters before a year searched for a date
+
+MONTHS = {
+    "jan": 1,
+    "feb": 2,
+    "mar": 3,
+    "apr": 4,
+    "may": 5,
+    "jun": 6,
+    "jul": 7,
+    "aug": 8,
+    "sep": 9,
+    "oct": 10,
+    "nov": 11,
+    "dec": 12,
+}
+
+_MONTH = (
+    r"jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?"
+    r"|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?"
+)
+
+# Numeric dates, day first
+NUMERIC = re.compile(
+    r"(?<!\d)(?P<day>\d{1,2})[/.](?P<month>\d{1,2})[/.](?P<year>\d{4})(?!\d)"
+)
+
+# Patterns with the named groups day, month (name or number) and year,
+# matched against lowercase text
+PATTERNS = [
+    re.compile(
+        r"(?<!\d)(?P<day>\d{1,2})(?:st|nd|rd|th)?(?: of)?[\s,./-]*"
+        r"(?P<month>" + _MONTH + r")\.?[\s,./-]*(?P<year>\d{4})(?!\d)"
+    ),
+    re.compile(
+        r"\b(?P<month>" + _MONTH + r")\.?\s+(?P<day>\d{1,2})"
+        r"(?:st|nd|rd|th)?,?\s+(?P<year>\d{4})(?!\d)"
+    ),
+    NUMERIC,
+    re.compile(r"(?<!\d)(?P<year>\d{4})-(?P<month>\d{1,2})-(?P<day>\d{1,2})(?!\d)"),
+]
+
+# Labels preceding the placed on and closing dates
+LABELS = ["placed on", "date placed", "posted on", "closes", "closing date"]
+
+# Years from 2000, the literal prefix makes the search fast
+YEAR = re.compile(r"20\d\d")
+
+
+def _to_date(match):
+    """Returns date for a pattern match, or None if the date is invalid.
+    Numeric dates that are not valid day first are read month first."""
+    month, day = match.group("month"), int(match.group("day"))
+    month = int(month) if month.isdigit() else MONTHS[month[:3]]
+    if match.re is NUMERIC and month > 12:
+        month, day = day, month
+    try:
+        return datetime.datetime(int(match.group("year")), month, day)
+    except ValueError:
+        return None
+
+
+def find_dates(text):
+    "Yields dates in lowercase text, for each pattern in :data:`PATTERNS`"
+    for pattern in PATTERNS:
+        for match in pattern.finditer(text):
+            date = _to_date(match)
+            if date is not None:
+                yield date
+
+
+def _label_regions(text):
+    "Yields text following each label"
+    for label in LABELS:
+        i = text.find(label)
+        while i != -1:
+            start = i + len(label)
+            yield text[start : start + REGION_LENGTH]
+            i = text.find(label, start)
+
+
+def _year_windows(text):
+    "Yields text around each year, extended so that numbers are not split"
+    for match in YEAR.finditer(text):
+        start, end = max(match.start() - WINDOW, 0), match.end() + 6
+        while start > 0 and text[start - 1].isdigit():
+            start -= 1
+        while end < len(text) and text[end].isdigit():
+            end += 1
+        yield text[start:end]
+
+
+def earliest_date(text, min_year=None):
+    """Returns the earliest date in text
+
+    Parameters
+    ----------
+    text : str
+        Text of the job page
+    min_year : int, optional
+        Dates before this year are ignored
+
+    Returns
+    -------
+    datetime.datetime or None
+        Earliest date found, or None if no dates are found
+    """
+    text = text[:MAX_TEXT_LENGTH].lower()
+    for regions in (_label_regions(text), _year_windows(text)):
+        dates = [
+            d
+            for region in regions
+            for d in find_dates(region)
+            if min_year is None or d.year >= min_year
+        ]
+        if dates:
+            return min(dates)
+    return None
@@ -0,0 +1,135 @@
+"""
+Fuzzy matching of employer names to UK universities.
+
+Employer names are normalised to their sorted, unique cleaned words. An
+:class:`EmployerIndex` first looks up the normalised name in a hash table of
+exact matches. Otherwise, candidates sharing the most character n-grams with
+the name are found using an inverted index, and only the best candidates
+are scored using :class:`difflib.SequenceMatcher`. Resolved names are cached,
+so the cost of matching does not depend on the number of employers.
+
+The index of UK universities and the postcodes are built once per process,
+see :func:`uk_universities` and :func:`uk_postcodes`.
+"""
+
+import heapq
+import difflib
+import functools
+import collections
+from ..data import EMPLOYERS, POSTCODES
+from ..clean_text import clean_text
+
+NGRAM = 3  # characters
+CANDIDATES = 10  # number of candidates scored for each match
+CACHE_SIZE = 4096  # number of resolved employer names cached
+
+
+def normalise(name):
+    "Returns sorted unique cleaned words of name, joined by spaces"
+    return " ".join(sorted(set(clean_text(name))))
+
+
+def ngrams(text, n=NGRAM):
+    "Returns set of character n-grams of text, padded with spaces"
+    text = " %s " % text
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
+
+
+class EmployerIndex:
+    """Index of employer names for fuzzy matching
+
+    Parameters
+    ----------
+    names : Iterable[str]
+        Employer names
+    normalise : Callable[[str], str], default=:func:`normalise`
+        Function normalising names before matching
+    candidates : int, default=:data:`CANDIDATES`
+        Number of candidates with the most n-grams in common that are
+        scored using :class:`difflib.SequenceMatcher`
+    cache_size : int, default=:data:`CACHE_SIZE`
+        Number of resolved names cached
+    """
+
+    def __init__(
+        self,
+        names,
+        normalise=normalise,
+        candidates=CANDIDATES,
+        cache_size=CACHE_SIZE,
+    ):
+        self.normalise = normalise
+        self.candidates = candidates
+        self.names = []  # original names
+        self.keys = []  # normalised names
+        self._sizes = []  # number of n-grams of each normalised name
+        self._exact = {}
+        self._postings = collections.defaultdict(list)
+        for name in names:
+            key = normalise(name)
+            if key in self._exact:
+                continue
+            grams = ngrams(key)
+            self._exact[key] = len(self.names)
+            for gram in grams:
+                self._postings[gram].append(len(self.names))
+            self.names.append(name)
+            self.keys.append(key)
+            self._sizes.append(len(grams))
+        self.key_set = frozenset(self.keys)
+        self._resolve = functools.lru_cache(maxsize=cache_size)(self._find)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _candidates(self, key):
+        "Returns indices of names with the highest n-gram similarity to key"
+        grams = ngrams(key)
+        shared = collections.Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+
+        def dice(i):
+            "Dice coefficient of n-grams, which approximates SequenceMatcher ratio"
+            return 2 * shared[i] / (len(grams) + self._sizes[i])
+
+        return heapq.nlargest(self.candidates, shared, key=dice)
+
+    def _find(self, name, limit_ratio=0.70):
+        """Returns the index of the employer matching name, or None if no
+        employer has a similarity ratio of at least limit_ratio"""
+        key = self.normalise(name)
+        if key in self._exact:
+            return self._exact[key]
+        best, best_ratio = None, 0
+        for i in self._candidates(key):
+            ratio = difflib.SequenceMatcher(None, key, self.keys[i]).ratio()
+            if ratio > best_ratio:
+                best, best_ratio = i, ratio
+        if best is not None and best_ratio >= limit_ratio:
+            return best
+        return None
+
+    def match(self, name, limit_ratio=0.70):
+        """Returns the employer name matching name, or None if no employer
+        has a similarity ratio of at least limit_ratio"""
+        i = self._resolve(name, limit_ratio)
+        return None if i is None else self.names[i]
+
+    def match_key(self, name, limit_ratio=0.70):
+        """Returns the normalised name of the employer matching name, or
+        None if no employer has a similarity ratio of at least limit_ratio"""
+        i = self._resolve(name, limit_ratio)
+        return None if i is None else self.keys[i]
+
+
+@functools.lru_cache(maxsize=None)
+def uk_universities():
+    "Returns :class:`EmployerIndex` of UK universities, built once per process"
+    return EmployerIndex(EMPLOYERS)
+
+
+@functools.lru_cache(maxsize=None)
+def uk_postcodes():
+    "Returns dictionary of postcodes for UK universities, built once per process"
+    return {row.PROVIDER_NAME: row.POSTCODE for row in POSTCODES.itertuples()}
@@ -0,0 +1,179 @@
+"""
+Concurrent fetching of pages from a website.
+
+Pages are fetched by a bounded pool of threads sharing a single
+:class:`requests.Session`, so that keep-alive connections are reused. For
+each host, the number of requests in progress is limited, and requests are
+started at a limited rate using a token bucket. Failed requests are retried
+with exponential backoff for connection errors and transient HTTP errors.
+"""
+
+import time
+import threading
+import collections
+import concurrent.futures
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# HTTP status codes which are retried
+RETRY_STATUS = [429, 500, 502, 503, 504]
+
+
+class TokenBucket:
+    """Token bucket rate limiter, safe to use from multiple threads.
+
+    Parameters
+    ----------
+    rate : float
+        Number of tokens added per second
+    capacity : float, default=1
+        Maximum number of tokens, which is the largest burst of requests allowed
+    """
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        "Take a token, waiting until one is available"
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class Fetcher:
+    """Fetches pages concurrently over keep-alive connections.
+
+    Parameters
+    ----------
+    concurrency : int, default=4
+        Maximum number of requests in progress for each host
+    rate : float, default=2
+        Maximum number of requests started per second for each host
+    timeout : float, default=30
+        Timeout in seconds for connecting and for reading the response
+    retries : int, default=3
+        Number of times a failed request is retried
+    backoff : float, default=0.5
+        Backoff factor, retries wait for backoff * 2^(retry - 1) seconds
+    """
+
+    def __init__(self, concurrency=4, rate=2, timeout=30, retries=3, backoff=0.5):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=concurrency,
+            pool_maxsize=concurrency,
+            max_retries=Retry(
+                total=retries,
+                backoff_factor=backoff,
+                status_forcelist=RETRY_STATUS,
+            ),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._hosts = collections.defaultdict(
+            lambda: (
+                threading.BoundedSemaphore(self.concurrency),
+                TokenBucket(self.rate),
+            )
+        )
+        self._hosts_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        "Create fetcher using the scrape configuration"
+        return cls(
+            concurrency=config["scrape.concurrency"],
+            rate=config["scrape.rate"],
+            timeout=config["scrape.timeout"],
+            retries=config["scrape.retries"],
+        )
+
+    def _host(self, url):
+        with self._hosts_lock:
+            return self._hosts[urlsplit(url).netloc]
+
+    def get(self, url, **kwargs):
+        """Get a URL, waiting for the concurrency and rate limits of its host
+
+        Parameters
+        ----------
+        url : str
+            URL to get
+        **kwargs
+            Passed to :meth:`requests.Session.get`
+
+        Returns
+        -------
+        requests.Response
+            Response, for which raise_for_status() has been called
+        """
+        semaphore, bucket = self._host(url)
+        with semaphore:
+            bucket.acquire()
+            response = self.session.get(url, timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def map(self, items, url=lambda x: x, headers=None):
+        """Fetch pages concurrently, in the order in which they complete
+
+        Parameters
+        ----------
+        items : Iterable
+            Items to fetch
+        url : Callable, optional
+            Function returning the URL of an item, by default items are URLs
+        headers : Callable, optional
+            Function returning additional request headers for an item
+
+        Yields
+        ------
+        Tuple[item, requests.Response or Exception]
+            Item with the response, or the exception raised if the request
+            failed after retries. At most twice as many requests as the
+            concurrency limit are queued at any time.
+        """
+        items = iter(items)
+        with concurrent.futures.ThreadPoolExecutor(self.concurrency) as executor:
+            pending = {}
+
+            def submit(n):
+                for item in items:
+                    future = executor.submit(
+                        self.get, url(item), headers=headers(item) if headers else None
+                    )
+                    pending[future] = item
+                    n -= 1
+                    if n == 0:
+                        break
+
+            submit(2 * self.concurrency)
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    item = pending.pop(future)
+                    try:
+                        yield item, future.result()
+                    except requests.RequestException as e:
+                        yield item, e
+                submit(len(done))
@@ -0,0 +1,104 @@
+"""
+Metadata index of downloaded job pages.
+
+For each job page, the index records the size and SHA-1 hash of the
+recorded content, the ETag and Last-Modified headers of the response and
+the time it was fetched. The headers are used to make conditional requests
+when refreshing job pages, and the hashes to mark identical adverts that are
+posted again under a new job id as duplicates.
+
+The index is a JSON lines file stored alongside the scrape folder. Entries
+are appended as pages are downloaded, with later entries for the same job
+id replacing earlier ones.
+"""
+
+import json
+import hashlib
+import datetime
+from pathlib import Path
+
+
+def index_file(input_folder):
+    "Download index file for input_folder, stored alongside it"
+    input_folder = Path(input_folder)
+    return input_folder.parent / (input_folder.name + ".index.jsonl")
+
+
+def content_hash(data):
+    "Returns SHA-1 hash of the content to be recorded"
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class DownloadIndex:
+    """Index of downloaded job pages.
+
+    Parameters
+    ----------
+    filename : Path
+        Index file, read if it exists
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.entries = {}
+        self._hashes = {}
+        if filename.exists():
+            with filename.open() as fp:
+                for line in fp:
+                    self._set(json.loads(line))
+
+    def _set(self, entry):
+        self.entries[entry["jobid"]] = entry
+        if entry["duplicate_of"] is None:
+            self._hashes.setdefault(entry["sha1"], entry["jobid"])
+
+    def __contains__(self, jobid):
+        return jobid in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def conditional_headers(self, jobid):
+        """Returns headers for a conditional request of a job page, which
+        is empty if the job page is not in the index"""
+        entry = self.entries.get(jobid, {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def duplicate_of(self, jobid, sha1):
+        "Returns another job id with the same content hash, if any"
+        other = self._hashes.get(sha1)
+        return other if other != jobid else None
+
+    def add(self, jobid, data, response, duplicate_of=None):
+        """Add a downloaded job page to the index
+
+        Parameters
+        ----------
+        jobid : str
+            Job id
+        data : str
+            Content that is recorded
+        response : requests.Response
+            Response of the request for the job page
+        duplicate_of : str, optional
+            If the content is the same as another job page, the job id it
+            is a duplicate of
+        """
+        entry = {
+            "jobid": jobid,
+            "size": len(data.encode("utf-8")),
+            "sha1": content_hash(data),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched": datetime.datetime.now().isoformat(timespec="seconds"),
+            "duplicate_of": duplicate_of,
+        }
+        self._set(entry)
+        with self.filename.open("a") as fp:
+            fp.write(json.dumps(entry, sort_keys=True) + "\n")
+        return entry
@@ -4,32 +4,26 @@
 """
 Script to scrap the different jobs on https://www.jobs.ac.uk
 """
-import os
-import requests
+from operator import itemgetter
 from bs4 import BeautifulSoup
 from ..lib import make_sure_path_exists
 from ..logger import logger
+from .fetch import Fetcher
+from .state import CrawlState, state_file
+from .index import DownloadIndex, content_hash, index_file
+from .archive import open_store
 
 logger = logger(name="scrape", stream_level="DEBUG")
 
+BASE_URL = "http://www.jobs.ac.uk"
+SEARCH_URL = "{}/search/?keywords=*&sort=re&s=1&startIndex={}&pageSize={}"
+
 content_attrs = [
     {"attrs_id": "class", "attrs_content": "content"},
     {"attrs_id": "id", "attrs_content": "enhanced-content"},
 ]
 
 
-def get_page(url):
-    """
-    Use request to get an URL page
-    :params:
-        url str: the URL to parse
-    :returns:
-        requests object text
-    """
-    page = requests.get(url)
-    return page.text
-
-
 def transform_txt_in_bs4(data):
     """
     Get the json data from a request object
@@ -91,27 +85,6 @@ def split_info_from_job_url(BASE_URL, job_rel_url):
     return job_id, job_name, job_full_url
 
 
-def to_download(input_folder, job_id):
-    """
-    Check in the input_folder if a file with the job_id exists
-    if it is the case it return True
-    :params:
-        input_folder str: absolute path of directory where files are stored
-        job_id str: unique id that is used by job.ac.uk for their job
-    :returns:
-        bool: True if not present, False if present
-    """
-    filename = os.path.join(input_folder, job_id)
-    if not os.path.isfile(filename):
-        return True
-    else:
-        with open(filename, "r") as f:
-            check_content = f.read()
-            if check_content is None:
-                logger.info("{}: No data recorded".format(filename))
-                return True
-
-
 def _extract_ads(data, attrs_id, attrs_content):
     """
     Extract the div that contains the data in the beautiful object ads. Try if the data is under the div class
@@ -145,30 +118,38 @@ def new_extract_ads_info(data):
     return data_to_return
 
 
-def record_data(input_folder, job_id, data):
-    """
-    Recording data (html content) in a file with the job_id
-    as filename
-    :params:
-        input_folder str: absolute path of the folder where to save the
-        file
-        job_id str: obtained from jobs.ac.uk and used as filename
-        data bs4: html data in str() format to be saved in a file
-    :output:
-        None: record a file
-    """
-    filename = os.path.join(input_folder, job_id)
-    str_data = str(data)
-    if len(str_data) > 100:
-        with open(filename, "w") as f:
-            f.write(str_data)
-    else:
-        print(str_data)
-        raise
-
-
-def main(config):
-    """
+def main(config, base_url=BASE_URL, refresh=False):
+    """Scrape jobs from jobs.ac.uk. Search results are fetched in pages of
+    ``scrape.page-size`` results, up to ``scrape.njobs`` results. The job pages
+    in each search page are fetched concurrently, see
+    :class:`jamie.scrape.fetch.Fetcher` for the configuration options.
+
+    The crawl state is saved after each search page, see
+    :mod:`jamie.scrape.state`, and an interrupted scrape is resumed from the
+    first search page that was not completed.
+
+    Job pages are stored as files in ``scrape.folder``, or in a compressed
+    :class:`jamie.scrape.archive.Archive` if ``scrape.archive`` is set.
+    Downloaded job pages are recorded in a
+    :class:`jamie.scrape.index.DownloadIndex`. Job pages with the same content
+    as a page already downloaded under another job id are marked in the index
+    as a duplicate of the first job id, and are stored as a link to its job
+    page, so that a job is still imported for them.
+
+    Parameters
+    ----------
+    config : jamie.config.Config
+        Configuration
+    base_url : str, optional
+        Website to scrape, default :data:`BASE_URL`
+    refresh : bool, default=False
+        Whether to check job pages that have already been downloaded for
+        changes, using conditional requests
+
+    Returns
+    -------
+    int
+        Number of jobs downloaded, or updated when refreshing
     """
     # Get the folder or the file where the input data are stored
     input_folder = config["scrape.folder"]
@@ -177,36 +158,79 @@ def main(config):
     logger.info("Check if the input folder exists: {}".format(input_folder))
     make_sure_path_exists(input_folder)
 
-    # Setting the URL.
-    # Number of jobs fetch for one query
+    # Maximum number of jobs to fetch
     NUM_JOBS = config["scrape.njobs"]
-    BASE_URL = "http://www.jobs.ac.uk"
-    FULL_URL = "{}/search/?keywords=*&sort=re&s=1&pageSize={}".format(
-        BASE_URL, NUM_JOBS
-    )
-
-    # Start the job collection
-    logger.info("Getting the search page")
-    page = get_page(FULL_URL)
-    data = transform_txt_in_bs4(page)
-
-    jobs_list = split_by_results(data)
-    logger.info("Start to download new jobs")
+    fetcher = Fetcher.from_config(config)
+    state = CrawlState(state_file(input_folder), config["scrape.page-size"])
+    index = DownloadIndex(index_file(input_folder))
+    store = open_store(input_folder, config["scrape.archive"])
+    if state.resumed:
+        logger.info("Resuming crawl, {} jobs downloaded".format(len(state.downloaded)))
+
     n = 0
-    # file_process = fileProcess()
-    for job in jobs_list:
-        job_rel_url = extract_job_url(job)
-        jobid, job_name, job_full_url = split_info_from_job_url(BASE_URL, job_rel_url)
-        # Check if the jobid is not parsed yet
-        if to_download(input_folder, jobid) is True:
-            logger.info("Job id: {}".format(jobid))
-            job_page = get_page(job_full_url)
-            job_data = transform_txt_in_bs4(job_page)
+    while not state.complete:
+        start = state.pages[0]
+        logger.info("Getting the search page starting at {}".format(start))
+        page = fetcher.get(SEARCH_URL.format(base_url, start, state.page_size)).text
+        jobs_list = list(split_by_results(transform_txt_in_bs4(page)))
+        to_fetch = []
+        for job in jobs_list:
+            job_rel_url = extract_job_url(job)
+            jobid, job_name, job_full_url = split_info_from_job_url(
+                base_url, job_rel_url
+            )
+            state.seen[jobid] = job_full_url
+            if jobid in state.downloaded:
+                continue
+            # Check if the jobid is not parsed yet, or if refreshing
+            # already downloaded jobs using a conditional request
+            if jobid not in store:
+                to_fetch.append((jobid, job_full_url, {}))
+            elif refresh:
+                headers = index.conditional_headers(jobid)
+                to_fetch.append((jobid, job_full_url, headers))
+        logger.info("Start to download {} jobs".format(len(to_fetch)))
+        for (jobid, job_full_url, _), response in fetcher.map(
+            to_fetch, url=itemgetter(1), headers=itemgetter(2)
+        ):
+            if isinstance(response, Exception):
+                logger.warning(
+                    "Job id: {} failed to download: {}".format(jobid, response)
+                )
+                continue
+            state.downloaded.add(jobid)
+            if response.status_code == 304:  # Not Modified
+                continue
+            job_data = transform_txt_in_bs4(response.text)
             data_to_record = new_extract_ads_info(job_data)
             if data_to_record is None:
                 data_to_record = extract_ads_info(job_data)
             if data_to_record is None:
                 raise
-            record_data(input_folder, jobid, data_to_record)
+            str_data = str(data_to_record)
+            sha1 = content_hash(str_data)
+            entry = index.entries.get(jobid)
+            if entry is not None and entry["sha1"] == sha1 and jobid in store:
+                # Unchanged, only update headers
+                index.add(jobid, str_data, response, entry["duplicate_of"])
+                continue
+            duplicate_of = index.duplicate_of(jobid, sha1)
+            if duplicate_of:
+                logger.info("Job id: {} duplicate of {}".format(jobid, duplicate_of))
+            else:
+                logger.info("Job id: {}".format(jobid))
+            if len(str_data) <= 100:
+                raise ValueError("Job id: {} has no content".format(jobid))
+            if (
+                duplicate_of
+                and duplicate_of in store
+                and index.entries[duplicate_of]["sha1"] == sha1
+            ):
+                store.link(jobid, duplicate_of)
+            else:
+                store.add(jobid, str_data)
+            index.add(jobid, str_data, response, duplicate_of=duplicate_of)
             n += 1
             logger.info("Jobs downloaded: {}".format(n))
+        state.page_done(start, len(jobs_list), NUM_JOBS)
+    return n
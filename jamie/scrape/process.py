@@ -1,18 +1,21 @@
 #!/usr/bin/env python
 # encoding: utf-8
 
+import re
 import sys
+import html
 import json
 import bs4
-import copy
 import string
-import calendar
 import datetime
-import datefinder
+import collections
+from html.parser import HTMLParser
+from bs4.dammit import EntitySubstitution
 from pathlib import Path
 from contextlib import suppress  # alternative to try: (...) except Exception: pass
 from typing import Union
 from .clean import OutputRow
+from .dates import earliest_date
 
 _table_punc = bytes.maketrans(
     str.encode(string.punctuation), b" " * len(string.punctuation)
@@ -20,20 +23,101 @@ _table_punc = bytes.maketrans(
 _table_space = bytes.maketrans(bytes(" ", "utf-8"), bytes("_", "utf-8"))
 MINIMUM_DESCRIPTION_LENGTH = 150  # characters
 
+# Default parser backend for BeautifulSoup, "lxml" is faster if installed
+PARSER = "html.parser"
+
 # Maximum number of days a job can be advertised, ensures that
 # incorrectly parsed dates are not too far in the future
 JOB_ADVERTISING_DURATION_DAYS = 400
 
+# First JSON-LD script in a page; tag and attribute names are case
+# insensitive, but the type is matched exactly as by BeautifulSoup
+JSON_LD = re.compile(
+    r"(?i:<script\b)[^>]*?\b(?i:type)\s*=\s*([\"']?)application/ld\+json\1"
+    r"(?=[\s/>])[^>]*>(.*?)(?i:</script\s*>)",
+    re.S,
+)
+
 
 def get_nested_key(d, key):
-    keys = key.split(".")
-    o = copy.deepcopy(d)
+    "Returns value at dotted key in nested dictionaries, without copying"
+    o = d
     with suppress(KeyError):
-        for k in keys:
+        for k in key.split("."):
             o = o[k]
         return o
 
 
+class _TextParser(HTMLParser):
+    """Collects text from HTML, equivalent to BeautifulSoup.get_text() for
+    the html.parser backend, including its handling of character references.
+    Text in comments, scripts, stylesheets and templates is excluded."""
+
+    SKIP = {"script", "style", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.text = []
+        self._skip = 0
+
+    def handle_charref(self, name):
+        self.handle_data(html.unescape("&#%s;" % name))
+
+    def handle_entityref(self, name):
+        character = EntitySubstitution.HTML_ENTITY_TO_CHARACTER.get(name)
+        self.handle_data(character if character is not None else "&" + name)
+
+    def unknown_decl(self, data):
+        if data.upper().startswith("CDATA["):
+            self.handle_data(data[6:])
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.text.append(data)
+
+
+def html_text(fragment):
+    "Returns text in HTML fragment, without building a document tree"
+    parser = _TextParser()
+    parser.feed(fragment)
+    parser.close()
+    return "".join(parser.text)
+
+
+class _FormParser(HTMLParser):
+    """Collects <b> tags and <input> tags in document order, as lists of
+    tag name, and text for <b> or attributes for <input>"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tags = []
+        self._bold = []  # text of open <b> tags
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "input":
+            self.tags.append(("input", {k: v or "" for k, v in attrs}))
+        elif tag == "b":
+            text = []
+            self.tags.append(("b", text))
+            self._bold.append(text)
+
+    def handle_endtag(self, tag):
+        if tag == "b" and self._bold:
+            self._bold.pop()
+
+    def handle_data(self, data):
+        for text in self._bold:
+            text.append(data)
+
+
 class JobFile:
     """
     Represents a single jobs.ac.uk scraped document
@@ -47,12 +131,29 @@ class JobFile:
         If specified, used as jobid. When reading from a Path, the filename
         is used instead to create the jobid. When reading from a string,
         jobid is not optional.
+    parser : str, default=:data:`PARSER`
+        Parser backend used by BeautifulSoup, such as "html.parser" or "lxml"
+
+    Notes
+    -----
+    The document tree is only built when needed. For pages with JSON-LD
+    data, the JSON-LD script and the form inputs for subject areas and
+    location are found by scanning the HTML without building a tree.
+
+    The document tree is traversed once to index tags by name, and searches
+    for tags in the document use the index instead of traversing the tree
+    again. Searches support the subset of BeautifulSoup filters used here:
+    a tag name and attribute values, where None matches tags without the
+    attribute.
     """
 
-    EPOCH_YEAR = 2014  # Earliest year for datefinder fuzzy matching
+    EPOCH_YEAR = 2014  # Earliest year for dates found in page text
 
-    def __init__(self, content: Union[Path, str], jobid: str = None):
+    def __init__(
+        self, content: Union[Path, str], jobid: str = None, parser: str = PARSER
+    ):
         self.data = {}
+        self.parser = parser
         if isinstance(content, Path):
             self.filename = content
             self._content = self.filename.read_text()
@@ -63,20 +164,78 @@ class JobFile:
             if jobid is None:
                 raise ValueError("jobid can't be None if content is string")
             self._content = content
+            self.data["jobid"] = jobid
         else:
             raise ValueError("content must be one of Path or str")
-        self._soup = bs4.BeautifulSoup(self._content, "html.parser")
+        self._tree = None
+        self._tag_index = None
+        self._form_tags = None
 
-        # Enhanced content alters behaviour of some parsing
-        self.enhanced = self._soup.find("div", {"id": "enhanced-content"}) is not None
-        self.data["enhanced"] = self.enhanced
+    @property
+    def _soup(self):
+        "Document tree, built when first used"
+        if self._tree is None:
+            self._tree = bs4.BeautifulSoup(self._content, self.parser)
+        return self._tree
+
+    @property
+    def _tags(self):
+        if self._tag_index is None:
+            self._tag_index = self._index_tags()
+        return self._tag_index
+
+    @property
+    def enhanced(self):
+        "Enhanced content alters behaviour of some parsing"
+        return self._find("div", {"id": "enhanced-content"}) is not None
+
+    def _index_tags(self):
+        "Returns tags in the document by name, in document order"
+        tags = collections.defaultdict(list)
+        for el in self._soup.descendants:
+            if isinstance(el, bs4.Tag):
+                tags[el.name].append(el)
+        return tags
+
+    @staticmethod
+    def _matches(el, attrs):
+        "Whether tag matches attribute values, as in BeautifulSoup.find()"
+        for attr, value in attrs.items():
+            el_value = el.get(attr)
+            if value is None:
+                if el_value is not None:
+                    return False
+            elif isinstance(el_value, list):  # multi-valued, such as class
+                if value not in el_value and " ".join(el_value) != value:
+                    return False
+            elif el_value != value:
+                return False
+        return True
+
+    def _find_all(self, tag, attrs=None):
+        "Returns tags in document order, equivalent to BeautifulSoup.findAll()"
+        if not attrs:
+            return self._tags.get(tag, [])
+        return [el for el in self._tags.get(tag, []) if self._matches(el, attrs)]
+
+    def _find(self, tag, attrs=None):
+        "Returns first tag found, equivalent to BeautifulSoup.find()"
+        for el in self._tags.get(tag, []):
+            if not attrs or self._matches(el, attrs):
+                return el
+
+    def _find_text(self, tag, text):
+        "Returns first tag containing text"
+        for el in self._tags.get(tag, []):
+            if text in el.text:
+                return el
 
     def _first_section(self, elem, attrs):
-        return self._soup.findAll(elem, attrs)[0].get_text(separator=u" ")
+        return self._find_all(elem, attrs)[0].get_text(separator=u" ")
 
     def _tag_text(self, tag):
         "Returns text in tag if found, otherwise returns None"
-        found = self._soup.find(tag)
+        found = self._find(tag)
         return found.text if found else None
 
     @staticmethod
@@ -95,10 +254,10 @@ class JobFile:
     def employer(self):
         _employer = None
         try:
-            _employer = self._soup.find("h3").text
+            _employer = self._find("h3").text
         except AttributeError:
             with suppress(AttributeError, TypeError):
-                for emp in self._soup.find("a").get("href"):
+                for emp in self._find("a").get("href"):
                     if emp[:10] == "/employer/":
                         _employer = emp[:10]
         return _employer
@@ -142,21 +301,21 @@ class JobFile:
             with suppress(AttributeError):
                 return {
                     self.transform_key(el.text): el.nextSibling.get_text()
-                    for el in self._soup.findAll(tag, class_filter)
+                    for el in self._find_all(tag, class_filter)
                     if condition(el)
                 }
             with suppress(AttributeError):
                 # Sometimes, next sibling is directly a text
                 return {
                     self.transform_key(el.text): str(el.nextSibling)
-                    for el in self._soup.findAll(tag, class_filter)
+                    for el in self._find_all(tag, class_filter)
                     if condition(el)
                 }
         else:
             with suppress(AttributeError):
                 return {
                     self.transform_key(el.text): el.findNext(tag_value).text
-                    for el in self._soup.findAll(tag, class_filter)
+                    for el in self._find_all(tag, class_filter)
                     if condition(el)
                 }
 
@@ -194,7 +353,7 @@ class JobFile:
             with suppress(IndexError):
                 sections = [
                     s.get_text(separator=u" ")
-                    for s in self._soup.findAll("div", {"class": "section", "id": None})
+                    for s in self._find_all("div", {"class": "section", "id": None})
                 ]
                 sections.sort(key=len)
                 if len(sections[-1]) > MINIMUM_DESCRIPTION_LENGTH:
@@ -205,7 +364,7 @@ class JobFile:
                 return self._first_section("div", {"id": "rightcol"})
             with suppress(AttributeError):
                 description_text = []
-                section = self._soup.find("div", {"class": "col-lg-12"})
+                section = self._find("div", {"class": "col-lg-12"})
                 # Need to find the first <p>. The description is under that one
                 # but also contains differents tags
                 text_desc = False
@@ -216,7 +375,7 @@ class JobFile:
                         description_text.append(description.text)
                 return " ".join(description_text)
             with suppress(AttributeError):
-                jobPost = self._soup.find("div", {"class": "jobPost"})
+                jobPost = self._find("div", {"class": "jobPost"})
                 if jobPost:
                     paras = [p.get_text(separator=u" ") for p in jobPost.findAll("p")]
                     if len(paras) > 3:
@@ -227,7 +386,7 @@ class JobFile:
                             if len(p) > MINIMUM_DESCRIPTION_LENGTH
                         )
             with suppress(AttributeError):
-                paras = [p.get_text(separator=u" ") for p in self._soup.findAll("p")]
+                paras = [p.get_text(separator=u" ") for p in self._find_all("p")]
                 # Only keep long paragraphs and ones without emails
                 # (usually contact information)
                 return "\n".join(
@@ -263,17 +422,18 @@ class JobFile:
                     None,
                     map(
                         self._extra_details_items,
-                        self._soup.findAll("div", {"class": "inlineBox"}),
+                        self._find_all("div", {"class": "inlineBox"}),
                     ),
                 )
             )
         else:
             return {
                 self.transform_key(element.text): element.findNext("td").text
-                for element in self._soup.findAll("td", {"class": "detail-heading"})
+                for element in self._find_all("td", {"class": "detail-heading"})
             }
 
     def parse_html(self):
+        self.data["enhanced"] = self.enhanced
         self.data.update(
             {
                 "description": self.description,
@@ -288,39 +448,53 @@ class JobFile:
 
     def _extract_json_ads(self):
         "Get the json content from the page and return a dictionary from it"
-        content_json = self._soup.find("script", attrs={"type": "application/ld+json"})
-        with suppress(AttributeError):
-            return json.loads(content_json.contents[0])
+        match = JSON_LD.search(self._content)
+        if match:
+            return json.loads(match.group(2))
+
+    @property
+    def _form(self):
+        "<b> and <input> tags in the page, found without building a tree"
+        if self._form_tags is None:
+            parser = _FormParser()
+            parser.feed(self._content)
+            parser.close()
+            self._form_tags = parser.tags
+        return self._form_tags
 
     @property
     def new_subject_area(self):
-        subject = self._soup.find(
-            lambda tag: tag.name == "b" and "Subject Area(s):" in tag.text
+        start = next(
+            (
+                i
+                for i, (tag, text) in enumerate(self._form)
+                if tag == "b" and "Subject Area(s):" in "".join(text)
+            ),
+            None,
         )
-        if subject is not None:
-            list_subject = []
-            while True:
-                # find the next subject which not contain the value but it is just before
-                # the input that does have the value
-                subject = subject.findNext("input", attrs={"name": "categoryId[]"})
-                try:
-                    list_subject.append(subject.findNext("input")["value"])
-                except AttributeError:  # means it is the end of the list
-                    break
-            return list_subject
+        if start is not None:
+            inputs = [attrs for tag, attrs in self._form[start + 1 :] if tag == "input"]
+            # Each subject is in the value of the input just after
+            # an input named categoryId[]
+            return [
+                inputs[i + 1]["value"]
+                for i, attrs in enumerate(inputs[:-1])
+                if attrs.get("name") == "categoryId[]"
+            ]
 
     @property
     def new_extra_location(self):
-        tag = self._soup.find("input", {"class": "j-form-input__location"})
-        if tag:
-            return tag["value"]
+        for tag, attrs in self._form:
+            if (
+                tag == "input"
+                and "j-form-input__location" in attrs.get("class", "").split()
+            ):
+                return attrs["value"]
 
     @property
     def new_type_role(self):
 
-        type_role = self._soup.find(
-            lambda tag: tag.name == "b" and "Type / Role:" in tag.text
-        )
+        type_role = self._find_text("b", "Type / Role:")
         if type_role is not None:
             list_type_role = []
             while True:
@@ -349,9 +523,7 @@ class JobFile:
             "type_role": "json.employmentType",
         }.items():
             self.data[k] = self._get_nested_data(v)
-        self.data["description"] = bs4.BeautifulSoup(
-            self.data["description"], "html.parser"
-        ).get_text()
+        self.data["description"] = html_text(self.data["description"])
         joblocation = self._get_nested_data("json.jobLocation")
         if isinstance(joblocation, list):
             joblocation = joblocation[0]
@@ -376,15 +548,7 @@ class JobFile:
 
     @staticmethod
     def _earliest_date_in_text(text):
-        with suppress(calendar.IllegalMonthError, TypeError):
-            return min(
-                [
-                    d
-                    for d in datefinder.find_dates(text.replace(":", ""))
-                    if d.year >= JobFile.EPOCH_YEAR
-                ],
-                default=None,
-            )
+        return earliest_date(text, min_year=JobFile.EPOCH_YEAR)
 
     def parse(self, clean=True):
         "Parses job HTML or JSON and returns as a dictionary"
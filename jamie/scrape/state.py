@@ -0,0 +1,93 @@
+"""
+Persistent crawl state, allowing an interrupted scrape to resume.
+
+Search results are fetched one page at a time. The crawl state holds the
+frontier of search pages still to fetch, and the job ids seen in search
+results and downloaded so far. It is saved after every search page, so
+that a new scrape resumes from the first page that was not completed.
+"""
+
+import os
+import json
+from pathlib import Path
+
+VERSION = 1
+
+
+def state_file(input_folder):
+    "Crawl state file for input_folder, stored alongside it"
+    input_folder = Path(input_folder)
+    return input_folder.parent / (input_folder.name + ".crawl.json")
+
+
+class CrawlState:
+    """State of a paginated crawl of search results.
+
+    Parameters
+    ----------
+    filename : Path
+        File the crawl state is saved to
+    page_size : int
+        Number of results in each search page. If resuming a crawl, the
+        page size of the saved crawl is used instead.
+    """
+
+    def __init__(self, filename, page_size):
+        self.filename = filename
+        self.page_size = page_size
+        self.pages = [1]  # start index of search pages to fetch
+        self.seen = {}  # job URL for each job id seen in search results
+        self.downloaded = set()
+        self.resumed = False
+        if filename.exists():
+            with filename.open() as fp:
+                state = json.load(fp)
+            if state["version"] == VERSION:
+                self.page_size = state["page_size"]
+                self.pages = state["pages"]
+                self.seen = state["seen"]
+                self.downloaded = set(state["downloaded"])
+                self.resumed = True
+
+    @property
+    def complete(self):
+        "Whether there are no more search pages to fetch"
+        return not self.pages
+
+    def page_done(self, start, n_results, max_results):
+        """Marks search page starting at start as done, adding the next page
+        to the frontier if there are more results, and saves the crawl state.
+
+        Parameters
+        ----------
+        start : int
+            Start index of search page
+        n_results : int
+            Number of results in the search page
+        max_results : int
+            Maximum number of results to fetch in the crawl
+        """
+        self.pages.remove(start)
+        next_start = start + self.page_size
+        if n_results == self.page_size and next_start <= max_results:
+            self.pages.append(next_start)
+        self.save()
+
+    def save(self):
+        "Saves crawl state, or removes it if the crawl is complete"
+        if self.complete:
+            self.filename.unlink(missing_ok=True)
+            return
+        tmp = self.filename.with_name(self.filename.name + ".tmp")
+        with tmp.open("w") as fp:
+            json.dump(
+                {
+                    "version": VERSION,
+                    "page_size": self.page_size,
+                    "pages": self.pages,
+                    "seen": self.seen,
+                    "downloaded": sorted(self.downloaded),
+                },
+                fp,
+            )
+        os.replace(tmp, self.filename)
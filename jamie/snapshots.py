@@ -2,6 +2,7 @@
 import os
 import json
 import pickle
+import random
 import http.server
 import socketserver
 import pandas as pd
@@ -9,10 +10,18 @@ import numpy as np
 from pathlib import Path
 from dataclasses import asdict
 from .config import Config
+from .ensemble import PackedEnsemble, pack
+from .text_cache import CleanTextCache
+from .prediction_table import read_table
 from .types import JobPrediction
 from .types import TrainingData
 from .lib import bullet_text
 
+ENSEMBLE_FILE = "ensemble.pack"
+SHARED_FEATURES_FILE = "features_shared.pkl"
+CLEAN_TEXT_FILE = "clean_text.npz"
+PREDICTIONS_FILE = "predictions.npz"
+
 
 class Snapshot:
     """Base class for a snapshot instance.
@@ -191,14 +200,34 @@ class TrainingSnapshot(Snapshot):
             self._data = pd.read_csv(fn)
         return self._data
 
+    @property
+    def clean_text_cache(self):
+        "Cache of cleaned text for this snapshot, see :mod:`jamie.text_cache`"
+        return CleanTextCache(self.instance_location / CLEAN_TEXT_FILE)
+
     def reliability(self):
         "Converts ratings into numerical scale for inter-rater reliability analysis"
         return TrainingData.reliability(self.data)
 
 
 class ModelSnapshot(Snapshot):
-    "Represents a single model :class:`Snapshot`"
+    """Represents a single model :class:`Snapshot`. The model ensemble is read
+    from a packed ensemble file (see :mod:`jamie.ensemble`) if present,
+    otherwise from the individual model and feature pickles. If the members
+    of the ensemble share the same feature pipeline, it is only loaded once."""
+
     subpath = "models"  # NOQA
+    _ensemble = None
+    _shared_features = None
+
+    @property
+    def ensemble(self):
+        "Packed ensemble, None if the snapshot does not have one"
+        if self._ensemble is None:
+            fn = self.instance_location / ENSEMBLE_FILE
+            if fn.exists():
+                self._ensemble = PackedEnsemble(fn)
+        return self._ensemble
 
     @property
     def data(self):
@@ -214,23 +243,68 @@ class ModelSnapshot(Snapshot):
             if model_fn.exists():
                 with model_fn.open("rb") as fp:
                     out["final_model"] = pickle.load(fp)
-            model_fns = sorted(self.instance_location.glob("model_*.pkl"))
-            out["indices"] = [fn.stem.replace("model_", "") for fn in model_fns]
+            if self.ensemble is not None:
+                out["indices"] = self.ensemble.indices
+            else:
+                model_fns = sorted(self.instance_location.glob("model_*.pkl"))
+                out["indices"] = [fn.stem.replace("model_", "") for fn in model_fns]
             if scores_fn.exists():
                 out["scores"] = pd.read_csv(scores_fn)
             self._data = out
         return self._data
 
+    @property
+    def shared_features(self):
+        "Whether the members of the ensemble share the same feature pipeline"
+        return self.metadata["training"].get("shared_features", False)
+
     def model(self, index: str):
         "Returns model at index"
+        if self.ensemble is not None:
+            return self.ensemble.model(index)
         with (self.instance_location / ("model_%s.pkl" % index)).open("rb") as fp:
             return pickle.load(fp)
 
     def features(self, index: str):
         "Returns features at index"
+        if self.ensemble is not None:
+            return self.ensemble.features(index)
+        if self.shared_features:
+            if self._shared_features is None:
+                fn = self.instance_location / SHARED_FEATURES_FILE
+                with fn.open("rb") as fp:
+                    self._shared_features = pickle.load(fp)
+            return self._shared_features
         with (self.instance_location / ("features_%s.pkl" % index)).open("rb") as fp:
             return pickle.load(fp)
 
+    def pack(self, remove=True):
+        """Pack model ensemble into a single file, see :mod:`jamie.ensemble`.
+
+        Snapshots that are already packed are left unchanged.
+
+        Parameters
+        ----------
+        remove : bool, default=True
+            Whether to remove the individual model and feature pickles after packing
+        """
+        if self.ensemble is not None:
+            return self
+        indices = self.data["indices"]
+        pack(
+            ((i, self.model(i), self.features(i)) for i in indices),
+            self.instance_location / ENSEMBLE_FILE,
+        )
+        if remove:
+            for i in indices:
+                (self.instance_location / ("model_%s.pkl" % i)).unlink(missing_ok=True)
+                (self.instance_location / ("features_%s.pkl" % i)).unlink(
+                    missing_ok=True
+                )
+            (self.instance_location / SHARED_FEATURES_FILE).unlink(missing_ok=True)
+        self._ensemble = self._data = self._shared_features = None
+        return self
+
 
 class PredictionSnapshot(Snapshot):
     """Prediction Snapshot class"""
@@ -239,7 +313,10 @@ class PredictionSnapshot(Snapshot):
 
     @property
     def data(self):
-        "Returns data as dataframe"
+        """Returns data as dataframe, read from the columnar table if it
+        exists, otherwise from the JSONL file of predictions"""
+        if self._data is None and (self.instance_location / PREDICTIONS_FILE).exists():
+            self._data = read_table(self.instance_location / PREDICTIONS_FILE)
         if self._data is None:
             self._predictions = []
             fn = self.instance_location / "predictions.jsonl"
@@ -250,32 +327,60 @@ class PredictionSnapshot(Snapshot):
         return self._data
 
     def partition_jobs(self, n_each_class=None, random_state=100):
-        "Partition jobs into positive and negative class based on probability"
-        positives, negatives = [], []
-        if self._data is None:
-            self._predictions = []
-            fn = self.instance_location / "predictions.jsonl"
-            with fn.open() as fp:
-                for pred in fp.readlines():
-                    prediction = JobPrediction(json.loads(pred))
-                    if "PhD" in prediction.job_title:
-                        continue
-                    if prediction.probability_lower > 0.5:
-                        positives.append(prediction.to_dict())
-                    else:
-                        negatives.append(prediction.to_dict())
-        positives, negatives = np.array(positives), np.array(negatives)
-        if n_each_class is None:
-            return positives, negatives
-        else:
-            np.random.seed(random_state)
-            sample_positives = np.random.choice(
-                positives, size=n_each_class, replace=False
-            )
-            sample_negatives = np.random.choice(
-                negatives, size=n_each_class, replace=False
+        """Partition jobs into positive and negative class based on probability
+
+        Jobs are read from the JSONL file of predictions in a single pass.
+        If n_each_class is specified, a uniform random sample of each class
+        is kept using reservoir sampling, so that memory use is proportional
+        to the sample size and not the number of predictions.
+
+        Parameters
+        ----------
+        n_each_class : int, optional
+            Number of jobs sampled from each class, if not specified
+            all jobs are returned
+        random_state : int, default=100
+            Random state of the sampler, the same random state gives the
+            same samples
+
+        Returns
+        -------
+        positives, negatives : np.ndarray
+            Arrays of predictions as dictionaries, in the
+            format of :class:`jamie.types.JobPrediction`
+
+        Raises
+        ------
+        ValueError
+            If a class has fewer than n_each_class jobs
+        """
+        rng = random.Random(random_state)
+        samples = {True: [], False: []}
+        seen = {True: 0, False: 0}
+        with (self.instance_location / "predictions.jsonl").open() as fp:
+            for line in fp:
+                prediction = json.loads(line)
+                if "PhD" in prediction["job_title"]:
+                    continue
+                positive = prediction["lower_ci"] > 0.5
+                seen[positive] += 1
+                sample = samples[positive]
+                if n_each_class is None or len(sample) < n_each_class:
+                    sample.append(prediction)
+                else:
+                    k = rng.randrange(seen[positive])
+                    if k < n_each_class:
+                        sample[k] = prediction
+        if n_each_class is not None and min(seen.values()) < n_each_class:
+            raise ValueError(
+                "Cannot sample {} jobs from each class, found {} positives "
+                "and {} negatives".format(n_each_class, seen[True], seen[False])
             )
-            return sample_positives, sample_negatives
+        positives, negatives = (
+            np.array([JobPrediction(p).to_dict() for p in samples[c]])
+            for c in (True, False)
+        )
+        return positives, negatives
 
 
 class ReportSnapshotCollection(SnapshotCollection):
@@ -0,0 +1,97 @@
+"""Cleaned text cache
+
+Text cleaning with :func:`jamie.clean_text.clean_text` is slow, and the same
+descriptions and job titles are cleaned every time a featureset is built or
+information gain is calculated. :class:`CleanTextCache` stores cleaned text
+on disk, keyed by a hash of the raw text and :data:`jamie.clean_text.VERSION`,
+so that text is only cleaned once for each version of the cleaning code.
+
+The cache is stored as a numpy ``.npz`` file with three columns:
+
+* *keys*: SHA-1 digests of the version and raw text
+* *offsets*: end offset of each cleaned text in *text*
+* *text*: UTF-8 encoded cleaned text, concatenated
+"""
+
+import hashlib
+import os
+import numpy as np
+from . import clean_text as _clean_text
+
+
+def text_key(text):
+    "Returns cache key of raw text, for the current version of text cleaning"
+    return hashlib.sha1(
+        ("%d\0%s" % (_clean_text.VERSION, text)).encode("utf-8")
+    ).digest()
+
+
+class CleanTextCache:
+    """Content-addressed cache of cleaned text.
+
+    Parameters
+    ----------
+    filename : Path
+        Cache file, usually in a training snapshot folder. It is read if it
+        exists, and created when :meth:`save` is called.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._texts = {}
+        self._modified = False
+        if filename.exists():
+            with np.load(filename) as data:
+                keys, offsets, text = data["keys"], data["offsets"], data["text"]
+            text = text.tobytes()
+            start = 0
+            for key, end in zip(keys.tolist(), offsets.tolist()):
+                self._texts[key] = text[start:end].decode("utf-8")
+                start = end
+
+    def __len__(self):
+        return len(self._texts)
+
+    def clean(self, texts):
+        """Returns cleaned texts, joined by spaces, cleaning only those
+        texts that are not in the cache.
+
+        Parameters
+        ----------
+        texts : Iterable[str]
+            Raw texts, such as a column of a pd.DataFrame
+
+        Returns
+        -------
+        List[str]
+            Cleaned texts, in the same order as texts
+        """
+        keys = []
+        missing = {}
+        for text in texts:
+            key = text_key(text)
+            if key not in self._texts:
+                missing[key] = text
+            keys.append(key)
+        if missing:
+            for key, words in zip(missing, _clean_text.clean_texts(missing.values())):
+                self._texts[key] = " ".join(words)
+            self._modified = True
+        return [self._texts[k] for k in keys]
+
+    def save(self):
+        "Writes the cache to disk, if it has been modified"
+        if not self._modified:
+            return
+        keys = list(self._texts)
+        encoded = [self._texts[k].encode("utf-8") for k in keys]
+        tmp = self.filename.with_name(self.filename.name + ".tmp")
+        with tmp.open("wb") as fp:
+            np.savez(
+                fp,
+                keys=np.array(keys, dtype="S20"),
+                offsets=np.cumsum([len(e) for e in encoded], dtype=np.int64),
+                text=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            )
+        os.replace(tmp, self.filename)
+        self._modified = False
@@ -17,17 +17,24 @@ setup(
         "pandas==1.0.3",
         "scikit-learn==0.22.2",
         "imbalanced-learn==0.6.2",
+        "joblib>=1.3",  # parallel model ensemble and import
         "nltk==3.5",  # text cleaning
         "numpy>=1.12.0",
         "tqdm",  # progress bars
         "requests==2.22.0",
         "beautifulsoup4==4.9.0",
         "python-dateutil==2.8.1",
-        "datefinder==0.7.1",
     ],
     extras_require={
         "docs": ["sphinx"],
-        "dev": ["pre-commit", "black", "flake8", "pytest"],
+        "lxml": ["lxml"],  # faster HTML parsing
+        "dev": [
+            "pre-commit",
+            "black",
+            "flake8",
+            "pytest",
+            "datefinder==0.7.1",  # validating date extraction
+        ],
     },
     package_data={"jamie": ["data/uk_uni*"]},
     zip_safe=False,
@@ -0,0 +1,13 @@
+import nltk
+import pytest
+import jamie.clean_text
+
+
+@pytest.fixture
+def simple_nltk(monkeypatch):
+    "Simple tokenizers and stopwords, as NLTK data may not be installed"
+    monkeypatch.setattr(nltk, "sent_tokenize", lambda text: text.split(". "))
+    monkeypatch.setattr(nltk, "word_tokenize", lambda text: text.split())
+    monkeypatch.setattr(
+        jamie.clean_text, "stopwords", lambda: {"the", "and", "of", "in", "to"}
+    )
@@ -0,0 +1,57 @@
+from jamie.clean_text import clean_text, clean_texts
+
+# Expected output of the original implementation of clean_text(), using the
+# simple tokenizers and stopwords in conftest.py, as NLTK data may not be installed
+TEXTS = {
+    "The Research Software Engineer (RSE). Salary £30,000 to 35,000": [
+        ["research", "software", "engineer", "rse"],
+        ["salary"],
+    ],
+    "Email jobs@uni.ac.uk or see www.uni.ac.uk/jobs for 2 posts. "
+    "Café naïve ``quotes``": [
+        ["email", "or", "see", "jobs", "for", "posts"],
+        ["café", "naïve", "``quotes``"],
+    ],
+    "Costs 5€ and €10. 3.5 FTE, 1e5 nan": [["costs"], ["fte"]],
+    "Lecturer in Computer Science (0.5 FTE) – Department of Informatics. "
+    "The post-holder will teach C++ and Python": [
+        ["lecturer", "computer", "science", "fte", "department", "informatics"],
+        ["post", "holder", "will", "teach", "c++", "python"],
+    ],
+    "We'll consider applicants who don't hold a PhD; "
+    "the University's policy is flexible": [
+        ["we", "ll", "consider", "applicants", "who", "don", "t", "hold", "a"]
+        + ["phd", "university", "s", "policy", "is", "flexible"]
+    ],
+    "Salary: £32,817 – £38,833 per annum (Grade 7). Apply by 5pm, 12/04/2020": [
+        ["salary", "per", "annum", "grade"],
+        ["apply", "by", "5pm"],
+    ],
+    "Visit https://www.jobs.ac.uk/job/ABC123 or http://uni.ac.uk. "
+    "Contact hr at uni dot ac dot uk": [
+        ["visit", "job", "abc123", "or", "uniacuk"],
+        ["contact"],
+    ],
+    "¡Research «Associate»! Données §3 — 50% FTE… $100k, 20€/hour, ¥ costs": [
+        ["research", "associate", "données", "fte", "hour", "costs"]
+    ],
+    "I I i. ... --- '' `` \"quoted\" (brackets) [squares] {braces}": [
+        ["i", "i", "i"],
+        [],
+        ["``", "quoted", "brackets", "squares", "braces"],
+    ],
+}
+
+
+def test_clean_text(simple_nltk):
+    for text, sentences in TEXTS.items():
+        assert clean_text(text, flat_list=False) == sentences
+        assert clean_text(text) == sum(sentences, [])
+
+
+def test_clean_texts(simple_nltk):
+    texts = list(TEXTS) * 2
+    assert clean_texts(texts) == [clean_text(t) for t in texts]
+    assert clean_texts(texts, flat_list=False) == [
+        clean_text(t, flat_list=False) for t in texts
+    ]
@@ -0,0 +1,89 @@
+import calendar
+import pytest
+from pathlib import Path
+from contextlib import suppress
+from datetime import datetime
+from jamie.scrape.dates import NUMERIC, earliest_date
+from jamie.scrape.process import JobFile
+
+TEST_INPUT_FOLDER = Path("test-input")
+
+# HTML files collected by the scraper do not have an extension
+if TEST_INPUT_FOLDER.exists():
+    FILES = [f for f in TEST_INPUT_FOLDER.glob("*") if f.suffix == ""]
+else:
+    FILES = []
+
+
+@pytest.mark.parametrize(
+    "text,date",
+    [
+        ("Placed On:\n12th April 2020\nCloses:\n10th May 2020", datetime(2020, 4, 12)),
+        ("Placed on: 3 Sept 2019, closes Sept 30, 2019", datetime(2019, 9, 3)),
+        ("Closes: 1st of March, 2021", datetime(2021, 3, 1)),
+        ("Date Placed: 05/06/2021", datetime(2021, 6, 5)),  # day first
+        ("Posted on 2020-04-31 and 2020-04-30", datetime(2020, 4, 30)),
+        ("Placed On:12 Jan 2019Closes:28 Feb 2019", datetime(2019, 1, 12)),
+        # Dates after labels are preferred to dates elsewhere in the text
+        ("Funded since 1 May 2015. Placed on 2 June 2020", datetime(2020, 6, 2)),
+        ("Start date 1 May 2013, interviews on 4 June 2020", datetime(2020, 6, 4)),
+        ("No dates in 2020", None),
+    ],
+)
+def test_earliest_date(text, date):
+    assert earliest_date(text, min_year=2014) == date
+
+
+def _datefinder_date(text):
+    "Earliest date found by datefinder, as before jamie.scrape.dates"
+    datefinder = pytest.importorskip("datefinder")
+    with suppress(calendar.IllegalMonthError, TypeError):
+        return min(
+            [
+                d
+                for d in datefinder.find_dates(text.replace(":", ""))
+                if d.year >= JobFile.EPOCH_YEAR
+            ],
+            default=None,
+        )
+
+
+@pytest.mark.parametrize(
+    "text,date,datefinder_date",
+    [
+        # ambiguous numeric dates are read day first, datefinder reads month first
+        ("Placed on: 05/06/2021", datetime(2021, 6, 5), datetime(2021, 5, 6)),
+        ("Closes: 12.04.2020", datetime(2020, 4, 12), datetime(2020, 12, 4)),
+        (
+            "Placed on 01/02/2020 closes 03/01/2020",
+            datetime(2020, 1, 3),
+            datetime(2020, 1, 2),
+        ),
+        # unambiguous numeric dates are the same
+        ("Placed on: 13/04/2020", datetime(2020, 4, 13), datetime(2020, 4, 13)),
+        ("Placed on: 04/13/2020", datetime(2020, 4, 13), datetime(2020, 4, 13)),
+        ("Placed on: 07/07/2020", datetime(2020, 7, 7), datetime(2020, 7, 7)),
+    ],
+)
+def test_numeric_dates(text, date, datefinder_date):
+    assert earliest_date(text, JobFile.EPOCH_YEAR) == date
+    assert _datefinder_date(text) == datefinder_date
+
+
+def _ambiguous(text):
+    "Whether text has a numeric date that is read differently month first"
+    for match in NUMERIC.finditer(text):
+        day, month = int(match.group("day")), int(match.group("month"))
+        if day != month and day <= 12 and month <= 12:
+            return True
+    return False
+
+
+@pytest.mark.parametrize("filename", FILES)
+def test_earliest_date_matches_datefinder(filename):
+    text = JobFile(filename)._soup.get_text()
+    if _ambiguous(text):
+        pytest.skip("numeric dates are read day first, see test_numeric_dates")
+    expected = _datefinder_date(text)
+    date = earliest_date(text, JobFile.EPOCH_YEAR)
+    assert (date and date.date()) == (expected and expected.date())
@@ -0,0 +1,57 @@
+from jamie.scrape.clean import OutputRow
+from jamie.scrape.employers import EmployerIndex, ngrams, normalise, uk_universities
+
+NAMES = [
+    "University of Bristol",
+    "University of Brighton",
+    "Cardiff University",
+    "Institute of Cancer Research",
+    "University of Cambridge",
+]
+
+
+def _normalise(name):
+    return " ".join(sorted(set(name.lower().split())))
+
+
+def test_ngrams():
+    assert ngrams("ab") == {" ab", "ab "}
+
+
+def test_employer_index():
+    index = EmployerIndex(NAMES + ["Bristol University of"], normalise=_normalise)
+    assert len(index) == 5  # same normalised name as University of Bristol
+    assert index.match("university of bristol") == "University of Bristol"
+    assert index.match("Univrsity of Brigton") == "University of Brighton"
+    assert index.match("Cardif Univ") == "Cardiff University"
+    assert index.match("Acme Widgets Ltd") is None
+    index.match("Univrsity of Brigton")
+    assert index._resolve.cache_info().hits == 1
+
+
+def test_employer_index_candidates():
+    index = EmployerIndex(NAMES, normalise=_normalise, candidates=1)
+    assert index._candidates(_normalise("Cancer Research Institute")) == [3]
+
+
+def _clean_row(employer):
+    return OutputRow({"employer": employer}).clean_row().to_dictionary()
+
+
+def test_output_row_uk_university(simple_nltk):
+    uk_universities.cache_clear()  # built with the simple stopwords
+    try:
+        index = uk_universities()
+        assert _clean_row("University of Somewhere")["uk_university"] == (
+            "University of Somewhere"
+        )
+        # previous output value, the normalised name of the university
+        expected = normalise("Courtauld Institute of Art")
+        assert expected in OutputRow({}).read_uni_list_file()
+        assert _clean_row("Courtald Institute of Art")["uk_university"] == expected
+        assert "uk_university" not in _clean_row("Acme Widgets Ltd - Research")
+        misses = index._resolve.cache_info().misses
+        _clean_row("Courtald Institute of Art")
+        assert index._resolve.cache_info().misses == misses  # resolved once
+    finally:
+        uk_universities.cache_clear()
@@ -0,0 +1,138 @@
+import json
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.base import clone
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import FeatureUnion
+from sklearn.svm import SVC
+from jamie.ensemble import LinearEnsemble, PackedEnsemble, pack, _vectorizers
+from jamie.snapshots import ModelSnapshot
+from jamie.features.default import _text_feature
+
+DOCS = pd.DataFrame(
+    {
+        "description": [
+            "develop research software in python",
+            "teach undergraduate chemistry",
+            "maintain scientific computing infrastructure and software",
+            "lecturer in medieval history",
+        ],
+        "job_title": [
+            "research software engineer",
+            "lecturer",
+            "research computing engineer",
+            "lecturer",
+        ],
+    }
+)
+LABELS = np.array([1, 0, 1, 0])
+
+
+def _members():
+    for k in [0, 1, 10, 2]:
+        features = FeatureUnion(
+            [_text_feature("description"), _text_feature("job_title")]
+        ).fit(DOCS.iloc[k % 2 :])
+        model = LogisticRegression(C=1 + k).fit(
+            features.transform(DOCS.iloc[k % 2 :]), LABELS[k % 2 :]
+        )
+        yield str(k), model, features
+
+
+def test_packed_ensemble(tmp_path):
+    members = list(_members())
+    pack(members, tmp_path / "ensemble.pack")
+    ensemble = PackedEnsemble(tmp_path / "ensemble.pack")
+    assert ensemble.indices == ["0", "1", "10", "2"]
+    for index, model, features in members:
+        packed_model, packed_features = (
+            ensemble.model(index),
+            ensemble.features(index),
+        )
+        assert not packed_model.coef_.flags.writeable  # memory-mapped
+        assert np.array_equal(
+            packed_model.predict_proba(packed_features.transform(DOCS)),
+            model.predict_proba(features.transform(DOCS)),
+        )
+
+
+def test_packed_ensemble_shared_features(tmp_path):
+    features = FeatureUnion(
+        [_text_feature("description"), _text_feature("job_title")]
+    ).fit(DOCS)
+    X = features.transform(DOCS)
+    members = [
+        (str(k), LogisticRegression(C=1 + k).fit(X, LABELS), features) for k in range(3)
+    ]
+    pack(members, tmp_path / "ensemble.pack")
+    ensemble = PackedEnsemble(tmp_path / "ensemble.pack")
+    assert ensemble.features("0") is ensemble.features("2")
+
+
+@pytest.mark.parametrize(
+    "estimator,atol",
+    [
+        (LogisticRegression(), 1e-12),
+        # libsvm stops iterating within 0.005 of the exact probability
+        (SVC(kernel="linear", probability=True), 0.005),
+    ],
+)
+@pytest.mark.filterwarnings("ignore::FutureWarning")
+def test_linear_ensemble(estimator, atol):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(60, 5))
+    y = (X[:, 0] + rng.normal(size=60) > 0).astype(int)
+    models = [
+        clone(estimator).set_params(random_state=k).fit(X[k:], y[k:]) for k in range(3)
+    ]
+    expected = np.column_stack([m.predict_proba(X)[:, 1] for m in models])
+    assert np.allclose(
+        LinearEnsemble(models).predict_proba(X), expected, rtol=0, atol=atol
+    )
+
+
+def test_linear_ensemble_nonlinear():
+    X, y = np.eye(4), LABELS
+    with pytest.raises(ValueError):
+        LinearEnsemble([SVC(kernel="rbf", probability=True).fit(X, y)])
+
+
+def test_pack_keeps_members(tmp_path):
+    members = list(_members())
+    vectorizers = list(_vectorizers(members[0][2]))
+    vectorizers[0].stop_words_ = {"the"}
+    pack(members, tmp_path / "ensemble.pack")
+    assert vectorizers[0].stop_words_ == {"the"}
+    assert not (tmp_path / "ensemble.tmp").exists()
+    packed = list(
+        _vectorizers(PackedEnsemble(tmp_path / "ensemble.pack").features("0"))
+    )
+    assert packed[0].stop_words_ is None
+
+
+def test_model_snapshot_pack_twice(tmp_path):
+    folder = tmp_path / "models" / "2020-05-01T10-00-00_rse"
+    folder.mkdir(parents=True)
+    (folder / "metadata.json").write_text(json.dumps({"training": {}}))
+    members = list(_members())
+    for index, model, features in members:
+        with (folder / ("model_%s.pkl" % index)).open("wb") as fp:
+            pickle.dump(model, fp)
+        with (folder / ("features_%s.pkl" % index)).open("wb") as fp:
+            pickle.dump(features, fp)
+    snapshot = ModelSnapshot("2020-05-01T10-00-00_rse", root=tmp_path)
+    snapshot.pack().pack()
+    assert sorted(f.name for f in folder.iterdir()) == [
+        "ensemble.pack",
+        "metadata.json",
+    ]
+    snapshot = ModelSnapshot("2020-05-01T10-00-00_rse", root=tmp_path)
+    for index, model, features in members:
+        assert np.array_equal(
+            snapshot.model(index).predict_proba(
+                snapshot.features(index).transform(DOCS)
+            ),
+            model.predict_proba(features.transform(DOCS)),
+        )
@@ -1,4 +1,17 @@
+import json
+import uuid
 import pytest
+import pymongo
+from collections import defaultdict
+import jamie.data.importer
+from jamie.data.importer import (
+    DUPLICATE_KEY_ERROR,
+    ImportManifest,
+    _import_chunks,
+    insert_jobs,
+    main,
+)
+from jamie.scrape.archive import Folder, archive_folder
 from jamie.scrape.process import get_nested_key
 
 d = {
@@ -24,3 +37,169 @@ d = {
 )
 def test_get_nested_key(key, value):
     assert get_nested_key(d, key) == value
+
+
+def _write_jobs(folder, n):
+    for i in range(n):
+        ld = {
+            "title": "Research Software Engineer %d" % i,
+            "hiringOrganization": {"name": "University of Somewhere"},
+            "datePosted": "2020-04-12",
+            "validThrough": "2020-05-12",
+            "baseSalary": {"value": "£30,000"},
+            "description": "<p>Develop research software</p>",
+            "employmentType": "Full Time,Permanent",
+            "jobLocation": {"address": {"addressLocality": "London"}},
+        }
+        (folder / ("job%d" % i)).write_text(
+            '<html><script type="application/ld+json">%s</script></html>'
+            % json.dumps(ld)
+        )
+
+
+def test_import_chunks_parallel(tmp_path):
+    _write_jobs(tmp_path, 7)
+    serial = [
+        c for c in _import_chunks(tmp_path, skip={"job3"}, n_jobs=1, chunk_size=2)
+    ]
+    parallel = [
+        c for c in _import_chunks(tmp_path, skip={"job3"}, n_jobs=2, chunk_size=2)
+    ]
+    assert max(len(c) for c in parallel) == 2
+    jobids = sorted(job["jobid"] for c in serial for job in c)
+    assert jobids == ["job0", "job1", "job2", "job4", "job5", "job6"]
+    assert sorted(job["jobid"] for c in parallel for job in c) == jobids
+
+
+def test_import_chunks_archive(tmp_path):
+    (tmp_path / "input").mkdir()
+    _write_jobs(tmp_path / "input", 7)
+    archive_folder(tmp_path / "input", tmp_path / "archive")
+    chunks = list(
+        _import_chunks(
+            tmp_path / "archive", skip={"job3"}, n_jobs=2, chunk_size=2, archive=True
+        )
+    )
+    jobs = [job for c in chunks for job in c]
+    assert sorted(job["jobid"] for job in jobs) == [
+        "job0",
+        "job1",
+        "job2",
+        "job4",
+        "job5",
+        "job6",
+    ]
+    assert all("filename" not in job for job in jobs)
+
+
+class Collection:
+    "Collection with a unique jobid index"
+
+    def __init__(self):
+        self.jobids = set()
+        self.replaced = []
+
+    def insert_many(self, jobs, ordered=True):
+        assert not ordered
+        errors = []
+        for i, job in enumerate(jobs):
+            if job["jobid"] in self.jobids:
+                errors.append({"index": i, "code": DUPLICATE_KEY_ERROR})
+            self.jobids.add(job["jobid"])
+        if errors:
+            raise pymongo.errors.BulkWriteError(
+                {"nInserted": len(jobs) - len(errors), "writeErrors": errors}
+            )
+        return pymongo.results.InsertManyResult([j["jobid"] for j in jobs], True)
+
+    def find(self, query, projection):
+        return Cursor({"jobid": j} for j in sorted(self.jobids))
+
+    def bulk_write(self, requests, ordered=True):
+        assert not ordered
+        for r in requests:
+            assert r._upsert
+            self.replaced.append(r._filter["jobid"])
+            self.jobids.add(r._filter["jobid"])
+
+    def create_index(self, key, unique=False):
+        pass
+
+
+class Database(dict):
+    "Database with a jobs collection, whose identity changes when dropped"
+
+    name = "jobsDB"
+
+    def __init__(self):
+        self.drop()
+
+    def drop(self):
+        self["jobs"], self.uuid = Collection(), uuid.uuid4()
+
+    def list_collections(self, filter):
+        return [{"name": "jobs", "info": {"uuid": self.uuid}}]
+
+
+class Cursor(list):
+    def batch_size(self, n):
+        return self
+
+
+def test_insert_jobs():
+    db_jobs, njobs = Collection(), defaultdict(int)
+    jobs = [{"jobid": "b"}, {"jobid": "c"}, {"jobid": "a"}]
+    assert insert_jobs(db_jobs, [{"jobid": "a"}, {"jobid": "b"}], njobs)
+    assert insert_jobs(db_jobs, jobs, njobs) == jobs
+    assert njobs == {"inserted": 3, "duplicate": 2}
+
+
+def test_import_manifest(tmp_path):
+    folder = tmp_path / "input"
+    folder.mkdir()
+    _write_jobs(folder, 3)
+    db_jobs = Collection()
+    db_jobs.jobids = {"job0"}
+    manifest = ImportManifest(tmp_path / "manifest.jsonl", Folder(folder))
+    manifest.rebuild(db_jobs, "jobs")
+    jobs = [j for c in _import_chunks(folder, skip=manifest) for j in c]
+    assert sorted(j["jobid"] for j in jobs) == ["job1", "job2"]
+    manifest.add(jobs)
+    manifest = ImportManifest(tmp_path / "manifest.jsonl", Folder(folder))
+    assert len(manifest) == 3 and manifest.collection == "jobs"
+    assert manifest.jobs["job1"] == Folder(folder).stat("job1")
+    assert list(_import_chunks(folder, skip=manifest)) == []
+    (folder / "job1").write_text((folder / "job1").read_text() + " ")
+    jobs = [j for c in _import_chunks(folder, skip=manifest) for j in c]
+    assert [j["jobid"] for j in jobs] == ["job1"]  # changed since imported
+
+
+def test_import_main(tmp_path, monkeypatch):
+    folder = tmp_path / "input"
+    folder.mkdir()
+    _write_jobs(folder, 3)
+    db = Database()
+    monkeypatch.setattr(jamie.data.importer, "connect_mongo", lambda config: db)
+
+    class Config(dict):
+        cache = tmp_path
+
+    config = Config(
+        {
+            "db.name": "jobsDB",
+            "db.jobs": "jobs",
+            "scrape.folder": folder,
+            "scrape.archive": False,
+            "scrape.parser": "html.parser",
+            "load.n-jobs": 1,
+        }
+    )
+    assert main(config) == {"inserted": 3}
+    assert main(config) == {}
+    (folder / "job1").write_text((folder / "job1").read_text() + " ")
+    assert main(config) == {"updated": 1}
+    assert db["jobs"].replaced == ["job1"]
+    # the database is dropped, and loaded again with a job not in the manifest
+    db.drop()
+    db["jobs"].jobids = {"job0"}
+    assert main(config) == {"inserted": 2}
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse
+from sklearn.feature_extraction.text import CountVectorizer
+from jamie.information_gain import (
+    L,
+    _count_blocks,
+    document_frequencies,
+    information_gain,
+    information_gain_blocks,
+    top_k_information_gain,
+    write_ranked,
+    InformationGainTransformer,
+)
+
+
+def _data(n=200, m=50):
+    rng = np.random.default_rng(0)
+    X = scipy.sparse.random(n, m, density=0.1, format="csr", random_state=1)
+    X.data = rng.integers(1, 5, len(X.data)).astype(float)
+    y = rng.integers(0, 2, n)
+    return X, y
+
+
+def test_information_gain_matches_formula():
+    X, y = _data()
+    expected = [L(X[:, k].toarray().squeeze() != 0, y) for k in range(X.shape[1])]
+    assert np.allclose(information_gain(X, y), expected, rtol=0, atol=1e-12)
+
+
+def test_information_gain_transformer():
+    X, y = _data()
+    ig = InformationGainTransformer()
+    values = ig.fit_transform(X, y, ["w%d" % k for k in range(X.shape[1])])
+    assert values.shape == (X.shape[1],)
+    assert list(ig.sorted_dataframe().information) == sorted(values)
+
+
+def test_information_gain_blocks():
+    X, y = _data()
+    expected = information_gain(X, y)
+    for n_jobs in [1, 2]:
+        values = np.empty(X.shape[1])
+        for start, block in information_gain_blocks(X, y, 7, n_jobs):
+            values[start : start + len(block)] = block
+        assert np.array_equal(values, expected)
+    indices, values = top_k_information_gain(information_gain_blocks(X, y, 7), 5)
+    assert np.array_equal(values, np.sort(expected)[-5:])
+    assert np.array_equal(expected[indices], values)
+
+
+def test_information_gain_binary_int8():
+    X, y = _data()
+    X_int8 = (X != 0).astype(np.int8)
+    expected = information_gain(X, y)
+    assert np.array_equal(information_gain(X_int8, y), expected)
+    values = np.empty(X.shape[1])
+    for start, block in information_gain_blocks(X_int8, y, 7):
+        values[start : start + len(block)] = block
+    assert np.array_equal(values, expected)
+
+
+def test_document_frequencies():
+    rng = np.random.default_rng(0)
+    words = ["research", "software", "engineer", "data", "the", "lab", "python"]
+    texts = [" ".join(rng.choice(words, 8)) for _ in range(50)]
+    y = rng.integers(0, 2, len(texts))
+    vec = CountVectorizer(ngram_range=(1, 2), stop_words="english")
+    X = vec.fit_transform(texts)
+    expected = information_gain(X, y)
+    for n_jobs in [1, 2]:
+        terms, counts = document_frequencies(
+            texts, y, vec.build_analyzer(), n_jobs, batch_size=7
+        )
+        assert terms == list(vec.get_feature_names_out())
+        assert np.array_equal(counts[:, 0], (X != 0).sum(axis=0).A1)
+        values = np.empty(len(terms))
+        for start, block in _count_blocks(counts, y, 5):
+            values[start : start + len(block)] = block
+        assert np.array_equal(values, expected)
+
+
+def test_write_ranked(tmp_path):
+    X, y = _data()
+    names = ["w%d" % k for k in range(X.shape[1])]
+    ig = InformationGainTransformer()
+    ig.fit(X, y, names)
+    write_ranked(tmp_path / "ig.csv", information_gain(X, y), names)
+    data = pd.read_csv(tmp_path / "ig.csv")
+    assert list(data.ngram) == list(ig.sorted_dataframe().ngram)
+    assert np.allclose(data.information, ig.sorted_dataframe().information)
+
+
+def test_rank_queries():
+    X, y = _data()
+    for rank_method in ["dense", "min", "average", "ordinal"]:
+        ig = InformationGainTransformer(rank_method).fit(X, y)
+        ranked = ig._ranked
+        for rank in [1, 2, 5, 17, 1000]:
+            assert list(ig.indices_till_rank(rank)) == [
+                i for i, r in enumerate(ranked) if r <= rank
+            ]
+            assert list(ig.indices_till_rank(-rank)) == [
+                i for i, r in enumerate(ranked) if r >= max(ranked) - rank + 1
+            ]
+            assert list(ig.indices_at_rank(rank)) == [
+                i for i, r in enumerate(ranked) if r == rank
+            ]
+
+
+def test_transform():
+    X, y = _data()
+    ig = InformationGainTransformer(k=10)
+    Xt = ig.fit_transform(X, y)
+    assert scipy.sparse.issparse(Xt) and Xt.shape == (X.shape[0], 10)
+    selected = information_gain(X, y)[ig.support_]
+    assert selected.min() >= np.sort(information_gain(X, y))[-10]
+    assert (Xt != X[:, ig.support_]).nnz == 0
@@ -0,0 +1,88 @@
+import copy
+import pickle
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from jamie.features.base import FeatureBase
+from jamie.features.default import _text_feature
+from jamie.models import fit_ensemble
+
+
+class Features(FeatureBase):
+    def __init__(self, data):
+        super().__init__(data, require_columns=["description", "job_title"])
+        self.set_features([_text_feature("description"), _text_feature("job_title")])
+
+    def make_arrays(self, prediction_field):
+        self._prepare_labels(prediction_field)
+        self.X = self.data[["description", "job_title"]]
+        return self
+
+
+def _features():
+    rng = np.random.default_rng(0)
+    words = np.array(["research", "software", "lecturer", "history", "data", "admin"])
+    data = pd.DataFrame(
+        {
+            "description": [" ".join(rng.choice(words, 8)) for _ in range(40)],
+            "job_title": [" ".join(rng.choice(words, 2)) for _ in range(40)],
+            "label": [i % 2 for i in range(40)],
+        }
+    )
+    return Features(data).make_arrays("label")
+
+
+def _load_member(folder, k):
+    "Returns feature pipeline and model of ensemble member k"
+    with (folder / ("features_%d.pkl" % k)).open("rb") as fp:
+        pipeline = pickle.load(fp)
+    with (folder / ("model_%d.pkl" % k)).open("rb") as fp:
+        return pipeline, pickle.load(fp)
+
+
+def test_fit_ensemble_reproducible(tmp_path):
+    serial, parallel = tmp_path / "serial", tmp_path / "parallel"
+    serial.mkdir()
+    parallel.mkdir()
+    features = _features()
+    estimator = LogisticRegression(random_state=100)
+    fit_ensemble(features, estimator, serial, n_jobs=1, size=4)
+    fit_ensemble(features, estimator, parallel, n_jobs=2, size=4)
+    assert len(list(parallel.glob("*.pkl"))) == 8
+    for k in range(4):
+        (pipeline, model), (parallel_pipeline, parallel_model) = [
+            _load_member(folder, k) for folder in [serial, parallel]
+        ]
+        assert np.array_equal(model.coef_, parallel_model.coef_)
+        assert np.array_equal(
+            model.predict_proba(pipeline.transform(features.X)),
+            parallel_model.predict_proba(parallel_pipeline.transform(features.X)),
+        )
+
+
+def test_fit_ensemble_shared_features(tmp_path):
+    features = _features()
+    X = features.fit_transform(features.X)
+    fit_ensemble(
+        features, LogisticRegression(random_state=100), tmp_path, n_jobs=1, size=3, X=X
+    )
+    assert sorted(f.name for f in tmp_path.glob("*.pkl")) == [
+        "model_0.pkl",
+        "model_1.pkl",
+        "model_2.pkl",
+    ]
+
+
+def test_fit_ensemble_same_split(tmp_path):
+    features = _features()
+    estimator = LogisticRegression(random_state=100)
+    fit_ensemble(features, estimator, tmp_path, n_jobs=1, size=2)
+    for k in range(2):
+        X_train, _, y_train, _ = features.train_test_split(k)
+        pipeline = copy.deepcopy(features._features)
+        expected = copy.deepcopy(estimator).fit(
+            pipeline.fit_transform(X_train), y_train
+        )
+        with (tmp_path / ("model_%d.pkl" % k)).open("rb") as fp:
+            model = pickle.load(fp)
+        assert np.array_equal(model.coef_, expected.coef_)
@@ -1,7 +1,9 @@
+import bs4
 import json
 import pytest
 from pathlib import Path
 from jamie.scrape import JobFile
+from jamie.scrape.process import html_text
 
 TEST_INPUT_FOLDER = Path("test-input")
 
@@ -27,3 +29,78 @@ def test_parser(filename, expected_json):
     with expected_json.open() as fp:
         data = json.load(fp)
     assert JobFile(filename).parse().json == data
+
+
+PAGE = """<html><body>
+<div id="enhanced-content"><h3>University</h3></div>
+<div class="section">First</div>
+<div class="section wide" id="main">Second</div>
+<div class="section wide">Third</div>
+<table><tr><td class="detail-heading">Salary:</td><td>£30,000</td></tr></table>
+<b>Subject Area(s):</b><input name="categoryId[]"><input value="Computing">
+<script type="application/ld+json">{}</script>
+</body></html>"""
+
+
+@pytest.mark.parametrize(
+    "tag,attrs",
+    [
+        ("div", None),
+        ("div", {"class": "section"}),
+        ("div", {"class": "section wide"}),
+        ("div", {"class": "section", "id": None}),
+        ("div", {"id": "enhanced-content"}),
+        ("td", {"class": "detail-heading"}),
+        ("script", {"type": "application/ld+json"}),
+        ("p", None),
+    ],
+)
+def test_find_all(tag, attrs):
+    job = JobFile(PAGE, jobid="job")
+    expected = job._soup.find_all(tag, attrs or {})
+    assert list(map(id, job._find_all(tag, attrs))) == list(map(id, expected))
+    assert job._find(tag, attrs) is job._soup.find(tag, attrs or {})
+    assert job.enhanced
+    assert job.new_subject_area == ["Computing"]
+
+
+JSON_PAGE = """<html><head><script>var tag = "<b>";</script>
+<script type='application/ld+json'>%s</script></head><body>
+<b>Subject Area(s):</b>
+<input name="categoryId[]"><input type="hidden" value="Computer Science">
+<input name="categoryId[]"><input type="hidden" value="Physics">
+<input class="j-form-input j-form-input__location" value="Manchester">
+</body></html>""" % json.dumps(
+    {
+        "title": "Research Software Engineer",
+        "hiringOrganization": {"name": "University of Somewhere"},
+        "datePosted": "2020-04-12",
+        "validThrough": "2020-05-12",
+        "baseSalary": {"value": "£30,000"},
+        "description": "<p>Develop &amp; maintain</p><p>research software</p>",
+        "employmentType": "Full Time,Permanent",
+        "jobLocation": {"address": {"addressLocality": "Manchester"}},
+    }
+)
+
+
+def test_parse_json_without_tree():
+    job = JobFile(JSON_PAGE, jobid="job").parse()
+    assert job._tree is None
+    assert job.data["description"] == "Develop & maintainresearch software"
+    assert job.data["subject_area"] == ["Computer Science", "Physics"]
+    assert job.data["extra_location"] == "Manchester"
+    assert job.data["employer"] == "University of Somewhere"
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "<p>Develop &amp; maintain &nbsp; &#150; tools</p><br/>More",
+        "<div><!-- comment --><script>var x = 1;</script>Text</div>",
+        "<li>two &copy; &foo; &#x41; &#0;</li>\r\nline <b>unclosed",
+        "a < b > c & d <![CDATA[raw]]>",
+    ],
+)
+def test_html_text(text):
+    assert html_text(text) == bs4.BeautifulSoup(text, "html.parser").get_text()
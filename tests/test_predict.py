@@ -0,0 +1,203 @@
+import pymongo
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import FeatureUnion
+from jamie.features.default import _text_feature
+from jamie.predict import (
+    PREDICTION_FIELDS,
+    Bootstrap,
+    Predict,
+    ensemble_probabilities,
+)
+
+DOCS = pd.DataFrame(
+    {
+        "description": [
+            "develop research software in python",
+            "teach undergraduate chemistry",
+            "maintain scientific computing infrastructure and software",
+            "lecturer in medieval history",
+            "research software engineer for climate models",
+            "administrative assistant for the finance office",
+        ],
+        "job_title": [
+            "research software engineer",
+            "lecturer",
+            "research computing engineer",
+            "lecturer",
+            "software engineer",
+            "assistant",
+        ],
+    }
+)
+LABELS = np.array([1, 0, 1, 0, 1, 0])
+
+
+def _ensemble(n):
+    models, features = [], []
+    for k in range(n):
+        f = FeatureUnion(
+            [_text_feature("description"), _text_feature("job_title")]
+        ).fit(DOCS.iloc[k:])
+        models.append(
+            LogisticRegression(C=1 + k).fit(f.transform(DOCS.iloc[k:]), LABELS[k:])
+        )
+        features.append(f)
+    return models, features
+
+
+def test_ensemble_probabilities_batch_matches_single():
+    models, features = _ensemble(3)
+    batch = ensemble_probabilities(models, features, DOCS)
+    assert batch.shape == (len(DOCS), 3)
+    for i in range(len(DOCS)):
+        single = [
+            m.predict_proba(f.transform(DOCS.iloc[[i]]))[0][1]
+            for m, f in zip(models, features)
+        ]
+        assert np.allclose(batch[i], single, rtol=0, atol=1e-12)
+
+
+def test_bootstrap_batch_matches_sample():
+    p = np.random.default_rng(0).uniform(size=(4, 100))
+    bootstrap = Bootstrap(random_state=0, n=500)
+    batch = bootstrap.sample_batch(p)
+    for i in range(len(p)):
+        single = Bootstrap(random_state=0, n=500).sample(p[i])
+        for k in ["probability", "lower_ci", "upper_ci"]:
+            assert np.isclose(batch[k][i], single[k])
+        assert single["lower_ci"] <= p[i].mean() <= single["upper_ci"]
+
+
+def test_bootstrap_normal():
+    p = np.random.default_rng(0).uniform(size=(3, 100))
+    normal = Bootstrap(random_state=0, method="normal").sample_batch(p)
+    bootstrap = Bootstrap(random_state=0).sample_batch(p)
+    assert np.allclose(normal["probability"], p.mean(axis=1))
+    assert np.allclose(normal["lower_ci"], bootstrap["lower_ci"], atol=0.02)
+    assert np.allclose(normal["upper_ci"], bootstrap["upper_ci"], atol=0.02)
+
+
+class Cursor(list):
+    def batch_size(self, n):
+        return self
+
+
+class Collection:
+    "Collection recording queries and bulk writes"
+
+    def __init__(self, docs=()):
+        self.docs = list(docs)
+        self.queries = []
+        self.writes = []
+
+    def find(self, query, projection):
+        self.queries.append(query)
+        return Cursor(dict(d) for d in self.docs)
+
+    def bulk_write(self, operations, ordered=True):
+        assert not ordered
+        self.writes.append(operations)
+
+
+class ModelSnapshot:
+    name = "2020-05-01T10-00-00_rse"
+    shared_features = False
+    metadata = {"training": {"featureset": "rse"}, "config": {}}
+
+    def __init__(self, n):
+        self._models, self._features = _ensemble(n)
+        self.data = {"indices": [str(k) for k in range(n)]}
+
+    def model(self, i):
+        return self._models[int(i)]
+
+    def features(self, i):
+        return self._features[int(i)]
+
+
+EXISTING = {
+    "_id": "job1_" + ModelSnapshot.name,
+    "jobid": "job1",
+    "snapshot": ModelSnapshot.name,
+    "probability": 0.5,
+    "lower_ci": 0.4,
+    "upper_ci": 0.6,
+}
+JOBS = [
+    {
+        "_id": "object%d" % k,
+        "jobid": "job%d" % k,
+        "job_title": job_title,
+        "description": description,
+        "json": {"title": job_title, "description": description},
+    }
+    for k, (description, job_title) in enumerate(zip(DOCS.description, DOCS.job_title))
+] + [{"_id": "object9", "jobid": "job9", "job_title": "no description"}]
+
+
+class Database(dict):
+    __getattr__ = dict.__getitem__
+
+
+class FakePredict(Predict):
+    def _connect_db(self):
+        return Database(jobs=Collection(JOBS), predictions=Collection([EXISTING]))
+
+
+def _predict(skip_existing):
+    predict = FakePredict(ModelSnapshot(2), bootstrap_size=100, batch_size=4)
+    return predict.predict(save=False, skip_existing=skip_existing)
+
+
+def _baseline_record(job, prediction):
+    "Record of a prediction, as in the original per-job implementation"
+    record = {**prediction, **job, "_id": job["jobid"] + "_" + ModelSnapshot.name}
+    record["json"] = {k: v for k, v in job["json"].items() if k != "description"}
+    del record["description"]
+    return record
+
+
+def test_predict_records():
+    predict = _predict(skip_existing=True)
+    assert predict.db.predictions.queries == [{"snapshot": ModelSnapshot.name}]
+    operations = [op for ops in predict.db.predictions.writes for op in ops]
+    predicted = [job for job in JOBS[:-1] if job["jobid"] != "job1"]
+    records = {r["jobid"]: r for r in predict._predictions}
+    assert sorted(records) == sorted(job["jobid"] for job in JOBS[:-1])
+    assert records["job1"] == _baseline_record(JOBS[1], EXISTING)
+    assert operations == [
+        pymongo.UpdateOne(
+            {"_id": job["jobid"] + "_" + ModelSnapshot.name},
+            {
+                "$set": {
+                    **{k: records[job["jobid"]][k] for k in PREDICTION_FIELDS},
+                    "snapshot": ModelSnapshot.name,
+                    "jobid": job["jobid"],
+                }
+            },
+            upsert=True,
+        )
+        for job in predicted
+    ]
+    for job in predicted:
+        prediction = {
+            k: records[job["jobid"]][k]
+            for k in PREDICTION_FIELDS + ["snapshot", "jobid"]
+        }
+        assert 0 <= prediction["lower_ci"] <= prediction["upper_ci"] <= 1
+        assert records[job["jobid"]] == _baseline_record(job, prediction)
+    assert all("description" in job["json"] for job in JOBS[:-1])
+
+
+def test_predict_overwrite_existing():
+    predict = _predict(skip_existing=False)
+    assert predict.db.predictions.queries == []
+    operations = [op for ops in predict.db.predictions.writes for op in ops]
+    assert [op._filter["_id"] for op in operations] == [
+        job["jobid"] + "_" + ModelSnapshot.name for job in JOBS[:-1]
+    ]
+    assert [r["jobid"] for r in predict._predictions] == [
+        job["jobid"] for job in JOBS[:-1]
+    ]
@@ -0,0 +1,79 @@
+import json
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from bson.json_util import dumps
+from dataclasses import asdict
+from jamie.types import JobPrediction, Contract
+from jamie.prediction_table import write_table, read_table
+
+RECORDS = [
+    {
+        "jobid": "AAA001",
+        "snapshot": "2020-05-01T10-00-00_rse",
+        "contract": "Permanent",
+        "employer": "University of Manchester",
+        "hours": ["Full Time", "Part Time"],
+        "job_title": "Research Software Engineer",
+        "placed_on": datetime.datetime(2020, 4, 12),
+        "closes": datetime.datetime(2020, 5, 10),
+        "extra_location": "North West England",
+        "salary_min": 30000,
+        "salary_max": 40000,
+        "salary_median": 35000.0,
+        "probability": 0.9,
+        "lower_ci": 0.8,
+        "upper_ci": 0.95,
+    },
+    {
+        "jobid": "AAA002",
+        "snapshot": "2020-05-01T10-00-00_rse",
+        "contract": "Fixed-Term/Contract",
+        "employer": "University of Manchester",
+        "hours": [],
+        "job_title": "Lecturer in History",
+        "date": datetime.datetime(2019, 1, 3),
+        "placed_on": datetime.datetime(2019, 1, 2),
+        "department": "History",
+        "probability": 0.1,
+        "lower_ci": 0.05,
+        "upper_ci": 0.2,
+    },
+    {
+        "jobid": "AAA003",
+        "snapshot": "2020-05-01T10-00-00_rse",
+        "job_title": "Data Scientist",
+        "closes": datetime.datetime(2018, 7, 1),
+        "probability": 0.5,
+        "lower_ci": 0.4,
+        "upper_ci": 0.6,
+    },
+]
+
+
+def test_table_matches_jsonl(tmp_path):
+    write_table(RECORDS, tmp_path / "predictions.npz")
+    data = read_table(tmp_path / "predictions.npz")
+    expected = pd.DataFrame(
+        [asdict(JobPrediction(json.loads(dumps(r)))) for r in RECORDS]
+    )
+    assert list(data.columns) == list(expected.columns)
+    assert isinstance(data.contract.dtype, pd.CategoricalDtype)
+    assert list(data.contract[:2]) == [Contract.Permanent, Contract.FixedTerm]
+    assert pd.isna(data.contract[2])
+    for column in ["date", "posted"]:
+        assert data[column].dtype == "datetime64[ns]"
+        assert [d.date() if not pd.isna(d) else None for d in data[column]] == list(
+            expected[column]
+        )
+    for column in ["jobid", "employer", "hours", "job_title", "department"]:
+        assert list(data[column]) == list(expected[column])
+    for column in ["probability", "probability_upper", "salary_median"]:
+        assert np.allclose(data[column], expected[column].astype(float), equal_nan=True)
+
+
+def test_table_invalid_probability(tmp_path):
+    write_table([{**RECORDS[0], "upper_ci": 1.5}], tmp_path / "predictions.npz")
+    with pytest.raises(ValueError):
+        read_table(tmp_path / "predictions.npz")
@@ -0,0 +1,99 @@
+import json
+import numpy as np
+import pandas as pd
+from jamie.types import Contract
+from jamie.reports import (
+    LOCATIONS,
+    Report,
+    draw_figures,
+    grouped_metrics,
+    grouped_training_metrics,
+    fix_day,
+    month_start,
+)
+
+
+def _predictions(n=500):
+    rng = np.random.default_rng(0)
+    p = rng.uniform(size=n)
+    return pd.DataFrame(
+        {
+            "probability": p,
+            "probability_lower": np.clip(p - 0.1, 0, 1),
+            "probability_upper": np.clip(p + 0.1, 0, 1),
+            "contract": pd.Categorical(
+                rng.choice([Contract.Permanent, Contract.FixedTerm, None], n),
+                categories=[Contract.FixedTerm, Contract.Permanent],
+            ),
+            "extra_location": rng.choice(LOCATIONS + ["Unknown"], n),
+            "salary_median": np.where(
+                rng.uniform(size=n) < 0.2, np.nan, rng.integers(20000, 60000, n)
+            ),
+            "job_title_match": rng.uniform(size=n) < 0.3,
+            # the last month only has negatives
+            "year_month": np.where(
+                p > 0.5,
+                rng.choice(["2019-01-01", "2019-02-01", "2020-03-01"], n),
+                rng.choice(["2019-01-01", "2019-02-01", "2020-03-01", "2020-04-01"], n),
+            ),
+            "job_title": rng.choice(["PhD student", "Engineer", "Lecturer"], n),
+            "aggregate_tags": rng.integers(0, 2, n),
+        }
+    )
+
+
+def test_grouped_metrics():
+    df = _predictions()
+    expected = [
+        {"group": i, **Report.metrics(data)} for i, data in df.groupby(df.year_month)
+    ]
+    assert json.dumps(grouped_metrics(df, df.year_month), sort_keys=True) == (
+        json.dumps(expected, sort_keys=True)
+    )
+    df["extra_location"] = df.extra_location.astype("category")
+    assert json.dumps(grouped_metrics(df, df.year_month), sort_keys=True) == (
+        json.dumps(expected, sort_keys=True)
+    )
+
+
+def test_grouped_training_metrics():
+    df = _predictions()
+    expected = [
+        {"group": i, **Report.training_metrics(data)}
+        for i, data in df.groupby(df.year_month)
+    ]
+    assert json.dumps(
+        grouped_training_metrics(df, df.year_month), sort_keys=True
+    ) == json.dumps(expected, sort_keys=True)
+
+
+def test_month_start():
+    dates = pd.Series(pd.to_datetime(["2020-04-12", "2019-12-31", "2020-04-01"]))
+    months = month_start(dates)
+    assert list(months) == [fix_day(d.date()) for d in dates]
+    assert list(months.categories) == ["2019-12-01", "2020-04-01"]
+    # training snapshot dates, read from CSV
+    placed_on = pd.Series(["2020-04-12", None, "2019-12-31", "2020-04-01"])
+    months = month_start(placed_on)
+    assert list(months.codes) == [1, -1, 0, 1]
+    assert list(months.categories) == ["2019-12-01", "2020-04-01"]
+
+
+def test_draw_figures(tmp_path):
+    figures = {
+        "njobs.png": {
+            "x": ["2019", "2020"],
+            "y": [3, 4],
+            "lower": [2, 3],
+            "upper": [4, 5],
+        },
+        "propjobs.png": {"x": ["2019", "2020"], "y": [0.2, 0.3], "ylim": (0, 1)},
+        "salary.png": {"x": ["2019", "2020"], "y": [30000.0, None]},
+    }
+    assert sorted(draw_figures(tmp_path, figures, n_jobs=2)) == sorted(figures)
+    assert all((tmp_path / fn).stat().st_size > 0 for fn in figures)
+    assert draw_figures(tmp_path, figures) == []
+    figures["salary.png"]["y"] = [30000.0, 31000.0]
+    assert draw_figures(tmp_path, figures) == ["salary.png"]
+    (tmp_path / "njobs.png").unlink()
+    assert draw_figures(tmp_path, figures) == ["njobs.png"]
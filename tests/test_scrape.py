@@ -0,0 +1,217 @@
+import json
+import time
+import threading
+import http.server
+import pytest
+import requests
+from collections import Counter
+from urllib.parse import urlsplit, parse_qs
+from jamie.scrape.archive import Archive, archive_folder
+from jamie.scrape.fetch import Fetcher, TokenBucket
+from jamie.scrape.index import DownloadIndex, index_file
+from jamie.scrape.main import main
+
+JOBS = ["ABC001", "ABC002", "ABC003", "ABC404", "ABC005"]
+DUPLICATES = {"DUP001": "ABC001"}  # job posted again with the same advert
+
+
+def search_page(start, page_size):
+    return "<html><body>%s</body></html>" % "".join(
+        '<div class="j-search-result__text"><a href="/job/%s/job-title/">Job</a></div>'
+        % jobid
+        for jobid in JOBS[start - 1 : start - 1 + page_size]
+    )
+
+
+def job_page(jobid):
+    jobid = DUPLICATES.get(jobid, jobid)
+    return "<html><body><h1>Job %s</h1><p>%s</p></body></html>" % (
+        jobid,
+        "Research software engineer " * 10,
+    )
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    "Serves a search page and job pages, ABC002 fails once before succeeding"
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        self.server.requests[self.path] += 1
+        if self.path.startswith("/search/"):
+            query = parse_qs(urlsplit(self.path).query)
+            start, page_size = int(query["startIndex"][0]), int(query["pageSize"][0])
+            self.server.search_pages.append(start)
+            if start in self.server.fail_search:
+                self.reply(404, "Not found")
+            else:
+                self.reply(200, search_page(start, page_size))
+        elif "ABC404" in self.path:
+            self.reply(404, "Not found")
+        elif "ABC002" in self.path and self.server.requests[self.path] == 1:
+            self.reply(503, "Unavailable")
+        else:
+            page = job_page(self.path.split("/")[2])
+            etag = '"%d"' % len(page)
+            if self.headers.get("If-None-Match") == etag:
+                self.reply(304, "")
+            else:
+                self.reply(200, page, etag)
+
+    def reply(self, status, text, etag=None):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.requests = Counter()
+    httpd.search_pages = []
+    httpd.fail_search = set()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _config(folder, archive=False):
+    return {
+        "scrape.folder": str(folder),
+        "scrape.archive": archive,
+        "scrape.njobs": 10,
+        "scrape.page-size": 2,
+        "scrape.concurrency": 2,
+        "scrape.rate": 100,
+        "scrape.timeout": 5,
+        "scrape.retries": 2,
+    }
+
+
+def test_scrape(server, tmp_path):
+    folder = tmp_path / "input"
+    base_url = "http://127.0.0.1:%d" % server.server_port
+    folder.mkdir()
+    (folder / "ABC003").write_text(job_page("ABC003"))
+    assert main(_config(folder), base_url=base_url) == 3
+    assert sorted(f.name for f in folder.iterdir()) == [
+        "ABC001",
+        "ABC002",
+        "ABC003",
+        "ABC005",
+    ]
+    assert "Job ABC002" in (folder / "ABC002").read_text()
+    assert server.requests["/job/ABC002/job-title/"] == 2  # retried
+    assert server.requests["/job/ABC003/job-title/"] == 0  # already downloaded
+    assert server.search_pages == [1, 3, 5]
+    assert not (tmp_path / "input.crawl.json").exists()
+
+
+def test_scrape_resume(server, tmp_path):
+    folder = tmp_path / "input"
+    base_url = "http://127.0.0.1:%d" % server.server_port
+    server.fail_search = {3}
+    with pytest.raises(requests.HTTPError):
+        main(_config(folder), base_url=base_url)
+    assert sorted(f.name for f in folder.iterdir()) == ["ABC001", "ABC002"]
+    assert (tmp_path / "input.crawl.json").exists()
+    server.fail_search = set()
+    assert main(_config(folder), base_url=base_url) == 2
+    assert server.search_pages == [1, 3, 3, 5]
+    assert not (tmp_path / "input.crawl.json").exists()
+
+
+def test_scrape_refresh(server, tmp_path):
+    folder = tmp_path / "input"
+    base_url = "http://127.0.0.1:%d" % server.server_port
+    JOBS.append("DUP001")
+    try:
+        assert main(_config(folder), base_url=base_url) == 5
+        assert "Job ABC001" in (folder / "DUP001").read_text()
+        assert (folder / "DUP001").samefile(folder / "ABC001")  # hard link
+        index = DownloadIndex(index_file(folder))
+        assert index.entries["DUP001"]["duplicate_of"] == "ABC001"
+        assert index.entries["ABC001"]["etag"] == '"%d"' % len(job_page("ABC001"))
+        assert main(_config(folder), base_url=base_url) == 0
+        assert server.requests["/job/DUP001/job-title/"] == 1
+        mtime = (folder / "ABC001").stat().st_mtime_ns
+        assert main(_config(folder), base_url=base_url, refresh=True) == 0
+        assert server.requests["/job/ABC001/job-title/"] == 2
+        assert (folder / "ABC001").stat().st_mtime_ns == mtime
+    finally:
+        JOBS.remove("DUP001")
+
+
+def test_scrape_archive(server, tmp_path):
+    folder = tmp_path / "input"
+    base_url = "http://127.0.0.1:%d" % server.server_port
+    JOBS.append("DUP001")
+    try:
+        assert main(_config(folder, archive=True), base_url=base_url) == 5
+    finally:
+        JOBS.remove("DUP001")
+    archive = Archive(folder)
+    assert sorted(archive.index) == ["ABC001", "ABC002", "ABC003", "ABC005", "DUP001"]
+    assert "Job ABC003" in archive.get("ABC003")
+    # the duplicate is an alias of the record of the original job page
+    assert archive.index["DUP001"][1:] == archive.index["ABC001"][1:]
+    assert archive.get("DUP001") == archive.get("ABC001")
+    assert dict(archive.items())["DUP001"] == archive.get("ABC001")  # imported
+    assert main(_config(folder, archive=True), base_url=base_url) == 0
+    assert server.requests["/job/ABC003/job-title/"] == 1
+
+
+def test_archive(tmp_path):
+    pages = {"JOB%03d" % i: "<html>Job %d %s</html>" % (i, "x" * i) for i in range(20)}
+    (tmp_path / "input").mkdir()
+    for jobid, page in list(pages.items())[:5]:
+        (tmp_path / "input" / jobid).write_text(page)
+    assert archive_folder(tmp_path / "input", tmp_path / "archive") == 5
+    archive = Archive(tmp_path / "archive", segment_size=200)
+    for jobid, page in list(pages.items())[5:]:
+        archive.add(jobid, page)
+    archive.add("JOB002", "<html>Updated</html>")
+    pages["JOB002"] = "<html>Updated</html>"
+    archive = Archive(tmp_path / "archive")
+    assert len(archive) == 20
+    with (tmp_path / "archive" / "index.jsonl").open() as fp:
+        ends = {}
+        for line in fp:
+            _, segment, offset, length = json.loads(line)
+            assert offset == ends.get(segment, 0)  # appended contiguously
+            ends[segment] = offset + length
+    for segment, end in ends.items():
+        assert archive._segment(segment).stat().st_size == end
+    assert len(list((tmp_path / "archive").glob("segment-*.gz"))) > 1
+    assert archive.get("JOB010") == pages["JOB010"]
+    assert dict(archive.items()) == pages
+    assert [jobid for jobid, _ in archive.items()][-1] == "JOB002"
+    assert {job.data["jobid"] for job in archive.jobs(archive.keys())} == set(pages)
+    assert archive_folder(tmp_path / "input", tmp_path / "archive") == 0
+
+
+def test_fetcher_concurrency(server):
+    base_url = "http://127.0.0.1:%d" % server.server_port
+    fetcher = Fetcher(concurrency=3, rate=1000, timeout=5)
+    urls = ["%s/job/ABC%03d/title/" % (base_url, i) for i in range(20)]
+    responses = dict(fetcher.map(urls))
+    assert sorted(responses) == urls
+    assert all(r.status_code == 200 for r in responses.values())
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=50)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.09  # 5 tokens after the first at 50/s
@@ -0,0 +1,47 @@
+import json
+import pytest
+from jamie.snapshots import PredictionSnapshot
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    folder = tmp_path / "predictions" / "2020-05-01T10-00-00"
+    folder.mkdir(parents=True)
+    with (folder / "predictions.jsonl").open("w") as fp:
+        for i in range(1000):
+            p = 0.9 if i % 4 == 0 else 0.1
+            job = {
+                "jobid": "J%04d" % i,
+                "snapshot": "2020-05-01T10-00-00_rse",
+                "job_title": "PhD studentship" if i % 10 == 0 else "Engineer",
+                "probability": p,
+                "lower_ci": p - 0.05,
+                "upper_ci": p + 0.05,
+            }
+            fp.write(json.dumps(job) + "\n")
+    return PredictionSnapshot("2020-05-01T10-00-00", root=tmp_path)
+
+
+def test_partition_jobs_all(snapshot):
+    positives, negatives = snapshot.partition_jobs()
+    assert len(positives) == 200 and len(negatives) == 700
+
+
+def test_partition_jobs_sample(snapshot):
+    positives, negatives = snapshot.partition_jobs(50, random_state=1)
+    assert len(positives) == 50 and len(negatives) == 50
+    assert all(p["probability_lower"] > 0.5 for p in positives)
+    assert all(p["probability_lower"] <= 0.5 for p in negatives)
+    assert not any("PhD" in p["job_title"] for p in list(positives) + list(negatives))
+    assert len({p["jobid"] for p in negatives}) == 50
+    again, _ = snapshot.partition_jobs(50, random_state=1)
+    other, _ = snapshot.partition_jobs(50, random_state=2)
+    assert [p["jobid"] for p in positives] == [p["jobid"] for p in again]
+    assert [p["jobid"] for p in positives] != [p["jobid"] for p in other]
+    # later jobs are sampled, not only the first n_each_class
+    assert max(int(p["jobid"][1:]) for p in negatives) > 200
+
+
+def test_partition_jobs_too_few(snapshot):
+    with pytest.raises(ValueError):
+        snapshot.partition_jobs(300)
@@ -0,0 +1,29 @@
+import jamie.clean_text
+from jamie.text_cache import CleanTextCache
+
+TEXTS = ["Research Software Engineer", "Lecturer", "Research Software Engineer"]
+
+
+def test_clean_text_cache(tmp_path, monkeypatch):
+    calls = []
+
+    def clean_texts(texts):
+        calls.extend(texts)
+        return [text.lower().split() for text in texts]
+
+    monkeypatch.setattr(jamie.clean_text, "clean_texts", clean_texts)
+    cache = CleanTextCache(tmp_path / "clean_text.npz")
+    expected = ["research software engineer", "lecturer", "research software engineer"]
+    assert cache.clean(TEXTS) == expected
+    assert calls == TEXTS[:2]
+    cache.save()
+
+    cache = CleanTextCache(tmp_path / "clean_text.npz")
+    assert len(cache) == 2
+    assert cache.clean(TEXTS) == expected
+    assert calls == TEXTS[:2]
+
+    # Cached text is not reused when the text cleaning changes
+    monkeypatch.setattr(jamie.clean_text, "VERSION", jamie.clean_text.VERSION + 1)
+    assert cache.clean(TEXTS[1:2]) == ["lecturer"]
+    assert calls == TEXTS[:2] + ["Lecturer"]